@@ -1,18 +1,33 @@
 from flask import Flask
 from app.config import Config
+from app.ingest import SpoolingRequest
+from app import metrics, validator
 
 
 def create_app():
     app = Flask(__name__)
+    # Stream uploaded files to the spool directory instead of Werkzeug's temporary files
+    app.request_class = SpoolingRequest
     
     # Load config
     app.config.from_object(Config)
     
+    # Request timing and Server-Timing headers
+    metrics.init_app(app)
+    
+    # Game interface, imported once per process
+    validator.init_app(app)
+    
     # Register routes
-    from app.routes import upload, auth, home
+    from app.routes import upload, auth, home, warmup, results, downloads, admin, metrics as metrics_routes
     app.register_blueprint(upload.bp)
     app.register_blueprint(auth.bp)
     app.register_blueprint(home.bp)
+    app.register_blueprint(warmup.bp)
+    app.register_blueprint(results.bp)
+    app.register_blueprint(downloads.bp)
+    app.register_blueprint(admin.bp)
+    app.register_blueprint(metrics_routes.bp)
     
     # Make home page the default route
     app.add_url_rule('/', endpoint='home.index')
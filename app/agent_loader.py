@@ -0,0 +1,232 @@
+import importlib
+import importlib.abc
+import importlib.machinery
+import os
+import posixpath
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import NamedTuple
+
+AGENT_PACKAGE = 'agent'
+# Pseudo location of archive members, used for __file__ and tracebacks
+ARCHIVE_ROOT = '<submission>'
+# Read size when extracting members
+EXTRACT_CHUNK_SIZE = 64 * 1024
+# Members smaller than this are not subject to the compression ratio limit
+RATIO_MIN_SIZE = 1024 * 1024
+
+
+class ArchiveLimitError(Exception):
+    """Raised when a submission archive exceeds an extraction limit or has unsafe member paths"""
+
+
+class ExtractionLimits(NamedTuple):
+    """Budgets for extracting a submission archive (see the ZIP_MAX_* settings)"""
+    max_entries: int = 1000
+    max_total_size: int = 64 * 1024 * 1024
+    max_file_size: int = 32 * 1024 * 1024
+    max_ratio: int = 100
+    max_depth: int = 10
+
+
+def check_archive(zip_file, limits=ExtractionLimits()):
+    """
+    Check the central directory of a ZipFile against the limits before anything is read:
+    number of entries, declared sizes, compression ratios, path depth and unsafe paths.
+    Raises ArchiveLimitError.
+    """
+    infos = zip_file.infolist()
+    if len(infos) > limits.max_entries:
+        raise ArchiveLimitError(f'{len(infos)} entries, at most {limits.max_entries} are allowed')
+    total = 0
+    for info in infos:
+        parts = info.filename.rstrip('/').split('/')
+        if info.filename.startswith('/') or '..' in parts or '\\' in info.filename or ':' in parts[0]:
+            raise ArchiveLimitError(f'unsafe path {info.filename!r}')
+        if len(parts) > limits.max_depth:
+            raise ArchiveLimitError(f'{info.filename} is nested more than {limits.max_depth} levels deep')
+        if info.file_size > limits.max_file_size:
+            raise ArchiveLimitError(f'{info.filename} expands to {info.file_size} bytes, '
+                                    f'at most {limits.max_file_size} are allowed')
+        if info.file_size >= RATIO_MIN_SIZE and info.file_size > limits.max_ratio * max(info.compress_size, 1):
+            raise ArchiveLimitError(f'{info.filename} is compressed more than {limits.max_ratio}:1')
+        total += info.file_size
+        if total > limits.max_total_size:
+            raise ArchiveLimitError(f'contents expand to more than {limits.max_total_size} bytes')
+
+
+def extract_bounded(zip_file, target, limits=ExtractionLimits()):
+    """
+    Extract a ZipFile to the target directory within the limits. The central directory is
+    checked first, and the bytes actually decompressed are counted again while streaming
+    each member, so sizes misreported by the archive can't exceed the budget either.
+    Raises ArchiveLimitError.
+    """
+    check_archive(zip_file, limits)
+    total = 0
+    for info in zip_file.infolist():
+        path = os.path.join(target, *info.filename.rstrip('/').split('/'))
+        if info.is_dir():
+            os.makedirs(path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with zip_file.open(info) as source, open(path, 'wb') as f:
+            while chunk := source.read(EXTRACT_CHUNK_SIZE):
+                written += len(chunk)
+                total += len(chunk)
+                if written > limits.max_file_size or total > limits.max_total_size:
+                    raise ArchiveLimitError(f'{info.filename} expands beyond the extraction limits')
+                f.write(chunk)
+
+
+def clear_agent_modules():
+    """Remove any previously imported agent package so each submission is imported fresh"""
+    for name in [name for name in sys.modules if name == AGENT_PACKAGE or name.startswith(AGENT_PACKAGE + '.')]:
+        del sys.modules[name]
+
+
+def needs_extraction(names):
+    """
+    True if the agent package can't be imported straight from the archive:
+    it contains native extensions, data files or directories without __init__.py,
+    or the archive has modules next to it, which the agent imports from sys.path.
+    """
+    if any(name.endswith('.py') and not name.startswith((AGENT_PACKAGE + '/', '__MACOSX/')) for name in names):
+        return True
+    members = [name for name in names if name.startswith(AGENT_PACKAGE + '/') and not name.endswith('/')]
+    packages = {posixpath.dirname(name) for name in members if posixpath.basename(name) == '__init__.py'}
+    for name in members:
+        if posixpath.basename(posixpath.dirname(name)) == '__pycache__':
+            continue
+        if not name.endswith('.py'):
+            return True
+        if posixpath.dirname(name) not in packages:
+            return True
+    return False
+
+
+class ZipSourceLoader(importlib.abc.SourceLoader):
+    """Loads agent modules from the source files of an open ZipFile"""
+
+    def __init__(self, zip_file):
+        self.zip_file = zip_file
+        self.paths = {}
+
+    def get_filename(self, fullname):
+        return self.paths[fullname]
+
+    def get_data(self, path):
+        return self.zip_file.read(path[len(ARCHIVE_ROOT) + 1:])
+
+
+class ZipPackageFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder serving the agent package straight from an open ZipFile, without extraction"""
+
+    def __init__(self, zip_file):
+        self.names = set(zip_file.namelist())
+        self.loader = ZipSourceLoader(zip_file)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname != AGENT_PACKAGE and not fullname.startswith(AGENT_PACKAGE + '.'):
+            return None
+        base = fullname.replace('.', '/')
+        if f'{base}/__init__.py' in self.names:
+            member, search_locations = f'{base}/__init__.py', [f'{ARCHIVE_ROOT}/{base}']
+        elif f'{base}.py' in self.names:
+            member, search_locations = f'{base}.py', None
+        else:
+            return None
+        location = f'{ARCHIVE_ROOT}/{member}'
+        self.loader.paths[fullname] = location
+        spec = importlib.machinery.ModuleSpec(fullname, self.loader, origin=location,
+                                              is_package=search_locations is not None)
+        spec.has_location = True
+        if search_locations is not None:
+            spec.submodule_search_locations = search_locations
+        return spec
+
+
+class AgentPackage:
+    """
+    Import environment of one submission's agent package: a finder serving it from the open
+    ZipFile or, if it needs real files, a temporary directory it was extracted to.
+    Several packages can be kept loaded; activate() makes one the 'agent' package of sys.modules,
+    including the submodules it imported earlier, and deactivate() sets them aside again
+    together with the modules imported from its environment or extraction directory.
+    environment is a site directory with the agent's requirements, on sys.path while active.
+    Extraction is bounded by limits (ExtractionLimits) and raises ArchiveLimitError.
+    """
+
+    def __init__(self, zip_file, mode='memory', environment=None, limits=ExtractionLimits()):
+        self.finder = None
+        self._temp_dir = None
+        self.environment = environment
+        self.modules = {}
+        self._displaced = {}
+        if mode == 'memory' and not needs_extraction(zip_file.namelist()):
+            self.finder = ZipPackageFinder(zip_file)
+        else:
+            self._temp_dir = tempfile.TemporaryDirectory()
+            try:
+                extract_bounded(zip_file, self._temp_dir.name, limits)
+            except BaseException:
+                self._temp_dir.cleanup()
+                raise
+
+    def activate(self):
+        clear_agent_modules()
+        # Modules of the same name imported by the app meanwhile are put back on deactivate()
+        self._displaced = {name: sys.modules[name] for name in self.modules if name in sys.modules}
+        sys.modules.update(self.modules)
+        if self.environment is not None:
+            sys.path.insert(0, self.environment)
+        if self.finder is not None:
+            sys.meta_path.insert(0, self.finder)
+        else:
+            sys.path.insert(0, self._temp_dir.name)
+
+    def _owns(self, name, module):
+        """True if a module belongs to this package: the agent's own or imported from its directories"""
+        if name == AGENT_PACKAGE or name.startswith(AGENT_PACKAGE + '.'):
+            return True
+        roots = [root for root in (self.environment, self._temp_dir and self._temp_dir.name) if root]
+        locations = [getattr(module, '__file__', None), *(getattr(module, '__path__', None) or [])]
+        return any(isinstance(location, str) and location.startswith(root + os.sep)
+                   for location in locations for root in roots)
+
+    def deactivate(self):
+        self.modules = {name: module for name, module in list(sys.modules.items()) if self._owns(name, module)}
+        if self.finder is not None:
+            sys.meta_path.remove(self.finder)
+        else:
+            sys.path.remove(self._temp_dir.name)
+        if self.environment is not None:
+            sys.path.remove(self.environment)
+        for name in self.modules:
+            del sys.modules[name]
+        sys.modules.update(self._displaced)
+        self._displaced = {}
+
+    def close(self):
+        self.modules = {}
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+
+
+@contextmanager
+def loaded_agent(zip_file, mode='memory', environment=None, limits=ExtractionLimits()):
+    """
+    Import the agent package of an open ZipFile and yield the module.
+    In 'memory' mode the sources are served from the archive unless the package needs
+    real files on disk; otherwise it is extracted to a temporary directory first.
+    The package is removed from sys.modules again afterwards.
+    """
+    package = AgentPackage(zip_file, mode, environment, limits)
+    package.activate()
+    try:
+        yield importlib.import_module(AGENT_PACKAGE)
+    finally:
+        package.deactivate()
+        package.close()
@@ -0,0 +1,353 @@
+import abc
+import fcntl
+import hashlib
+import io
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+from typing import NamedTuple, Optional, Dict
+
+# Read size used when streaming objects
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobInfo(NamedTuple):
+    """Listing entry of a stored object"""
+    name: str
+    size: int
+    metadata: Optional[Dict[str, str]] = None
+
+
+class ConcurrentWriteError(Exception):
+    """Raised by put_if_generation() when the object was changed after it was read"""
+
+
+class StorageBackend(abc.ABC):
+    """
+    Interface of the object stores the app can run on.
+    Paths are '/'-separated object names. Missing objects raise FileNotFoundError,
+    put(..., if_not_exists=True) on an existing object raises FileExistsError.
+    """
+
+    @abc.abstractmethod
+    def put(self, path, file, metadata=None, if_not_exists=False):
+        """Store the contents of a binary file object, streaming it"""
+        raise NotImplementedError
+
+    def put_bytes(self, path, data, metadata=None, if_not_exists=False):
+        self.put(path, io.BytesIO(data), metadata, if_not_exists)
+
+    @abc.abstractmethod
+    def open(self, path):
+        """Open an object for streaming reads; use as a context manager"""
+        raise NotImplementedError
+
+    def get(self, path):
+        """Return the whole contents of an object"""
+        with self.open(path) as f:
+            return f.read()
+
+    def read_range(self, path, start, end):
+        """Return bytes start..end-1 of an object"""
+        with self.open(path) as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    @abc.abstractmethod
+    def size(self, path):
+        """Size of an object in bytes"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_with_generation(self, path):
+        """Contents of an object and an opaque token of the write that stored them, for put_if_generation()"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put_if_generation(self, path, data, generation):
+        """
+        Store bytes only if the object is still at the generation read with get_with_generation()
+        (with None, only if it doesn't exist), raising ConcurrentWriteError otherwise.
+        Lets several processes update one object by reading, changing and retrying.
+        """
+        raise NotImplementedError
+
+    def signed_url(self, path, expires_in):
+        """
+        A URL granting read access to an object for expires_in seconds,
+        or None if the store can't hand out direct downloads
+        """
+        return None
+
+    def exists(self, path):
+        try:
+            self.size(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @abc.abstractmethod
+    def list(self, prefix):
+        """BlobInfo of all objects whose name starts with prefix, sorted by name"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, path):
+        raise NotImplementedError
+
+    def delete_many(self, paths):
+        """Delete several objects, as few round-trips as the store allows"""
+        for path in paths:
+            self.delete(path)
+
+
+class GCSBackend(StorageBackend):
+    """Google Cloud Storage bucket; client_factory returns the process's storage client"""
+
+    def __init__(self, client_factory, bucket_name, chunk_size=None):
+        self.client_factory = client_factory
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+
+    @property
+    def bucket(self):
+        return self.client_factory().bucket(self.bucket_name)
+
+    def put(self, path, file, metadata=None, if_not_exists=False):
+        from google.api_core.exceptions import PreconditionFailed
+        # Chunked, resumable upload streamed from the file
+        blob = self.bucket.blob(path, chunk_size=self.chunk_size)
+        if metadata:
+            blob.metadata = metadata
+        try:
+            blob.upload_from_file(file, if_generation_match=0 if if_not_exists else None)
+        except PreconditionFailed:
+            raise FileExistsError(path)
+
+    def open(self, path):
+        # Blob readers are lazy and only fail on the first read; fetching the metadata checks existence
+        blob = self.bucket.get_blob(path, chunk_size=self.chunk_size)
+        if blob is None:
+            raise FileNotFoundError(path)
+        return blob.open('rb')
+
+    def read_range(self, path, start, end):
+        from google.api_core.exceptions import NotFound
+        try:
+            return self.bucket.blob(path).download_as_bytes(start=start, end=end - 1)
+        except NotFound:
+            raise FileNotFoundError(path)
+
+    def get_with_generation(self, path):
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+        while True:
+            blob = self.bucket.get_blob(path)
+            if blob is None:
+                raise FileNotFoundError(path)
+            try:
+                return blob.download_as_bytes(if_generation_match=blob.generation), blob.generation
+            except NotFound:
+                raise FileNotFoundError(path)
+            except PreconditionFailed:
+                # Replaced between fetching the metadata and the contents
+                continue
+
+    def put_if_generation(self, path, data, generation):
+        from google.api_core.exceptions import PreconditionFailed
+        try:
+            self.bucket.blob(path).upload_from_string(data, if_generation_match=generation or 0)
+        except PreconditionFailed:
+            raise ConcurrentWriteError(path)
+
+    def signed_url(self, path, expires_in):
+        from datetime import timedelta
+        from google.auth.credentials import Signing
+        from google.auth.transport.requests import Request
+        credentials = self.client_factory()._credentials
+        signing = {}
+        if not isinstance(credentials, Signing):
+            # Default credentials on App Engine can't sign locally; sign through the IAM API
+            if not credentials.valid:
+                credentials.refresh(Request())
+            signing = {'service_account_email': credentials.service_account_email,
+                       'access_token': credentials.token}
+        return self.bucket.blob(path).generate_signed_url(version='v4', expiration=timedelta(seconds=expires_in),
+                                                         method='GET', **signing)
+
+    def size(self, path):
+        blob = self.bucket.get_blob(path)
+        if blob is None:
+            raise FileNotFoundError(path)
+        return blob.size
+
+    def list(self, prefix):
+        return [BlobInfo(blob.name, blob.size, blob.metadata) for blob in self.bucket.list_blobs(prefix=prefix)]
+
+    def delete(self, path):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(path).delete()
+        except NotFound:
+            raise FileNotFoundError(path)
+
+    def delete_many(self, paths):
+        # Batched requests carry at most 100 deletions per HTTP call
+        client = self.client_factory()
+        bucket = client.bucket(self.bucket_name)
+        for start in range(0, len(paths), 100):
+            with client.batch():
+                for path in paths[start:start + 100]:
+                    bucket.blob(path).delete()
+
+
+class LocalBackend(StorageBackend):
+    """Objects stored as files below a root directory, for single-node deployments"""
+
+    METADATA_DIR = '.metadata'
+    # Prefix of partially written files, which are not listed
+    TEMP_PREFIX = '.tmp-'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _file(self, path):
+        full_path = os.path.abspath(os.path.join(self.root, *path.split('/')))
+        if not full_path.startswith(self.root + os.sep) or path.split('/')[0] == self.METADATA_DIR:
+            raise ValueError(f'Invalid object path: {path}')
+        return full_path
+
+    def _metadata_file(self, path):
+        return os.path.join(self.root, self.METADATA_DIR, *path.split('/')) + '.json'
+
+    def put(self, path, file, metadata=None, if_not_exists=False):
+        target = self._file(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=self.TEMP_PREFIX, dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(file, f, CHUNK_SIZE)
+            if if_not_exists:
+                # Linking fails if the target exists, making the check and the write atomic
+                os.link(temp_path, target)
+            else:
+                os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        metadata_file = self._metadata_file(path)
+        if metadata:
+            os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
+            with open(metadata_file, 'w') as f:
+                json.dump(metadata, f)
+        elif os.path.exists(metadata_file):
+            os.remove(metadata_file)
+
+    def open(self, path):
+        return open(self._file(path), 'rb')
+
+    def size(self, path):
+        return os.path.getsize(self._file(path))
+
+    def get_with_generation(self, path):
+        data = self.get(path)
+        # Files are replaced as a whole, so their contents tell the writes apart
+        return data, hashlib.sha256(data).hexdigest()
+
+    def put_if_generation(self, path, data, generation):
+        lock_file = self._metadata_file(path)[:-len('.json')] + '.lock'
+        os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+        with open(lock_file, 'a') as lock:
+            # Conditional writers of the object take turns between checking and writing
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                current = self.get_with_generation(path)[1]
+            except FileNotFoundError:
+                current = None
+            if current != generation:
+                raise ConcurrentWriteError(path)
+            self.put_bytes(path, data)
+
+    def _metadata(self, path):
+        try:
+            with open(self._metadata_file(path)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self, prefix):
+        blobs = []
+        # Only the directory holding the prefix can contain matching objects
+        directory = posixpath.dirname(prefix)
+        start = self._file(directory) if directory else self.root
+        for directory, subdirectories, files in os.walk(start):
+            if directory == self.root and self.METADATA_DIR in subdirectories:
+                subdirectories.remove(self.METADATA_DIR)
+            for filename in files:
+                name = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, '/')
+                if name.startswith(prefix) and not filename.startswith(self.TEMP_PREFIX):
+                    blobs.append(BlobInfo(name, os.path.getsize(os.path.join(directory, filename)), self._metadata(name)))
+        return sorted(blobs, key=lambda blob: blob.name)
+
+    def delete(self, path):
+        os.remove(self._file(path))
+        if os.path.exists(self._metadata_file(path)):
+            os.remove(self._metadata_file(path))
+
+
+class MemoryBackend(StorageBackend):
+    """Objects kept in a dictionary, for tests and benchmarks"""
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, path, file, metadata=None, if_not_exists=False):
+        data = file.read()
+        with self._lock:
+            if if_not_exists and path in self._objects:
+                raise FileExistsError(path)
+            self._objects[path] = (bytes(data), dict(metadata) if metadata else None)
+
+    def open(self, path):
+        with self._lock:
+            if path not in self._objects:
+                raise FileNotFoundError(path)
+            return io.BytesIO(self._objects[path][0])
+
+    def size(self, path):
+        with self._lock:
+            if path not in self._objects:
+                raise FileNotFoundError(path)
+            return len(self._objects[path][0])
+
+    def get_with_generation(self, path):
+        data = self.get(path)
+        return data, hashlib.sha256(data).hexdigest()
+
+    def put_if_generation(self, path, data, generation):
+        with self._lock:
+            current = hashlib.sha256(self._objects[path][0]).hexdigest() if path in self._objects else None
+            if current != generation:
+                raise ConcurrentWriteError(path)
+            self._objects[path] = (bytes(data), None)
+
+    def list(self, prefix):
+        with self._lock:
+            return sorted((BlobInfo(name, len(data), metadata)
+                           for name, (data, metadata) in self._objects.items() if name.startswith(prefix)),
+                          key=lambda blob: blob.name)
+
+    def delete(self, path):
+        with self._lock:
+            if path not in self._objects:
+                raise FileNotFoundError(path)
+            del self._objects[path]
+
+    def delete_many(self, paths):
+        with self._lock:
+            for path in paths:
+                self._objects.pop(path, None)
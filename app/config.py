@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 # Get the webapp root directory (where .env is located)
@@ -11,15 +12,107 @@ class Config:
     # Flask settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_EXTENSIONS = ['.zip']
+    # Uploaded files are streamed to this directory once and validated/uploaded from there
+    UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'c4league-spool'))
+    # Chunk size for resumable uploads to the bucket (must be a multiple of 256KB)
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
     
+    # Storage settings
+    # 'gcs' (Google Cloud Storage), 'local' (files below LOCAL_STORAGE_ROOT) or 'memory' (tests, benchmarks)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'gcs')
+    LOCAL_STORAGE_ROOT = os.environ.get('LOCAL_STORAGE_ROOT', str(WEBAPP_ROOT / 'storage'))
     # Google Cloud Storage settings
     STORAGE_BUCKET = 'c4league'
     # In development, use service key file; in production, use default credentials
     STORAGE_KEY_PATH = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') if not os.getenv('GAE_ENV', '').startswith('standard') else None
+    # Number of stored versions per agent (older ones are pruned after an update; 2 allows one rollback)
+    AGENT_VERSIONS_KEPT = int(os.environ.get('AGENT_VERSIONS_KEPT', 2))
+    # Maximum number of pooled keep-alive connections to the storage API per process
+    STORAGE_HTTP_POOL_SIZE = int(os.environ.get('STORAGE_HTTP_POOL_SIZE', 10))
+    # Seconds a team's agent list is cached per process (changes made by this process invalidate it)
+    AGENT_LIST_TTL = int(os.environ.get('AGENT_LIST_TTL', 10))
+
+    # Logging: 'cloud' ships batches to Cloud Logging in the background, 'stdout' writes JSON lines
+    # in the background, 'sync' calls Cloud Logging on the request path
+    LOG_SINK = os.environ.get('LOG_SINK', 'cloud')
+    # Entries beyond this many queued ones are dropped
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 100))
 
     # Validator settings
     # Only used in development to find c4utils package
     VALIDATOR_PATH = str(WEBAPP_ROOT / os.environ.get('C4UTILS_PATH', '../c4utils')) if not os.getenv('GAE_ENV', '').startswith('standard') else None
+    # Run each validation in its own subprocess (set to 'false' to validate in the request worker)
+    VALIDATION_ISOLATED = os.environ.get('VALIDATION_ISOLATED', 'true').lower() == 'true'
+    # Maximum number of concurrent validator processes per web worker
+    VALIDATION_WORKERS = int(os.environ.get('VALIDATION_WORKERS', os.cpu_count() or 1))
+    # Number of validations allowed to wait for a free process before uploads are rejected
+    VALIDATION_QUEUE_DEPTH = int(os.environ.get('VALIDATION_QUEUE_DEPTH', 8))
+    # 'forkserver' forks validator processes from a template process with VALIDATION_PRELOAD
+    # imported, 'spawn' starts a new interpreter for each validation
+    VALIDATION_START_METHOD = os.environ.get('VALIDATION_START_METHOD', 'forkserver')
+    VALIDATION_PRELOAD = [name for name in os.environ.get('VALIDATION_PRELOAD', 'numpy,app.validator').split(',') if name]
+
+    # Game referee checking the moves of submitted agents: 'builtin' (app/referee.py) or 'c4utils'
+    VALIDATION_REFEREE = os.environ.get('VALIDATION_REFEREE', 'builtin')
+    # 'memory' imports agents straight from the ZIP (extracting only when needed), 'extract' always extracts
+    VALIDATION_IMPORT_MODE = os.environ.get('VALIDATION_IMPORT_MODE', 'memory')
+    # Cache of validation results keyed by ZIP hash (set VALIDATION_CACHE_PATH to '' to disable)
+    VALIDATION_CACHE_PATH = os.environ.get('VALIDATION_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'c4league-validation.sqlite3'))
+    VALIDATION_CACHE_MAX_ENTRIES = int(os.environ.get('VALIDATION_CACHE_MAX_ENTRIES', 1000))
+    VALIDATION_CACHE_MAX_AGE = int(os.environ.get('VALIDATION_CACHE_MAX_AGE', 7 * 24 * 3600))
+
+    # Limits of submission archives, checked from the ZIP's central directory and again while extracting
+    ZIP_MAX_ENTRIES = int(os.environ.get('ZIP_MAX_ENTRIES', 1000))
+    ZIP_MAX_TOTAL_SIZE = int(os.environ.get('ZIP_MAX_TOTAL_SIZE', 64 * 1024 * 1024))
+    ZIP_MAX_FILE_SIZE = int(os.environ.get('ZIP_MAX_FILE_SIZE', 32 * 1024 * 1024))
+    # Highest uncompressed:compressed size ratio of members of 1 MB or more
+    ZIP_MAX_RATIO = int(os.environ.get('ZIP_MAX_RATIO', 100))
+    ZIP_MAX_DEPTH = int(os.environ.get('ZIP_MAX_DEPTH', 10))
+
+    # Environments with the requirements of submissions, installed from a local wheelhouse
+    # (requirements are not installed unless ENV_CACHE_DIR is set)
+    ENV_CACHE_DIR = os.environ.get('ENV_CACHE_DIR', '')
+    ENV_WHEELHOUSE = os.environ.get('ENV_WHEELHOUSE', str(WEBAPP_ROOT / 'wheelhouse'))
+    # Least recently used environments are evicted beyond this size
+    ENV_CACHE_MAX_BYTES = int(os.environ.get('ENV_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+    # Background upload processing
+    # Accept uploads immediately and validate/save them in a background job queue
+    UPLOAD_ASYNC = os.environ.get('UPLOAD_ASYNC', 'false').lower() == 'true'
+    JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'c4league-jobs.sqlite3'))
+    # Running jobs whose worker stopped renewing them for this long are assumed lost and picked up again
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+
+    # Tournament
+    # Working directory of the tournament runner: downloaded agents and results.jsonl
+    TOURNAMENT_DIR = os.environ.get('TOURNAMENT_DIR', os.path.join(tempfile.gettempdir(), 'c4league-tournament'))
+    # Number of games played at a time, each agent in its own process (defaults to the number of cores)
+    TOURNAMENT_WORKERS = int(os.environ.get('TOURNAMENT_WORKERS', os.cpu_count() or 1))
+    # Seconds an agent may take per move before it forfeits the game
+    TOURNAMENT_MOVE_TIMEOUT = float(os.environ.get('TOURNAMENT_MOVE_TIMEOUT', 1.))
+    # Play the games of a new or rolled back agent version in the background job queue
+    TOURNAMENT_AUTO_UPDATE = os.environ.get('TOURNAMENT_AUTO_UPDATE', 'false').lower() == 'true'
+    # Seconds the leaderboard snapshot is cached per process
+    LEADERBOARD_TTL = int(os.environ.get('LEADERBOARD_TTL', 10))
+
+    # Downloads
+    # Redirect downloads of stored objects to signed URLs of the bucket instead of streaming them
+    DOWNLOAD_SIGNED_URLS = os.environ.get('DOWNLOAD_SIGNED_URLS', 'false').lower() == 'true'
+    # Seconds a signed download URL stays valid
+    DOWNLOAD_URL_TTL = int(os.environ.get('DOWNLOAD_URL_TTL', 300))
+
+    # Admin
+    # Bearer token of the /admin endpoints, which are disabled while it is empty
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    # Concurrent storage reads of the agent export
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 8))
+
+    # Monitoring
+    # Add Server-Timing headers with per-stage durations to responses
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() == 'true'
+    # Bearer token of /metrics, which is disabled while it is empty
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
     # Group settings
     ALLOWED_GROUPS = {}
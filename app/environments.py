@@ -0,0 +1,231 @@
+import fcntl
+import hashlib
+import importlib.metadata
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from flask import current_app
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+# Packages the game interface imports itself: agents always get the app's version
+PROVIDED_PACKAGES = ('numpy',)
+# Seconds an environment build may take
+BUILD_TIMEOUT = 600
+# Written into an environment once it is complete; its mtime is the time of last use
+MARKER = '.environment.json'
+BUILD_PREFIX = '.build-'
+LOCK_DIR = '.locks'
+
+
+class RequirementsError(Exception):
+    """Raised when a requirements.txt can't be parsed or conflicts with the provided packages"""
+
+
+class EnvironmentBuildError(RequirementsError):
+    """Raised when the requirements can't be installed from the wheelhouse"""
+
+
+def parse_requirements(text):
+    """
+    Normalized requirements of a requirements.txt: canonical names, one line per requirement,
+    sorted and without comments, duplicates or requirements whose environment marker does not
+    apply. Provided packages are checked against the installed version instead of listed.
+    """
+    requirements = set()
+    for line in text.splitlines():
+        line = line.split(' #', 1)[0].strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('-'):
+            raise RequirementsError(f'Unsupported option {line!r}')
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement as e:
+            raise RequirementsError(f'Invalid requirement {line!r}: {str(e)}')
+        if requirement.url:
+            raise RequirementsError(f'Requirement {requirement.name} must not be a URL')
+        if requirement.marker is not None and not requirement.marker.evaluate():
+            continue
+        name = canonicalize_name(requirement.name)
+        if name in PROVIDED_PACKAGES:
+            version = importlib.metadata.version(name)
+            if not requirement.specifier.contains(version, prereleases=True):
+                raise RequirementsError(f'{line} conflicts with {name} {version} provided by the game environment')
+            continue
+        extras = f"[{','.join(sorted(requirement.extras))}]" if requirement.extras else ''
+        requirements.add(f'{name}{extras}{requirement.specifier}')
+    return sorted(requirements)
+
+
+def requirements_hash(requirements):
+    """Key of the environment for normalized requirements on this Python version"""
+    text = f'python{sys.version_info.major}.{sys.version_info.minor}\n' + '\n'.join(requirements)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(directory, filename))
+               for directory, _, files in os.walk(path) for filename in files)
+
+
+def run_pip(arguments, timeout=BUILD_TIMEOUT):
+    """
+    Run pip in a session of its own and return its exit code and error output. If pip takes
+    longer than timeout seconds or the caller is interrupted, its whole process group is
+    killed, so no build processes are left behind.
+    """
+    process = subprocess.Popen([sys.executable, '-m', 'pip', *arguments], stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True, start_new_session=True)
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except BaseException:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+        raise
+    return process.returncode, stderr
+
+
+class EnvironmentStore:
+    """
+    Site directories with the requirements of submissions, installed with pip from a local
+    wheelhouse (no network access) into <root>/<requirements hash>. Each is built once and
+    shared by every agent with the same requirements; the least recently used ones are
+    evicted when the store grows beyond max_bytes. Environments in use by any process are
+    protected by a shared file lock, so the store can be used by several processes.
+    """
+
+    def __init__(self, root, wheelhouse, max_bytes):
+        self.root = root
+        self.wheelhouse = wheelhouse
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, LOCK_DIR), exist_ok=True)
+
+    def _lock_file(self, key):
+        return open(os.path.join(self.root, LOCK_DIR, f'{key}.lock'), 'w')
+
+    def _complete(self, key):
+        return os.path.exists(os.path.join(self.root, key, MARKER))
+
+    @contextmanager
+    def use(self, requirements_text):
+        """
+        Yield the site directory with the requirements installed, building it if needed,
+        or None if there is nothing to install. The environment is not evicted while in use.
+        Raises RequirementsError or EnvironmentBuildError.
+        """
+        requirements = parse_requirements(requirements_text)
+        if not requirements:
+            yield None
+            return
+        key = requirements_hash(requirements)
+        path = os.path.join(self.root, key)
+        with self._lock_file(key) as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if not self._complete(key):
+                # Converting the lock releases it first, so concurrent users can't deadlock
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if not self._complete(key):
+                    self._build(key, requirements)
+                    self.evict(keep=key)
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            os.utime(os.path.join(path, MARKER))
+            yield path
+
+    def _build(self, key, requirements):
+        path = os.path.join(self.root, key)
+        temp_path = tempfile.mkdtemp(prefix=BUILD_PREFIX, dir=self.root)
+        try:
+            returncode, stderr = run_pip(['install', '--quiet', '--disable-pip-version-check', '--no-index',
+                                          '--find-links', self.wheelhouse, '--only-binary', ':all:',
+                                          '--target', temp_path, *requirements])
+            if returncode != 0:
+                errors = [line.removeprefix('ERROR: ') for line in stderr.splitlines() if line.startswith('ERROR: ')]
+                raise EnvironmentBuildError(errors[0] if errors else f'pip exited with {returncode}')
+            # Dependencies on provided packages are served by the app's installation
+            for name in os.listdir(temp_path):
+                if canonicalize_name(name.split('-')[0].split('.')[0]) in PROVIDED_PACKAGES:
+                    shutil.rmtree(os.path.join(temp_path, name), ignore_errors=True)
+            with open(os.path.join(temp_path, MARKER), 'w') as f:
+                json.dump({'requirements': requirements, 'size': directory_size(temp_path)}, f)
+            if os.path.exists(path):
+                shutil.rmtree(path)  # Left by an interrupted eviction
+            os.rename(temp_path, path)
+        except subprocess.TimeoutExpired:
+            raise EnvironmentBuildError(f'Installing the requirements took more than {BUILD_TIMEOUT} seconds')
+        finally:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+    def environments(self):
+        """Complete environments as (last use, size, key), least recently used first"""
+        environments = []
+        for key in os.listdir(self.root):
+            marker = os.path.join(self.root, key, MARKER)
+            try:
+                with open(marker) as f:
+                    size = json.load(f)['size']
+                environments.append((os.path.getmtime(marker), size, key))
+            except (OSError, ValueError, KeyError):
+                continue
+        return sorted(environments)
+
+    def evict(self, keep=None):
+        """
+        Delete least recently used environments that are not in use until the store fits in
+        max_bytes, and builds abandoned by killed processes. Returns the keys evicted.
+        """
+        for name in os.listdir(self.root):
+            build_path = os.path.join(self.root, name)
+            if name.startswith(BUILD_PREFIX) and os.path.getmtime(build_path) < time.time() - BUILD_TIMEOUT:
+                shutil.rmtree(build_path, ignore_errors=True)
+        environments = self.environments()
+        total = sum(size for _, size, _ in environments)
+        evicted = []
+        for _, size, key in environments:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            with self._lock_file(key) as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Without the marker a half-deleted environment is never used
+                os.remove(os.path.join(self.root, key, MARKER))
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            total -= size
+            evicted.append(key)
+        return evicted
+
+
+def environment_settings():
+    """Environment store settings from the app config, or None if requirements are not installed"""
+    root = current_app.config.get('ENV_CACHE_DIR')
+    if not root:
+        return None
+    return {
+        'root': root,
+        'wheelhouse': current_app.config['ENV_WHEELHOUSE'],
+        'max_bytes': current_app.config['ENV_CACHE_MAX_BYTES']
+    }
+
+
+@contextmanager
+def agent_environment(requirements_text, settings):
+    """Site directory for requirements (see EnvironmentStore.use), None if the store is disabled"""
+    if settings is None:
+        yield None
+        return
+    with EnvironmentStore(**settings).use(requirements_text) as path:
+        yield path
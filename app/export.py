@@ -0,0 +1,80 @@
+import hashlib
+import json
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .tournament import latest_agents
+
+# Concurrent storage reads unless configured otherwise
+EXPORT_WORKERS = 8
+
+
+class _StreamBuffer:
+    """Write-only file object collecting what zipfile writes until it is taken"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _read(backend, path):
+    try:
+        return backend.get(path)
+    except FileNotFoundError:
+        # Replaced or deleted since the listing
+        return None
+
+
+def fetch_in_order(backend, agents, workers):
+    """
+    Yield (agent, ZIP contents or None if it is gone) in the order of agents, reading up to
+    `workers` objects from storage concurrently; at most that many are held in memory.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for agent in agents:
+            pending.append((agent, pool.submit(_read, backend, agent['path'])))
+            if len(pending) >= workers:
+                agent, future = pending.popleft()
+                yield agent, future.result()
+        while pending:
+            agent, future = pending.popleft()
+            yield agent, future.result()
+
+
+def export_agents(backend, workers=EXPORT_WORKERS):
+    """
+    The current version of every stored agent as one ZIP archive, generated in chunks:
+    <group>/<agent>_v<version>.zip per agent and a manifest.json with versions, sizes and
+    SHA-256 hashes at the end. Each chunk is written out before the next agent is added.
+    """
+    agents = latest_agents(backend)
+    buffer = _StreamBuffer()
+    manifest = {'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'agents': []}
+    # Members are ZIPs already, compressing them again gains nothing
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for agent, data in fetch_in_order(backend, agents, workers):
+            if data is None:
+                continue
+            name = f"{agent['group']}/{agent['name']}_v{agent['version']}.zip"
+            archive.writestr(name, data)
+            manifest['agents'].append({
+                'id': agent['id'], 'group': agent['group'], 'name': agent['name'],
+                'version': agent['version'], 'file': name, 'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest()
+            })
+            yield buffer.take()
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2), zipfile.ZIP_DEFLATED)
+    yield buffer.take()
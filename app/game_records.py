@@ -0,0 +1,222 @@
+import json
+import os
+import struct
+import uuid
+from collections import defaultdict
+from .backends import ConcurrentWriteError
+from .tournament import ResultLog, result_revision, revision
+
+# Objects of the game archive in storage
+ARCHIVE_PREFIX = 'games/'
+# A segment is closed once it exceeds this size
+SEGMENT_SIZE = 4 * 1024 * 1024
+# Attempts at storing the index while other processes archive games at the same time
+INDEX_ATTEMPTS = 10
+
+RECORD_MAGIC = b'C4GR'
+RECORD_FORMAT = 2
+# Append only: records store the index
+REASONS = ('connect4', 'draw', 'timeout', 'error', 'illegal', 'load_error', 'crash')
+
+# magic, format, winner (0 for a draw), reason, number of moves, first and second version,
+# seconds, finish time, then the lengths of the first and second agent id, of the error
+# message and of the content hashes of the first and second revision, which follow the
+# header as UTF-8 in this order together with one byte per move
+RECORD_HEADER = struct.Struct('<4sBBBBIIfdHHHBB')
+# Records of format 1 have no revision hashes
+RECORD_HEADERS = {1: struct.Struct('<4sBBBBIIfdHHH'), RECORD_FORMAT: RECORD_HEADER}
+
+
+def encode_record(result):
+    """Pack a tournament result record into its binary form"""
+    first, second = result['first'].encode(), result['second'].encode()
+    # Cut at 1 KB without splitting a character
+    error = result.get('error', '').encode()[:1024].decode(errors='ignore').encode()
+    first_hash, second_hash = (result_revision(result, side).partition('#')[2].encode() for side in ('first', 'second'))
+    moves = bytes(result['moves'])
+    header = RECORD_HEADER.pack(RECORD_MAGIC, RECORD_FORMAT, result['winner'] or 0,
+                                REASONS.index(result['reason']), len(moves),
+                                int(result['first_version']), int(result['second_version']),
+                                result.get('seconds', 0.), result.get('finished', 0.),
+                                len(first), len(second), len(error), len(first_hash), len(second_hash))
+    return header + first + second + error + first_hash + second_hash + moves
+
+
+def decode_record(data, offset=0):
+    """Unpack the record at offset. Returns the result record and the offset of the next one."""
+    magic, record_format = struct.unpack_from('<4sB', data, offset)
+    if magic != RECORD_MAGIC or record_format not in RECORD_HEADERS:
+        raise ValueError(f'Not a game record at offset {offset}')
+    header = RECORD_HEADERS[record_format]
+    (_, _, winner, reason, move_count, first_version, second_version, seconds, finished,
+     first_length, second_length, error_length, *hash_lengths) = header.unpack_from(data, offset)
+    position = offset + header.size
+    fields = []
+    for length in (first_length, second_length, error_length, *hash_lengths, move_count):
+        fields.append(bytes(data[position:position + length]))
+        position += length
+    first, second, error, *hashes, moves = fields
+    first, second = first.decode(), second.decode()
+    first_hash, second_hash = (part.decode() for part in hashes) if hashes else ('', '')
+    first_revision, second_revision = revision(first_version, first_hash), revision(second_version, second_hash)
+    result = {
+        'key': f'{first}@{first_revision}|{second}@{second_revision}',
+        'first': first, 'first_version': str(first_version), 'first_revision': first_revision,
+        'second': second, 'second_version': str(second_version), 'second_revision': second_revision,
+        'winner': winner or None, 'reason': REASONS[reason], 'moves': list(moves),
+        'seconds': round(seconds, 4), 'finished': finished
+    }
+    if error:
+        # Records written before errors were cut on character boundaries may end mid-character
+        result['error'] = error.decode(errors='replace')
+    return result, position
+
+
+def decode_records(data):
+    """All records in a byte string of consecutive records"""
+    records, offset = [], 0
+    while offset < len(data):
+        record, offset = decode_record(data, offset)
+        records.append(record)
+    return records
+
+
+def empty_index():
+    return {'segments': [], 'games': [], 'agents': {}, 'matches': {}}
+
+
+class GameArchive:
+    """
+    Game records packed into segment objects in storage, with an index of the position
+    of every game (numbered in archive order) and of the games by agent and by match key.
+    Segments are immutable and uniquely named; each archive run writes new ones, so the games
+    of a tournament update are stored next to each other. The index is stored with a
+    conditional write, so several processes can archive games at the same time.
+    """
+
+    def __init__(self, backend, prefix=ARCHIVE_PREFIX):
+        self.backend = backend
+        self.prefix = prefix
+        self.index_path = prefix + 'index.json'
+        self._index = None
+        self._generation = None
+
+    def _load(self):
+        try:
+            data, self._generation = self.backend.get_with_generation(self.index_path)
+            self._index = json.loads(data)
+        except FileNotFoundError:
+            self._index, self._generation = empty_index(), None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._load()
+        return self._index
+
+    def __len__(self):
+        return len(self.index['games'])
+
+    def _write_segment(self, records):
+        """Store (result, data) records as a new segment. Returns (result, path, offset, length) per record."""
+        path = f'{self.prefix}segments/{uuid.uuid4().hex}.c4g'
+        self.backend.put_bytes(path, b''.join(data for _, data in records), if_not_exists=True)
+        positions, offset = [], 0
+        for result, data in records:
+            positions.append((result, path, offset, len(data)))
+            offset += len(data)
+        return positions
+
+    def _add(self, positions):
+        """Add the stored records whose match key is not in the index yet. Returns the number added."""
+        index = self.index
+        segments = {path: number for number, path in enumerate(index['segments'])}
+        added = 0
+        for result, path, offset, length in positions:
+            if result['key'] in index['matches']:
+                continue
+            if path not in segments:
+                segments[path] = len(index['segments'])
+                index['segments'].append(path)
+            number = len(index['games'])
+            index['games'].append([segments[path], offset, length])
+            index['matches'][result['key']] = number
+            for agent_id in (result['first'], result['second']):
+                index['agents'].setdefault(agent_id, []).append(number)
+            added += 1
+        return added
+
+    def append(self, results):
+        """
+        Archive result records whose match key is not archived yet, in new segments of about
+        SEGMENT_SIZE bytes, then store the index. If another process stored the index in the
+        meantime, the records are added to its version instead, leaving the records it
+        archived as well unused in the new segments. Returns the number of games added.
+        """
+        pending, size, positions = [], 0, []
+        for result in results:
+            if result['key'] in self.index['matches']:
+                continue
+            data = encode_record(result)
+            pending.append((result, data))
+            size += len(data)
+            if size >= SEGMENT_SIZE:
+                positions += self._write_segment(pending)
+                pending, size = [], 0
+        if pending:
+            positions += self._write_segment(pending)
+        for _ in range(INDEX_ATTEMPTS):
+            added = self._add(positions)
+            if not added:
+                return 0
+            try:
+                self.backend.put_if_generation(self.index_path, json.dumps(self.index, separators=(',', ':')).encode(),
+                                               self._generation)
+            except ConcurrentWriteError:
+                self._load()
+                continue
+            # The generation of the stored index is only known once it is read again
+            self._index = None
+            return added
+        raise ConcurrentWriteError(self.index_path)
+
+    def game(self, number):
+        """Record of game number (0-based), read with a single range request"""
+        segment, offset, length = self.index['games'][number]
+        data = self.backend.read_range(self.index['segments'][segment], offset, offset + length)
+        return decode_record(data)[0]
+
+    def match(self, key):
+        """Record of the game with the given match key ('<first>@<version>|<second>@<version>')"""
+        if key not in self.index['matches']:
+            raise KeyError(key)
+        return self.game(self.index['matches'][key])
+
+    def iter_games_of(self, agent_id):
+        """
+        Records of all archived games of an agent in archive order. The span of its games
+        in each segment is fetched with one range request, usually a single one in total,
+        so at most one segment span is held in memory.
+        """
+        by_segment = defaultdict(list)
+        for number in self.index['agents'].get(agent_id, []):
+            segment, offset, length = self.index['games'][number]
+            by_segment[segment].append((offset, length))
+        for segment, positions in sorted(by_segment.items()):
+            start, end = positions[0][0], positions[-1][0] + positions[-1][1]
+            data = memoryview(self.backend.read_range(self.index['segments'][segment], start, end))
+            for offset, _ in positions:
+                yield decode_record(data, offset - start)[0]
+
+    def games_of(self, agent_id):
+        return list(self.iter_games_of(agent_id))
+
+
+def archive_results(backend, work_dir):
+    """
+    Archive the results in <work_dir>/results.jsonl whose game key is not archived yet.
+    Games are recognised by key rather than by a position in the log, so the logs of
+    several hosts and compacted logs are archived alike. Returns the number of games added.
+    """
+    results = ResultLog(os.path.join(work_dir, 'results.jsonl')).load()
+    return GameArchive(backend).append(results.values())
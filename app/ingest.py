@@ -0,0 +1,88 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from flask import Request, current_app
+
+# Read size used when copying streams that were not spooled during parsing
+CHUNK_SIZE = 256 * 1024
+
+
+class SpoolFile:
+    """
+    File written once to the upload spool directory while the request body is parsed.
+    SHA-256 and size are computed on the fly, so the upload never has to be re-read to hash it.
+    The file is deleted on close unless it was detached.
+    """
+
+    def __init__(self, spool_dir):
+        os.makedirs(spool_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix='.zip', dir=spool_dir)
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self._detached = False
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def detach(self):
+        """Hand the spooled file over to the caller; it will no longer be deleted on close"""
+        self._file.flush()
+        self._detached = True
+        return self.path
+
+    def close(self):
+        self._file.close()
+        if not self._detached and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SpoolingRequest(Request):
+    """Request that streams uploaded files straight into the spool directory"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpoolFile(current_app.config['UPLOAD_SPOOL_DIR'])
+
+
+def spool_upload(file):
+    """
+    Return the SpoolFile backing an uploaded werkzeug FileStorage, flushed and rewound.
+    Streams that were not spooled during parsing are copied into a new spool file in chunks.
+    """
+    spool = file.stream
+    if not isinstance(spool, SpoolFile):
+        spool = SpoolFile(current_app.config['UPLOAD_SPOOL_DIR'])
+        file.stream.seek(0)
+        shutil.copyfileobj(file.stream, spool, CHUNK_SIZE)
+        file.stream = spool
+    spool.flush()
+    spool.seek(0)
+    return spool
+
+
+def file_sha256(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,245 @@
+import json
+from contextlib import closing
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from flask import current_app
+
+# Registered job handlers: kind -> callable(job, set_progress) -> (status, message)
+_handlers = {}
+# Worker lane of each kind: every lane has its own worker thread per process
+_lanes = {}
+
+_queues = {}
+_workers = {}
+_registry_lock = threading.Lock()
+
+
+def handler(kind, lane='default'):
+    """
+    Register a function as the handler for jobs of the given kind. Jobs of a lane other than
+    'default' are processed by a worker of their own, so long jobs don't hold up the others.
+    """
+    def decorator(f):
+        _handlers[kind] = f
+        _lanes[kind] = lane
+        return f
+    return decorator
+
+
+def lane_kinds(lane):
+    """Kinds of jobs processed by a lane"""
+    return sorted(kind for kind, kind_lane in _lanes.items() if kind_lane == lane)
+
+
+class JobQueue:
+    """
+    Persistent job queue backed by a local SQLite database.
+    Safe to share between threads and between web worker processes on the same instance.
+    """
+
+    def __init__(self, db_path, lease_seconds=300):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        with closing(self._connect()) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    message TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def enqueue(self, kind, payload, owner):
+        """Add a job and return its ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, owner, payload, status, progress, created, updated) '
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, kind, owner, json.dumps(payload), now, now))
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dictionary, or None if unknown"""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_for_owner(self, owner, limit=10):
+        """Return the most recent jobs of an owner, newest first"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT * FROM jobs WHERE owner = ? ORDER BY created DESC LIMIT ?',
+                                (owner, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def claim(self, kinds=None, skip=()):
+        """
+        Atomically take the oldest queued job and mark it as running, only of the given kinds
+        if any and never of the kinds to skip.
+        Running jobs whose lease expired (e.g. their worker process died) are claimed again.
+        Returns None when there is nothing to do.
+        """
+        now = time.time()
+        conditions, values = [], [now - self.lease_seconds]
+        if kinds is not None:
+            conditions.append(f"kind IN ({', '.join('?' * len(kinds))})")
+            values.extend(kinds)
+        if skip:
+            conditions.append(f"kind NOT IN ({', '.join('?' * len(skip))})")
+            values.extend(skip)
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' OR (status = 'running' AND updated < ?)) "
+                + ''.join(f'AND {condition} ' for condition in conditions)
+                + 'ORDER BY created LIMIT 1', values).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', progress = 'started', updated = ? WHERE id = ?",
+                         (now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        job = self._to_dict(row)
+        job['status'] = 'running'
+        return job
+
+    def update(self, job_id, status=None, progress=None, message=None):
+        """Update status, progress and/or message of a job"""
+        fields, values = ['updated = ?'], [time.time()]
+        for column, value in (('status', status), ('progress', progress), ('message', message)):
+            if value is not None:
+                fields.append(f'{column} = ?')
+                values.append(value)
+        with closing(self._connect()) as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE id = ?", (*values, job_id))
+
+    def renew(self, job_id):
+        """Extend the lease of a running job"""
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def depth(self):
+        """Number of jobs waiting to be processed"""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+
+class JobWorker(threading.Thread):
+    """Background thread that processes the jobs of one lane from a queue inside an app context"""
+
+    def __init__(self, app, queue, poll_interval=1.0, lane='default'):
+        super().__init__(name=f'job-worker-{lane}', daemon=True)
+        self.app = app
+        self.queue = queue
+        self.lane = lane
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            if not self.run_pending():
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+    def run_pending(self):
+        """Process a single job if one is available. Returns True if a job was processed."""
+        if self.lane == 'default':
+            # Including kinds without a handler, which are failed
+            job = self.queue.claim(skip=[kind for kind, lane in _lanes.items() if lane != 'default'])
+        else:
+            job = self.queue.claim(kinds=lane_kinds(self.lane))
+        if job is None:
+            return False
+        with self.app.app_context():
+            process_job(self.queue, job)
+        return True
+
+
+def process_job(queue, job):
+    """Run the handler of a claimed job and record its outcome"""
+    job_handler = _handlers.get(job['kind'])
+    if job_handler is None:
+        queue.update(job['id'], status='failed', progress='failed', message=f"Unknown job kind: {job['kind']}")
+        return
+    done = threading.Event()
+    heartbeat = threading.Thread(target=renew_lease, args=(queue, job['id'], done), name='job-heartbeat', daemon=True)
+    heartbeat.start()
+    try:
+        status, message = job_handler(job, lambda progress: queue.update(job['id'], progress=progress))
+    except Exception as e:
+        current_app.logger.error(f"Job {job['id']} failed: {traceback.format_exc()}")
+        status, message = 'failed', f'Unexpected error: {str(e)}'
+    finally:
+        done.set()
+        heartbeat.join()
+    queue.update(job['id'], status=status, progress=status, message=message)
+
+
+def renew_lease(queue, job_id, done):
+    """
+    Renew the lease of a running job until done is set, so jobs running longer than the lease
+    are not claimed again by another worker. If the process dies the lease expires as before.
+    """
+    while not done.wait(max(queue.lease_seconds / 3, 0.05)):
+        queue.renew(job_id)
+
+
+def get_job_queue():
+    """Get the job queue configured for the current app"""
+    db_path = current_app.config['JOB_DB_PATH']
+    with _registry_lock:
+        if db_path not in _queues:
+            _queues[db_path] = JobQueue(db_path, current_app.config['JOB_LEASE_SECONDS'])
+        return _queues[db_path]
+
+
+def ensure_worker(lane='default'):
+    """Start this process's background worker of a lane for the current app if it isn't running"""
+    app = current_app._get_current_object()
+    queue = get_job_queue()
+    with _registry_lock:
+        worker = _workers.get((id(app), lane))
+        if worker is None or not worker.is_alive():
+            worker = JobWorker(app, queue, lane=lane)
+            _workers[(id(app), lane)] = worker
+            worker.start()
+    return worker
+
+
+def submit(kind, payload, owner):
+    """Enqueue a job, make sure a worker of its lane will pick it up and return the job ID"""
+    job_id = get_job_queue().enqueue(kind, payload, owner)
+    ensure_worker(_lanes.get(kind, 'default')).wakeup.set()
+    return job_id
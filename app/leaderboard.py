@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from flask import current_app
+from .storage import get_backend
+from .tournament import ResultLog, latest_agents, result_revision
+
+# Object holding the precomputed leaderboard
+SNAPSHOT_PATH = 'results/leaderboard.json'
+INITIAL_RATING = 1500.
+K_FACTOR = 32.
+
+# Process-wide cache of the snapshot: backend id -> (expiry time, etag, snapshot)
+_snapshot_cache = {}
+_snapshot_cache_lock = threading.Lock()
+
+
+def empty_snapshot():
+    return {'applied': [], 'games': 0, 'updated': None, 'agents': {}}
+
+
+def new_entry(agent_id, version='0', revision=None):
+    group_name, agent_name = agent_id.split('/', 1)
+    return {'group': group_name, 'name': agent_name, 'version': version, 'revision': revision or version,
+            'revisions': [revision] if revision else [], 'rating': INITIAL_RATING,
+            'games': 0, 'wins': 0, 'draws': 0, 'losses': 0}
+
+
+def reset_counts(entry, version, revision):
+    """Start the win/draw/loss table of a new current revision; the rating carries over"""
+    entry.update(version=version, revision=revision, games=0, wins=0, draws=0, losses=0)
+    if revision not in entry['revisions']:
+        entry['revisions'].append(revision)
+
+
+def game_agents(key):
+    """(agent id, revision) of both agents of a game key"""
+    return [tuple(side.rsplit('@', 1)) for side in key.split('|')]
+
+
+def expected_score(rating, opponent_rating):
+    return 1. / (1. + 10 ** ((opponent_rating - rating) / 400.))
+
+
+def apply_result(snapshot, result):
+    """
+    Update ratings and tables with one game result. Results of revisions that were current
+    before the current one are ignored, while an unseen revision becomes the current one:
+    an upload reusing a deleted version number is a new agent, not an old one.
+    Returns True if the result was applied.
+    """
+    entries = []
+    for side in ('first', 'second'):
+        entry = snapshot['agents'].setdefault(result[side], new_entry(result[side]))
+        revision = result_revision(result, side)
+        if revision != entry['revision'] and revision in entry['revisions']:
+            return False
+        entries.append((entry, result[f'{side}_version'], revision))
+    for entry, version, revision in entries:
+        if revision != entry['revision']:
+            reset_counts(entry, version, revision)
+
+    first, second = entries[0][0], entries[1][0]
+    score = {1: 1., 2: 0.}.get(result['winner'], .5)
+    expected = expected_score(first['rating'], second['rating'])
+    first['rating'] += K_FACTOR * (score - expected)
+    second['rating'] -= K_FACTOR * (score - expected)
+    for entry, entry_score in ((first, score), (second, 1. - score)):
+        entry['games'] += 1
+        entry[{1.: 'wins', .5: 'draws', 0.: 'losses'}[entry_score]] += 1
+    snapshot['games'] += 1
+    return True
+
+
+def load_snapshot(backend):
+    try:
+        snapshot = json.loads(backend.get(SNAPSHOT_PATH))
+    except FileNotFoundError:
+        return empty_snapshot()
+    # Snapshots that tracked a log offset don't say which games they contain
+    return snapshot if 'applied' in snapshot else empty_snapshot()
+
+
+def update_leaderboard(backend, work_dir, rebuild=False):
+    """
+    Apply the results in <work_dir>/results.jsonl that the stored snapshot doesn't contain yet
+    and write it back, so ratings only change by the new games. The snapshot keeps the keys of
+    the games it applied rather than a position in the log, since each host has a log of its
+    own and compacting a log moves its lines. With rebuild=True the log is replayed from scratch.
+    Only results of stored revisions are applied, and only current agent versions are listed;
+    counts are for the current version, ratings carry over.
+    """
+    snapshot = empty_snapshot() if rebuild else load_snapshot(backend)
+    agents = latest_agents(backend)
+    stored = {(agent['id'], revision) for agent in agents for revision in agent['revisions']}
+    # Keys of games whose agents were deleted can't come up again once the logs are compacted
+    applied = {key for key in snapshot['applied'] if all(agent in stored for agent in game_agents(key))}
+    for key, result in ResultLog(os.path.join(work_dir, 'results.jsonl')).load().items():
+        if key in applied or not all(agent in stored for agent in game_agents(key)):
+            continue
+        applied.add(key)
+        try:
+            apply_result(snapshot, result)
+        except (ValueError, KeyError):
+            continue
+
+    entries = {}
+    for agent in agents:
+        agent_id = agent['id']
+        entry = entries[agent_id] = snapshot['agents'].get(agent_id) or new_entry(agent_id, agent['version'],
+                                                                                 agent['revision'])
+        if entry['revision'] != agent['revision']:
+            # Not played yet, or rolled back to an earlier version
+            reset_counts(entry, agent['version'], agent['revision'])
+    snapshot['agents'] = entries
+    snapshot['applied'] = sorted(applied)
+    snapshot['updated'] = time.time()
+    backend.put_bytes(SNAPSHOT_PATH, json.dumps(snapshot, separators=(',', ':')).encode())
+    return snapshot
+
+
+def standings(snapshot):
+    """Leaderboard rows sorted by rating, with rank and points (1 per win, 1/2 per draw)"""
+    rows = sorted(({'id': agent_id, **entry, 'rating': round(entry['rating']),
+                    'points': entry['wins'] + entry['draws'] / 2}
+                   for agent_id, entry in snapshot['agents'].items()),
+                  key=lambda row: (-row['rating'], -row['points'], row['id']))
+    for rank, row in enumerate(rows, start=1):
+        row['rank'] = rank
+    return rows
+
+
+def get_leaderboard():
+    """
+    The current snapshot and its ETag, read with a single storage request and
+    cached for LEADERBOARD_TTL seconds per process.
+    """
+    backend = get_backend()
+    with _snapshot_cache_lock:
+        expires, etag, snapshot = _snapshot_cache.get(id(backend), (0, None, None))
+    if snapshot is not None and expires > time.monotonic():
+        return etag, snapshot
+    try:
+        data = backend.get(SNAPSHOT_PATH)
+    except FileNotFoundError:
+        data = json.dumps(empty_snapshot()).encode()
+    etag, snapshot = hashlib.sha256(data).hexdigest()[:32], json.loads(data)
+    with _snapshot_cache_lock:
+        _snapshot_cache[id(backend)] = (time.monotonic() + current_app.config['LEADERBOARD_TTL'], etag, snapshot)
+    return etag, snapshot
@@ -0,0 +1,101 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+
+def cloud_sink(cloud_logger):
+    """Sink writing a batch of entries to Cloud Logging in a single API call"""
+    def ship(entries):
+        with cloud_logger.batch() as batch:
+            for entry in entries:
+                batch.log_struct(entry)
+    return ship
+
+
+def stdout_sink(entries):
+    """Sink writing entries as JSON lines to stdout (picked up as structured logs on App Engine)"""
+    sys.stdout.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+    sys.stdout.flush()
+
+
+class LogShipper:
+    """
+    Ships structured log entries from a bounded in-memory queue to a sink in batches
+    on a background thread. When the queue is full new entries are dropped and counted.
+    """
+
+    def __init__(self, sink, max_queue=10000, batch_size=100, flush_interval=1.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._counter_lock = threading.Lock()
+        self.submitted = 0
+        self.shipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        """Queue an entry without blocking. Returns False if it was dropped."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+            return False
+        with self._counter_lock:
+            self.submitted += 1
+        return True
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            try:
+                entries = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(entries) < self.batch_size:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.sink(entries)
+                with self._counter_lock:
+                    self.shipped += len(entries)
+            except Exception as e:
+                with self._counter_lock:
+                    self.failed += len(entries)
+                logging.getLogger(__name__).warning(f"Failed to ship {len(entries)} log entries: {str(e)}")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until all queued entries have been shipped. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=5.0):
+        """Ship what is queued and stop the background thread"""
+        self._closed.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._counter_lock:
+            return {
+                'submitted': self.submitted,
+                'shipped': self.shipped,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'queued': self._queue.qsize()
+            }
@@ -0,0 +1,142 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """
+    Process-local counters and histograms, rendered in the Prometheus text format.
+    Gauges are read when scraped from collector functions, which return a list of
+    (name, help, {label tuple: value}) entries.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name, help_text, value=1, **labels):
+        """Add value to a counter"""
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, help_text, value, **labels):
+        """Record one observation (e.g. a duration in seconds) in a histogram"""
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            # Per-bucket counts, sum and number of observations
+            histogram = series.setdefault(key, [[0] * (len(self.buckets) + 1), 0., 0])
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f'# HELP {name} {self._help[name]}', f'# TYPE {name} counter']
+                lines += [f'{name}{_format_labels(key)} {value}' for key, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f'# HELP {name} {self._help[name]}', f'# TYPE {name} histogram']
+                for key, (counts, total, count) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{_format_labels(key + (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {total}')
+                    lines.append(f'{name}_count{_format_labels(key)} {count}')
+        for collector in self._collectors:
+            for name, help_text, series in collector():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+                lines += [f'{name}{_format_labels(key)} {value}' for key, value in series.items()]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._help.clear()
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Metrics of this process
+registry = MetricsRegistry()
+
+
+def record_stage(name, seconds):
+    """Record the duration of a stage in the stage histogram and in the current request's timings"""
+    registry.observe('c4_stage_seconds', 'Duration of instrumented stages', seconds, stage=name)
+    if has_request_context():
+        if 'stage_timings' not in g:
+            g.stage_timings = []
+        g.stage_timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as a stage, see record_stage()"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def count(name, help_text, **labels):
+    registry.inc(name, help_text, **labels)
+
+
+def server_timing(timings, total):
+    """Server-Timing header value; repeated stages are summed, in order of first occurrence"""
+    durations = {}
+    for name, seconds in timings:
+        durations[name] = durations.get(name, 0.) + seconds
+    durations['total'] = total
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in durations.items())
+
+
+def init_app(app):
+    """Time every request, record it in the request histogram and add a Server-Timing header"""
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        registry.observe('c4_request_seconds', 'Duration of HTTP requests', elapsed,
+                         endpoint=request.endpoint or 'unknown', method=request.method,
+                         status=response.status_code)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = server_timing(g.get('stage_timings', []), elapsed)
+        return response
@@ -0,0 +1,215 @@
+import ctypes
+import random
+import signal
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+ROWS = 6
+COLUMNS = 7
+# Bits per column: one per row plus an always-empty sentinel bit separating the columns
+COLUMN_BITS = ROWS + 1
+# Shifts to the neighbouring cell in each line direction: vertical, horizontal and both diagonals
+DIRECTIONS = (1, COLUMN_BITS, COLUMN_BITS - 1, COLUMN_BITS + 1)
+
+# Bit of the top cell of every column
+TOP_MASKS = np.array([1 << (column * COLUMN_BITS + ROWS - 1) for column in range(COLUMNS)], dtype=np.uint64)
+
+
+class MoveTimeout(BaseException):
+    """Raised in an agent that exceeds its move time; not an Exception so agents can't swallow it"""
+
+
+def _alarm(signum, frame):
+    raise MoveTimeout()
+
+
+def _raise_in_thread(thread_id, exception):
+    """Raise exception asynchronously in a thread (None clears a pending one); returns False if there is no such thread"""
+    return ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id),
+                                                      ctypes.py_object(exception) if exception else None) == 1
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Interrupt the block with MoveTimeout after seconds: with SIGALRM in the main thread,
+    from a timer thread otherwise (e.g. validating in a request worker). Native code is
+    only interrupted once it returns to Python, so callers also check the time taken.
+    """
+    if threading.current_thread() is threading.main_thread():
+        previous = signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+        try:
+            yield
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        return
+    thread_id = threading.get_ident()
+    lock = threading.Lock()
+    state = {'active': True}
+
+    def expire():
+        with lock:
+            if state['active']:
+                _raise_in_thread(thread_id, MoveTimeout)
+
+    timer = threading.Timer(seconds, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        with lock:
+            state['active'] = False
+            timer.cancel()
+            # A timeout that fired as the block ended must not surface in the caller
+            _raise_in_thread(thread_id, None)
+
+
+def has_four(mask):
+    """True if the stones of a bitboard mask contain four in a row"""
+    for shift in DIRECTIONS:
+        pairs = mask & (mask >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+
+class Board:
+    """
+    Connect 4 position as two bitboards, one per player.
+    Column c uses bits c*7 .. c*7+5 from the bottom row up, so a move is a single bit
+    operation and a win is detected with a few shifts. Players are numbered 1 and 2;
+    player 1 moves first.
+    """
+
+    def __init__(self):
+        self.masks = [0, 0]
+        # Bit index of the lowest free cell of each column
+        self.heights = [column * COLUMN_BITS for column in range(COLUMNS)]
+        self.moves = 0
+        self.winner = None
+
+    @classmethod
+    def from_moves(cls, columns):
+        board = cls()
+        for column in columns:
+            board.play(column)
+        return board
+
+    def copy(self):
+        board = Board()
+        board.masks = list(self.masks)
+        board.heights = list(self.heights)
+        board.moves = self.moves
+        board.winner = self.winner
+        return board
+
+    @property
+    def current_player(self):
+        return 1 + self.moves % 2
+
+    @property
+    def occupied(self):
+        return self.masks[0] | self.masks[1]
+
+    def can_play(self, column):
+        return 0 <= column < COLUMNS and self.heights[column] < column * COLUMN_BITS + ROWS
+
+    def legal_moves(self):
+        return [column for column in range(COLUMNS) if self.can_play(column)]
+
+    def play(self, column):
+        """Drop a stone of the current player into a column. Returns True if the move wins."""
+        if self.winner is not None or not self.can_play(column):
+            raise ValueError(f'Illegal move: {column}')
+        player = self.moves % 2
+        self.masks[player] |= 1 << self.heights[column]
+        self.heights[column] += 1
+        self.moves += 1
+        if has_four(self.masks[player]):
+            self.winner = player + 1
+            return True
+        return False
+
+    def is_full(self):
+        return self.moves == ROWS * COLUMNS
+
+    def is_over(self):
+        return self.winner is not None or self.is_full()
+
+    def to_array(self):
+        """Board as passed to agents: int8 array of shape (6, 7), row 0 at the bottom, 0 for empty cells"""
+        board = np.zeros((ROWS, COLUMNS), dtype=np.int8)
+        for player, mask in enumerate(self.masks, start=1):
+            for column in range(COLUMNS):
+                for row in range(ROWS):
+                    if mask >> (column * COLUMN_BITS + row) & 1:
+                        board[row, column] = player
+        return board
+
+
+def legal_moves(occupied, moves):
+    """
+    Legality of many moves at once.
+    occupied holds the occupied-cell bitboards of the positions, moves the chosen columns;
+    a move is legal if it is a column index whose top cell is still empty.
+    """
+    moves = np.asarray(moves, dtype=np.int64)
+    in_range = (moves >= 0) & (moves < COLUMNS)
+    tops = TOP_MASKS[np.where(in_range, moves, 0)]
+    return in_range & ((np.asarray(occupied, dtype=np.uint64) & tops) == 0)
+
+
+def validation_positions(count=16, max_plies=5, seed=0):
+    """
+    Deterministic set of early-game positions for both players, starting with the empty board.
+    With at most five stones played no column is full and nobody has won yet.
+    """
+    rng = random.Random(seed)
+    positions = [Board(), Board.from_moves([COLUMNS // 2])]
+    while len(positions) < count:
+        positions.append(Board.from_moves(rng.randrange(COLUMNS) for _ in range(rng.randint(1, max_plies))))
+    return positions
+
+
+def validate_agent_function(generate_move, timeout, positions=None, total_timeout=None):
+    """
+    Check an agent's generate_move(board, player, timeout) on a set of positions.
+    Returns (valid, error): error is the exception raised by the agent (or a TimeoutError
+    if a move took longer than timeout seconds, or all moves together longer than
+    total_timeout, which defaults to timeout), valid is False if any returned move is
+    not an integer column that can be played. Moves are interrupted at the limit, so the
+    check ends in bounded time even if the agent never returns.
+    """
+    positions = positions or validation_positions()
+    total_timeout = timeout if total_timeout is None else total_timeout
+    moves = np.empty(len(positions), dtype=np.int64)
+    check_start = time.perf_counter()
+    for i, board in enumerate(positions):
+        limit = min(timeout, total_timeout - (time.perf_counter() - check_start))
+        start = time.perf_counter()
+        move = None
+        if limit > 0:
+            try:
+                with deadline(limit):
+                    move = generate_move(board.to_array(), np.int8(board.current_player), timeout)
+            except MoveTimeout:
+                pass
+            except Exception as e:
+                return False, e
+        elapsed = time.perf_counter() - start
+        if elapsed >= limit:
+            if limit < timeout:
+                return False, TimeoutError(f'generate_move took more than {total_timeout:.0f} seconds '
+                                           f'for {i + 1} of {len(positions)} positions')
+            return False, TimeoutError(f'generate_move took {elapsed:.1f} seconds, the limit is {timeout:.0f}')
+        if isinstance(move, (bool, np.bool_)) or not isinstance(move, (int, np.integer)):
+            return False, None
+        # Out of range values (of any size) are all equally illegal
+        moves[i] = move if 0 <= move < COLUMNS else -1
+    occupied = np.array([board.occupied for board in positions], dtype=np.uint64)
+    return bool(legal_moves(occupied, moves).all()), None
@@ -0,0 +1,23 @@
+import time
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from ..export import export_agents
+from ..storage import get_backend, get_clients, log_message
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+@bp.before_request
+def require_admin_token():
+    """Admin endpoints need "Authorization: Bearer <ADMIN_TOKEN>" and are disabled without a token"""
+    token = current_app.config['ADMIN_TOKEN']
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+
+@bp.route('/export')
+def export():
+    """Current versions of all agents with a manifest, streamed as one ZIP archive"""
+    _, logger = get_clients()
+    log_message(logger, "Exporting all current agents", "INFO", "admin")
+    chunks = export_agents(get_backend(), current_app.config['EXPORT_WORKERS'])
+    filename = f"agents-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}.zip"
+    return Response(stream_with_context(chunks), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
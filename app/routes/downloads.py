@@ -0,0 +1,110 @@
+import json
+import zlib
+from flask import Blueprint, Response, abort, current_app, redirect, request, session, stream_with_context
+from werkzeug.wsgi import wrap_file
+from .upload import login_required
+from ..backends import CHUNK_SIZE
+from ..game_records import GameArchive
+from ..storage import get_backend
+
+bp = Blueprint('downloads', __name__, url_prefix='/downloads')
+
+
+def accepts_gzip():
+    return 'gzip' in request.accept_encodings
+
+
+def gzip_stream(chunks):
+    """Compress a stream of byte chunks on the fly as a gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def read_chunks(file):
+    with file:
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def stream_object(path, download_name, mimetype='application/octet-stream', compress=True):
+    """
+    Send a stored object without buffering it in the worker: a redirect to a signed URL if
+    DOWNLOAD_SIGNED_URLS is set and the store supports them, otherwise streamed in chunks.
+    Range requests get the requested bytes; full downloads are gzip-compressed for clients
+    that accept it.
+    """
+    backend = get_backend()
+    try:
+        size = backend.size(path)
+    except FileNotFoundError:
+        abort(404)
+    if current_app.config['DOWNLOAD_SIGNED_URLS']:
+        url = backend.signed_url(path, current_app.config['DOWNLOAD_URL_TTL'])
+        if url:
+            return redirect(url)
+
+    headers = {'Content-Disposition': f'attachment; filename="{download_name}"', 'Vary': 'Accept-Encoding'}
+    if compress and accepts_gzip() and 'Range' not in request.headers:
+        response = Response(stream_with_context(gzip_stream(read_chunks(backend.open(path)))),
+                            mimetype=mimetype, headers=headers)
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    response = Response(wrap_file(request.environ, backend.open(path), CHUNK_SIZE),
+                        mimetype=mimetype, headers=headers, direct_passthrough=True)
+    response.content_length = size
+    # Stored objects are immutable, so name and size identify the contents
+    response.set_etag(f'{path}:{size}')
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response.make_conditional(request, accept_ranges=True, complete_length=size)
+
+
+@bp.route('/games/<agent_name>')
+@login_required
+def agent_games(agent_name):
+    """All archived games of one of the team's agents as JSON lines, streamed segment by segment"""
+    agent_id = f"{session['group_name']}/{agent_name}"
+    archive = GameArchive(get_backend())
+    if not archive.index['agents'].get(agent_id):
+        abort(404)
+    lines = (json.dumps(game).encode() + b'\n' for game in archive.iter_games_of(agent_id))
+    response = Response(stream_with_context(gzip_stream(lines) if accepts_gzip() else lines),
+                        mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': f'attachment; filename="{agent_name}-games.jsonl"',
+                                 'Vary': 'Accept-Encoding'})
+    if accepts_gzip():
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@bp.route('/games/<agent_name>/<int:number>')
+@login_required
+def game(agent_name, number):
+    """Replay record of one archived game in which the agent played"""
+    agent_id = f"{session['group_name']}/{agent_name}"
+    archive = GameArchive(get_backend())
+    if number not in archive.index['agents'].get(agent_id, []):
+        abort(404)
+    return archive.game(number)
+
+
+@bp.route('/tournament')
+@login_required
+def tournament_segments():
+    """Segments of the tournament log, which holds the games of all participating teams"""
+    archive = GameArchive(get_backend())
+    return {'games': len(archive), 'segments': list(range(len(archive.index['segments'])))}
+
+
+@bp.route('/tournament/<int:segment>')
+@login_required
+def tournament_segment(segment):
+    """One segment of binary game records, streamed with Range support"""
+    segments = GameArchive(get_backend()).index['segments']
+    if segment >= len(segments):
+        abort(404)
+    return stream_object(segments[segment], f'games-{segment:06d}.c4g')
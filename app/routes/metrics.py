@@ -0,0 +1,37 @@
+from flask import Blueprint, current_app, request, abort, Response
+from .. import metrics, jobs, validator
+from ..storage import log_shipper_stats
+
+bp = Blueprint('metrics', __name__)
+
+def collect_gauges():
+    """Queue depths, cache and log shipper state of this process, read at scrape time"""
+    gauges = []
+    if current_app.config['UPLOAD_ASYNC']:
+        gauges.append(('c4_upload_jobs_queued', 'Upload jobs waiting to be processed',
+                       {(): jobs.get_job_queue().depth()}))
+    if validator._pool is not None:
+        gauges.append(('c4_validations_pending', 'Validations running or waiting for a sandbox process',
+                       {(): validator._pool.pending}))
+    cache = validator.get_validation_cache()
+    if cache is not None:
+        gauges.append(('c4_validation_cache', 'Validation cache hits, misses and entries',
+                       {(('kind', kind),): value for kind, value in sorted(cache.stats().items())}))
+    shipper_stats = log_shipper_stats()
+    if shipper_stats is not None:
+        gauges.append(('c4_log_entries', 'Log entries submitted, shipped, dropped, failed and queued',
+                       {(('state', state),): value for state, value in sorted(shipper_stats.items())}))
+    return gauges
+
+metrics.registry.add_collector(collect_gauges)
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """
+    Metrics of this worker process in the Prometheus text format. Needs
+    "Authorization: Bearer <METRICS_TOKEN>" and is disabled without a token.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,24 @@
+import time
+from flask import Blueprint, render_template, request, session, make_response
+from ..leaderboard import get_leaderboard, standings
+
+bp = Blueprint('results', __name__)
+
+@bp.route('/results')
+def results():
+    """Tournament leaderboard, rendered from the precomputed snapshot"""
+    etag, snapshot = get_leaderboard()
+    # The navigation of base.html differs for logged in teams
+    etag = f"{etag}-{'team' if 'group_id' in session else 'public'}"
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        updated = snapshot['updated'] and time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime(snapshot['updated']))
+        response = make_response(render_template('results.html',
+                                                 rows=standings(snapshot),
+                                                 games=snapshot['games'],
+                                                 updated=updated))
+    response.set_etag(etag)
+    # Browsers revalidate every time; unchanged leaderboards cost a 304 without a body
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
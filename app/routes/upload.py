@@ -1,9 +1,13 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, current_app, jsonify, abort
 from werkzeug.utils import secure_filename
 from functools import wraps
+import os
 import re
-from ..storage import get_clients, save_agent, delete_agent, get_team_agents, log_message
+from ..storage import get_clients, save_agent, delete_agent, rollback_agent, get_team_agents, log_message
 from ..validator import validate_submission
+from ..ingest import spool_upload
+from .. import jobs, metrics
+from ..tournament import schedule_update
 
 bp = Blueprint('upload', __name__)
 
@@ -24,49 +28,55 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def wants_json():
+    """True if the client asked for a JSON response (async upload form)"""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def reject(message, log_text, status=400, severity="ERROR"):
+    """Report an upload error as a flash message or, for JSON clients, as a JSON error"""
+    _, logger = get_clients()
+    log_message(logger, log_text, severity, "upload")
+    if wants_json():
+        return jsonify({'error': message}), status
+    flash(message)
+    return redirect(request.url)
+
 @bp.route('/upload', methods=['GET', 'POST'])
 @login_required
 def upload():
     # Get current agents and initialize logging
     storage_client, logger = get_clients()
     group_name = session['group_name']
-    agents = get_team_agents(group_name)
+    with metrics.stage('agents'):
+        # The cached list may predate uploads handled by other workers; the agent limit needs a fresh one
+        agents = get_team_agents(group_name, use_cache=request.method != 'POST')
     
     if request.method == 'POST':
         log_message(logger, f"Upload request received from {group_name}", "INFO", "upload")
         
+        # Parsing the form streams the upload to the spool directory
+        with metrics.stage('parse'):
+            request.files
         if 'submission' not in request.files:
-            flash('No file uploaded')
-            log_message(logger, "No file in request", "ERROR", "upload")
-            return redirect(request.url)
+            return reject('No file uploaded', "No file in request")
         
         file = request.files['submission']
         if file.filename == '':
-            flash('No file selected')
-            log_message(logger, "Empty filename", "ERROR", "upload")
-            return redirect(request.url)
+            return reject('No file selected', "Empty filename")
         
         if not file.filename.endswith('.zip'):
-            flash('Please upload a ZIP file')
-            log_message(logger, "Invalid file type", "ERROR", "upload")
-            return redirect(request.url)
+            return reject('Please upload a ZIP file', "Invalid file type")
         
         if 'agent_name' not in request.form:
-            flash('Please provide a name for your agent')
-            log_message(logger, "No agent name provided", "ERROR", "upload")
-            return redirect(request.url)
+            return reject('Please provide a name for your agent', "No agent name provided")
         
         agent_name = secure_filename(request.form['agent_name'].strip())
         # Validate agent name
         if not re.match(r'^[A-Za-z0-9-]+$', agent_name):
-            flash('Agent name can only contain letters, numbers, and hyphens')
-            log_message(logger, "Invalid agent name", "ERROR", "upload")
-            return redirect(request.url)
+            return reject('Agent name can only contain letters, numbers, and hyphens', "Invalid agent name")
         
         if not agent_name:
-            flash('Agent name cannot be empty')
-            log_message(logger, "Empty agent name", "ERROR", "upload")
-            return redirect(request.url)
+            return reject('Agent name cannot be empty', "Empty agent name")
 
         
         
@@ -76,27 +86,37 @@ def upload():
         if not is_update:
             # Check if we're at the agent limit for new uploads
             if len(agents) >= 2:
-                flash('You can only have up to 2 agents. Please delete one first.')
-                log_message(logger, f"Agent limit reached for {group_name}", "INFO", "upload")
-                return redirect(request.url)
+                return reject('You can only have up to 2 agents. Please delete one first.',
+                              f"Agent limit reached for {group_name}", 409, "INFO")
+        
+        if current_app.config['UPLOAD_ASYNC']:
+            job_id = enqueue_upload(file, group_name, agent_name, is_update)
+            log_message(logger, f"Upload of {agent_name} queued as job {job_id}", "INFO", "upload")
+            status_url = url_for('upload.upload_status', job_id=job_id)
+            if wants_json():
+                return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url}), 202
+            flash(f'Agent "{agent_name}" received and is being validated')
+            return redirect(url_for('upload.upload'), 303)
         
-        # Read the entire file for validation
-        zip_content = file.read()
+        # The upload was spooled to disk and hashed while the request was parsed
+        spool = spool_upload(file)
         
         # Validate submission
-        validation_result = validate_submission(zip_content)
+        validation_result = validate_submission(spool.path, spool.sha256)
         if not validation_result['valid']:
             flash(f"Invalid submission: {validation_result['message']}")
             log_message(logger, f"Validation failed: {validation_result['message']}", "ERROR", "upload")
             return redirect(request.url)
         
-        # Reset file pointer after validation
+        # Upload from the start of the spooled file
         file.seek(0)
         
         # Save the agent
-        storage_path = save_agent(file, group_name, agent_name, is_update)
+        with metrics.stage('save'):
+            storage_path = save_agent(file, group_name, agent_name, is_update, spool.sha256)
   
         if storage_path:
+            schedule_update(group_name, agent_name)
             if is_update:
                 flash(f'Agent "{agent_name}" updated successfully')
                 log_message(logger, f"Agent {agent_name} updated successfully", "INFO", "upload")
@@ -106,11 +126,70 @@ def upload():
         else:
             flash('Error saving agent')
             # save_agent already logs the error
-        print(agents)
         return redirect(url_for('upload.upload'))
     
+    pending_jobs = []
+    if current_app.config['UPLOAD_ASYNC']:
+        pending_jobs = [job for job in jobs.get_job_queue().list_for_owner(group_name)
+                        if job['kind'] == 'upload' and job['status'] in ('queued', 'running')]
     return render_template('upload.html',
-                         agents=agents)
+                         agents=agents,
+                         pending_jobs=pending_jobs)
+
+def enqueue_upload(file, group_name, agent_name, is_update):
+    """Hand the spooled upload over to the job queue for background validation and saving"""
+    spool = spool_upload(file)
+    return jobs.submit('upload', {
+        'path': spool.detach(),
+        'sha256': spool.sha256,
+        'group_name': group_name,
+        'agent_name': agent_name,
+        'is_update': is_update
+    }, owner=group_name)
+
+@jobs.handler('upload')
+def run_upload_job(job, set_progress):
+    """Validate and save a queued upload. Returns the final job status and message."""
+    payload = job['payload']
+    agent_name = payload['agent_name']
+    _, logger = get_clients()
+    try:
+        set_progress('validating')
+        validation_result = validate_submission(payload['path'], payload['sha256'])
+        if not validation_result['valid']:
+            log_message(logger, f"Validation failed: {validation_result['message']}", "ERROR", "upload")
+            return 'failed', f"Invalid submission: {validation_result['message']}"
+        
+        set_progress('saving')
+        with open(payload['path'], 'rb') as f:
+            storage_path = save_agent(f, payload['group_name'], agent_name, payload['is_update'], payload['sha256'])
+        if not storage_path:
+            return 'failed', 'Error saving agent'
+        schedule_update(payload['group_name'], agent_name)
+        
+        verb = 'updated' if payload['is_update'] else 'uploaded'
+        log_message(logger, f"Agent {agent_name} {verb} successfully", "INFO", "upload")
+        return 'done', f'Agent "{agent_name}" {verb} successfully'
+    finally:
+        if os.path.exists(payload['path']):
+            os.remove(payload['path'])
+
+@bp.route('/upload/status/<job_id>')
+@login_required
+def upload_status(job_id):
+    job = jobs.get_job_queue().get(job_id)
+    # Jobs of other teams are reported as unknown
+    if job is None or job['owner'] != session['group_name']:
+        abort(404)
+    return jsonify({
+        'job_id': job['id'],
+        'agent_name': job['payload']['agent_name'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'created': job['created'],
+        'updated': job['updated']
+    })
 
 @bp.route('/delete/<agent_name>', methods=['POST'])
 @login_required
@@ -125,4 +204,21 @@ def delete_agent_route(agent_name):
         flash('Error deleting agent')
         # delete_agent already logs the error
     
+    return redirect(url_for('upload.upload'))
+
+@bp.route('/rollback/<agent_name>', methods=['POST'])
+@login_required
+def rollback_agent_route(agent_name):
+    storage_client, logger = get_clients()
+    group_name = session['group_name']
+    
+    restored_path = rollback_agent(group_name, agent_name)
+    if restored_path:
+        schedule_update(group_name, agent_name)
+        flash(f'Agent "{agent_name}" rolled back to the previous version')
+        log_message(logger, f"Agent {agent_name} rolled back", "INFO", "upload")
+    else:
+        flash('No previous version to roll back to')
+        # rollback_agent already logs the error
+    
     return redirect(url_for('upload.upload'))
\ No newline at end of file
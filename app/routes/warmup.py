@@ -0,0 +1,13 @@
+from flask import Blueprint, current_app
+from ..storage import warm_up
+
+bp = Blueprint('warmup', __name__)
+
+@bp.route('/_ah/warmup')
+def warmup():
+    """App Engine warmup request: create clients before the instance receives traffic"""
+    try:
+        warm_up()
+    except Exception as e:
+        current_app.logger.error(f"Warmup failed: {str(e)}")
+    return '', 200
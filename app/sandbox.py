@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import threading
+
+
+class SandboxError(Exception):
+    """Raised when a sandboxed call fails or its process dies."""
+
+
+class SandboxTimeout(SandboxError):
+    """Raised when a sandboxed call exceeds its deadline and is killed."""
+
+
+class PoolFullError(SandboxError):
+    """Raised when the pool is saturated and the wait queue is full."""
+
+
+def _child_main(conn, target, args):
+    """Entry point of a sandbox process: run target and send back the outcome."""
+    try:
+        conn.send(('ok', target(*args)))
+    except BaseException as e:
+        conn.send(('error', f'{type(e).__name__}: {str(e)}'))
+    finally:
+        conn.close()
+
+
+class SandboxPool:
+    """
+    Bounded pool of one-shot worker processes.
+    Every call runs in a freshly started process that is killed when it
+    exceeds its deadline, so untrusted code never shares a module namespace
+    with the web worker or with another submission.
+    With the 'forkserver' start method each process is forked from a template process
+    that imported the preload modules once, instead of starting a new interpreter.
+    """
+
+    def __init__(self, max_workers=None, queue_depth=0, start_method='spawn', preload=()):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.queue_depth = queue_depth
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = 'spawn'
+        self.start_method = start_method
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver' and preload:
+            # Applies to the fork server of this process, which is started on first use
+            self._ctx.set_forkserver_preload(list(preload))
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._lock = threading.Lock()
+        self._pending = 0  # running plus waiting calls
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def run(self, target, args=(), timeout=None):
+        """
+        Run target(*args) in a new process and return its result.
+        Raises PoolFullError, SandboxTimeout or SandboxError.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.queue_depth:
+                raise PoolFullError(f'{self._pending} sandboxed calls already pending')
+            self._pending += 1
+        try:
+            with self._slots:
+                return self._run_one(target, args, timeout)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _run_one(self, target, args, timeout):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(target=_child_main, args=(child_conn, target, args), daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            if not parent_conn.poll(timeout):
+                raise SandboxTimeout(f'No result after {timeout} seconds')
+            try:
+                status, payload = parent_conn.recv()
+            except EOFError:
+                process.join()
+                raise SandboxError(f'Sandbox process exited unexpectedly (exit code {process.exitcode})')
+            if status == 'error':
+                raise SandboxError(payload)
+            return payload
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            parent_conn.close()
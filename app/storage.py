@@ -1,135 +1,336 @@
-from google.cloud import storage
-from google.cloud.logging import Client
 from flask import current_app, g
+from .log_shipper import LogShipper, cloud_sink, stdout_sink
+from .backends import GCSBackend, LocalBackend, MemoryBackend
+from . import metrics
+from contextlib import contextmanager
+import atexit
 import os
+import threading
+import time
+
+CLOUD_SCOPES = ('https://www.googleapis.com/auth/cloud-platform',)
+
+# Process-wide clients, created once per (post-fork) worker process
+_clients = None
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+_backend_lock = threading.Lock()
+
+# Process-wide background log shipper
+_shipper = None
+_shipper_pid = None
+
+# Process-wide cache of team agent lists: group_name -> (expiry time, agents)
+_agent_cache = {}
+_agent_cache_lock = threading.Lock()
+
+def _create_clients(key_path, pool_size):
+    """Create storage and logging clients sharing credentials and a sized HTTP connection pool"""
+    # The cloud SDKs are imported on first use, keeping them out of the start-up of every process
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import storage
+    from google.cloud.logging import Client
+    from google.oauth2 import service_account
+    from requests.adapters import HTTPAdapter
+    if key_path:
+        # Development: use service account key file
+        credentials = service_account.Credentials.from_service_account_file(key_path, scopes=CLOUD_SCOPES)
+        project = credentials.project_id
+    else:
+        # Production: use default credentials
+        credentials, project = google.auth.default(scopes=CLOUD_SCOPES)
+    
+    http = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http.mount('https://', adapter)
+    
+    storage_client = storage.Client(project=project, credentials=credentials, _http=http)
+    logging_client = Client(project=project, credentials=credentials)
+    return storage_client, logging_client.logger("app-log")
 
 def get_clients():
-    """Get or initialize storage and logging clients using config settings"""
-    if 'storage_client' not in g:
-        key_path = current_app.config['STORAGE_KEY_PATH']
-        
-        # Initialize storage client
-        if key_path:
-            # Development: use service account key file
-            g.storage_client = storage.Client.from_service_account_json(key_path)
-            g.logging_client = Client.from_service_account_json(key_path)
-        else:
-            # Production: use default credentials
-            g.storage_client = storage.Client()
-            g.logging_client = Client()
-        
-        # Set up logger
-        if current_app.debug:
-            g.logger = current_app.logger
-        else:
-            g.logger = g.logging_client.logger("app-log")
-            
-    return g.storage_client, g.logger
+    """
+    Get the storage client and logger.
+    Clients are created once per process and reused across requests, so storage calls
+    share keep-alive connections; a forked worker creates its own on first use.
+    Without the GCS backend there is no storage client and the Flask logger is used.
+    """
+    global _clients, _clients_pid
+    if current_app.config['STORAGE_BACKEND'] != 'gcs':
+        return None, current_app.logger
+    if _clients is None or _clients_pid != os.getpid():
+        with _clients_lock:
+            if _clients is None or _clients_pid != os.getpid():
+                _clients = _create_clients(current_app.config['STORAGE_KEY_PATH'],
+                                           current_app.config['STORAGE_HTTP_POOL_SIZE'])
+                _clients_pid = os.getpid()
+    storage_client, cloud_logger = _clients
+    
+    # Set up logger
+    if current_app.debug:
+        return storage_client, current_app.logger
+    return storage_client, cloud_logger
+
+def get_backend():
+    """Get the storage backend selected by STORAGE_BACKEND ('gcs', 'local' or 'memory') for the current app"""
+    with _backend_lock:
+        backend = current_app.extensions.get('storage_backend')
+        if backend is None:
+            kind = current_app.config['STORAGE_BACKEND']
+            if kind == 'gcs':
+                backend = GCSBackend(lambda: get_clients()[0], current_app.config['STORAGE_BUCKET'],
+                                     chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'])
+            elif kind == 'local':
+                backend = LocalBackend(current_app.config['LOCAL_STORAGE_ROOT'])
+            elif kind == 'memory':
+                backend = MemoryBackend()
+            else:
+                raise ValueError(f"Unknown storage backend: {kind}")
+            current_app.extensions['storage_backend'] = backend
+    return backend
+
+def warm_up():
+    """Create this process's clients and open a connection to the bucket ahead of the first request"""
+    backend = get_backend()
+    if isinstance(backend, GCSBackend):
+        backend.bucket.exists()
+
+def get_log_shipper(cloud_logger):
+    """Get or start this process's background log shipper for the given Cloud Logger"""
+    global _shipper, _shipper_pid
+    if _shipper is None or _shipper_pid != os.getpid():
+        with _clients_lock:
+            if _shipper is None or _shipper_pid != os.getpid():
+                sink = stdout_sink if current_app.config['LOG_SINK'] == 'stdout' else cloud_sink(cloud_logger)
+                _shipper = LogShipper(sink,
+                                      max_queue=current_app.config['LOG_QUEUE_SIZE'],
+                                      batch_size=current_app.config['LOG_BATCH_SIZE'])
+                _shipper_pid = os.getpid()
+                atexit.register(_shipper.close)
+    return _shipper
+
+def log_shipper_stats():
+    """Counters of this process's log shipper, None if it hasn't been started"""
+    if _shipper is None or _shipper_pid != os.getpid():
+        return None
+    return _shipper.stats()
+
+def flush_logs():
+    """Ship all queued log entries of this process and stop the shipper"""
+    if _shipper is not None and _shipper_pid == os.getpid():
+        _shipper.close()
 
 def log_message(logger, message, severity="INFO", component="storage"):
-    """Log message using either Cloud Logging or Flask logger"""
+    """
+    Log message using either Cloud Logging or Flask logger.
+    Cloud log entries are queued and shipped in batches by a background thread,
+    unless LOG_SINK is 'sync'.
+    """
     # Check if it's a Cloud Logger by checking for log_struct method
     if hasattr(logger, 'log_struct'):
-        logger.log_struct({
+        entry = {
             "message": message,
             "severity": severity,
             "component": component
-        })
+        }
+        if current_app.config['LOG_SINK'] == 'sync':
+            logger.log_struct(entry)
+        else:
+            get_log_shipper(logger).submit(entry)
     else:
         if severity == "ERROR":
             logger.error(f"{component}: {message}")
         else:
             logger.info(f"{component}: {message}")
 
-def get_bucket():
-    """Get the storage bucket."""
-    storage_client, _ = get_clients()
-    return storage_client.bucket(current_app.config['STORAGE_BUCKET'])
+@contextmanager
+def storage_call(operation):
+    """Count and time a call to the storage backend"""
+    metrics.count('c4_storage_calls_total', 'Calls to the storage backend',
+                  operation=operation, backend=current_app.config['STORAGE_BACKEND'])
+    with metrics.stage(f'storage.{operation}'):
+        yield
+
+def agent_blob_path(group_name, agent_name, version):
+    """Storage path of one version of an agent"""
+    return f"submissions/{group_name}/{agent_name}/{agent_name}_v{version}.zip"
 
-def save_agent(file, group_name, agent_name, is_update):
+def save_agent(file, group_name, agent_name, is_update, content_hash=None):
     """
-    Save an agent to Google Cloud Storage.
+    Save an agent to the storage backend.
+    The new version is uploaded next to the existing ones and becomes current as soon as the
+    upload completes; versions beyond AGENT_VERSIONS_KEPT are pruned afterwards in one batch.
+    If content_hash (SHA-256 of the ZIP) matches the stored version, the upload is skipped.
     Returns the cloud storage path on success, None on failure.
     """
     try:
         _, logger = get_clients()
-        bucket = get_bucket()
-        team_agents = get_team_agents(group_name)
-        agent_version = [agent_dict['version'] for agent_dict in team_agents if agent_dict['name'] == agent_name]
+        team_agents = get_team_agents(group_name, use_cache=False)
+        current = [agent_dict for agent_dict in team_agents if agent_dict['name'] == agent_name]
+        agent_version = [agent_dict['version'] for agent_dict in current]
         if len(agent_version) == 0 and is_update:
             raise KeyError('Agent unknown, can\'t update.')
         if len(agent_version) > 0 and not is_update:
             raise KeyError('Agent already exists, update instead.')
-        if is_update:
-            log_message(logger, f"Attempting to delete old version of {agent_name}", "INFO")
-            delete_success = delete_agent(group_name, agent_name)
-            if not delete_success:
-                raise RuntimeError("Failed to delete old version")
-            log_message(logger, "Old version deleted successfully", "INFO")
+        if is_update and content_hash and current[0].get('sha256') == content_hash:
+            log_message(logger, f"Agent {agent_name} is identical to version {agent_version[0]}, skipping upload")
+            return current[0]['path']
         new_version = int(agent_version[0]) + 1 if is_update else 1
-        blob_path = f"submissions/{group_name}/{agent_name}/{agent_name}_v{new_version}.zip"
-        blob = bucket.blob(blob_path)
-        blob.upload_from_file(file)
+        blob_path = agent_blob_path(group_name, agent_name, new_version)
+        # Streamed from the spooled file; never overwrite an existing version, e.g. from a concurrent upload
+        with storage_call('put'):
+            get_backend().put(blob_path, file, metadata={'sha256': content_hash} if content_hash else None,
+                              if_not_exists=True)
+        invalidate_team_agents(group_name)
         log_message(logger, f"Agent {agent_name} (version {new_version}) saved successfully for team {group_name}")
+        
+        if is_update:
+            prune_agent_versions(group_name, agent_name, current[0]['versions'] + [str(new_version)])
         return blob_path
     except Exception as e:
         _, logger = get_clients()
         log_message(logger, f"Error saving agent: {str(e)}", "ERROR")
         return None
 
+def prune_agent_versions(group_name, agent_name, versions):
+    """
+    Delete all but the newest AGENT_VERSIONS_KEPT versions of an agent.
+    A failure only leaves extra versions behind, so it is logged but not raised.
+    """
+    _, logger = get_clients()
+    keep = max(1, current_app.config['AGENT_VERSIONS_KEPT'])
+    stale = sorted(versions, key=int)[:-keep]
+    if not stale:
+        return
+    try:
+        with storage_call('delete'):
+            get_backend().delete_many([agent_blob_path(group_name, agent_name, version) for version in stale])
+        invalidate_team_agents(group_name)
+        log_message(logger, f"Pruned versions {', '.join(stale)} of agent {agent_name}")
+    except Exception as e:
+        log_message(logger, f"Error pruning old versions of {agent_name}: {str(e)}", "ERROR")
+
+def rollback_agent(group_name, agent_name):
+    """
+    Make the previous version of an agent current again by deleting the newest one.
+    Returns the path of the restored version, None on failure.
+    """
+    try:
+        _, logger = get_clients()
+        agent = next((agent for agent in get_team_agents(group_name, use_cache=False)
+                      if agent['name'] == agent_name), None)
+        if agent is None or len(agent['versions']) < 2:
+            log_message(logger, f"No previous version of {agent_name} to roll back to", "WARNING")
+            return None
+        with storage_call('delete'):
+            get_backend().delete_many([agent['path']])
+        invalidate_team_agents(group_name)
+        previous = agent['versions'][-2]
+        log_message(logger, f"Agent {agent_name} rolled back to version {previous}")
+        return agent_blob_path(group_name, agent_name, previous)
+    except Exception as e:
+        _, logger = get_clients()
+        log_message(logger, f"Error rolling back agent: {str(e)}", "ERROR")
+        return None
+
 def delete_agent(group_name, agent_name):
     """
-    Delete an agent and its directory from Google Cloud Storage.
+    Delete an agent and its directory from the storage backend.
     Returns True on success, False on failure.
     """
     try:
         storage_client, logger = get_clients()
-        bucket = get_bucket()
         prefix = f"submissions/{group_name}/{agent_name}/"
-        log_message(logger, f"Searching for blobs with prefix: {prefix}", "INFO")
-        blobs = bucket.list_blobs(prefix=prefix)
-        blob_count = 0
-        for blob in blobs:
-            log_message(logger, f"Deleting blob: {blob.name}", "INFO")
-            blob.delete()
-            blob_count += 1
-        if blob_count == 0:
+        with storage_call('list'):
+            paths = [blob.name for blob in get_backend().list(prefix)]
+        if not paths:
             log_message(logger, f"No blobs found to delete for prefix: {prefix}", "WARNING")
             return False
-        log_message(logger, f"Deleted {blob_count} blobs for agent {agent_name}", "INFO")
+        with storage_call('delete'):
+            get_backend().delete_many(paths)
+        invalidate_team_agents(group_name)
+        log_message(logger, f"Deleted {len(paths)} blobs for agent {agent_name}", "INFO")
         return True
     except Exception as e:
         storage_client, logger = get_clients()
         log_message(logger, f"Error deleting agent: {str(e)}", "ERROR")
         return False
 
-def get_team_agents(group_name):
+def invalidate_team_agents(group_name):
+    """Drop cached agent lists of a team after its submissions changed"""
+    with _agent_cache_lock:
+        _agent_cache.pop(group_name, None)
+    if 'team_agents' in g:
+        g.team_agents.pop(group_name, None)
+
+def get_team_agents(group_name, use_cache=True):
     """
     Get list of agents for a team.
-    Returns a list of agent dictionaries with name and path.
+    Returns a list of agent dictionaries with name, current version and path,
+    plus the list of stored versions.
+    Lists are memoized per request and cached for AGENT_LIST_TTL seconds;
+    use_cache=False forces a fresh listing (e.g. before computing a new version).
     """
+    if 'team_agents' not in g:
+        g.team_agents = {}
+    if use_cache:
+        if group_name in g.team_agents:
+            return _copy_agents(g.team_agents[group_name])
+        with _agent_cache_lock:
+            expires, agents = _agent_cache.get(group_name, (0, None))
+        if agents is not None and expires > time.monotonic():
+            g.team_agents[group_name] = agents
+            return _copy_agents(agents)
+
+    agents = _list_team_agents(group_name)
+    if agents is None:
+        return []
+    with _agent_cache_lock:
+        _agent_cache[group_name] = (time.monotonic() + current_app.config['AGENT_LIST_TTL'], agents)
+    g.team_agents[group_name] = agents
+    return _copy_agents(agents)
+
+def _copy_agents(agents):
+    """Copies of cached agent dictionaries, so callers can't modify the cache"""
+    return [dict(agent, versions=list(agent['versions'])) for agent in agents]
+
+def agents_from_blobs(blobs):
+    """Group the listed version blobs of one team into agent dictionaries, see get_team_agents()"""
+    agents = {}
+    for blob in blobs:
+        # Extract agent name from prefix (submissions/group_name/agent_name/agent-name_v1.zip)
+        agent_name_version = blob.name.split('/')[-1].removesuffix('.zip')
+        agent_name, version = agent_name_version.split('_')
+        version = version[1:] # Get 'v..' after underscore, remove the 'v' from the version
+        
+        # Listed blobs exist, no need for a further request per blob.
+        # The newest version of each agent is the current one.
+        agent = agents.setdefault(agent_name, {'name': agent_name, 'versions': []})
+        agent['versions'].append(version)
+        if 'version' not in agent or int(version) > int(agent['version']):
+            agent.update({
+                'version': version,
+                'path': f"{blob.name}",
+                'sha256': (blob.metadata or {}).get('sha256')
+            })
+    for agent in agents.values():
+        agent['versions'].sort(key=int)
+    return list(agents.values())
+
+def _list_team_agents(group_name):
+    """List a team's agents with a single storage listing. Returns None on failure."""
     try:
         _, logger = get_clients()
-        bucket = get_bucket()
         team_prefix = f"submissions/{group_name}/"
-        blobs = bucket.list_blobs(prefix=team_prefix)
-        agents = []
-        for blob in blobs:
-            # Extract agent name from prefix (submissions/group_name/agent_name/agent-name_v1.zip)
-            agent_name_version = blob.name.split('/')[-1].strip('.zip')
-            agent_name, version = agent_name_version.split('_')
-            version = version[1:] # Get 'v..' after underscore, remove the 'v' from the version
-            
-            if blob.exists():
-                agents.append({
-                    'name': agent_name,
-                    'version': version,
-                    'path': f"{blob.name}"
-                })
+        with storage_call('list'):
+            blobs = get_backend().list(team_prefix)
+        agents = agents_from_blobs(blobs)
         
         log_message(logger, f"Retrieved {len(agents)} agents for team {group_name}")
         return agents
     except Exception as e:
         _, logger = get_clients()
         log_message(logger, f"Error listing agents: {str(e)}", "ERROR")
-        return []
\ No newline at end of file
+        return None
@@ -0,0 +1,487 @@
+import importlib
+import json
+import multiprocessing
+import os
+import posixpath
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, closing
+import numpy as np
+from flask import current_app
+from . import jobs
+from .agent_loader import AGENT_PACKAGE, AgentPackage
+from .environments import EnvironmentStore, RequirementsError, environment_settings
+from .referee import Board, MoveTimeout, deadline
+from .storage import agents_from_blobs, get_backend
+
+# Seconds an agent may take per move unless configured otherwise
+MOVE_TIMEOUT = 1.
+# Seconds an agent process may take to start and import its agent
+LOAD_TIMEOUT = 60.
+# Extra seconds for a move to reach the referee before the agent's process is killed
+MOVE_GRACE = 1.
+# Modules the fork server imports once for all agent processes
+AGENT_PRELOAD = ('numpy', 'app.tournament')
+
+
+class AgentCrash(Exception):
+    """Raised when the process of an agent dies during a game"""
+
+
+class AgentError(Exception):
+    """An exception raised by an agent in its process, with the agent's error message"""
+
+
+def revision(version, sha256=None):
+    """
+    Identity of a stored agent version: its number and the start of its content hash.
+    Numbers are reused when the newest version is deleted and uploaded again, hashes are not.
+    Versions stored without a hash are identified by their number alone.
+    """
+    return f'{version}#{sha256[:12]}' if sha256 else str(version)
+
+
+def latest_agents(backend):
+    """
+    Current version of every stored agent, as dictionaries with the agent id ('<group>/<name>'),
+    group, name, version, its revision, storage path and all stored versions and revisions,
+    sorted by id. Uses a single listing.
+    """
+    blobs_by_group = defaultdict(list)
+    hashes = {}
+    for blob in backend.list('submissions/'):
+        parts = blob.name.split('/')
+        if len(parts) == 4 and parts[3].endswith('.zip'):
+            blobs_by_group[parts[1]].append(blob)
+            hashes[blob.name] = (blob.metadata or {}).get('sha256')
+    agents = []
+    for group_name, blobs in blobs_by_group.items():
+        for agent in agents_from_blobs(blobs):
+            prefix = agent['path'].rsplit('_v', 1)[0]
+            agents.append({
+                'id': f"{group_name}/{agent['name']}",
+                'group': group_name,
+                'name': agent['name'],
+                'version': agent['version'],
+                'revision': revision(agent['version'], agent['sha256']),
+                'path': agent['path'],
+                'versions': agent['versions'],
+                'revisions': [revision(version, hashes.get(f'{prefix}_v{version}.zip'))
+                              for version in agent['versions']]
+            })
+    return sorted(agents, key=lambda agent: agent['id'])
+
+
+def schedule(agents):
+    """All pairings of a round-robin: every agent plays every other agent once with each colour"""
+    return [(first, second) for first in agents for second in agents if first['id'] != second['id']]
+
+
+def involves(game, agent_ids):
+    first, second = game
+    return first['id'] in agent_ids or second['id'] in agent_ids
+
+
+def result_revision(result, side):
+    """Revision of the 'first' or 'second' agent of a result; results from before revisions have versions only"""
+    return result.get(f'{side}_revision', result[f'{side}_version'])
+
+
+def current_results(results, agents):
+    """Results of games between the current versions of the given agents"""
+    current = {agent['id']: agent['revision'] for agent in agents}
+    return [result for result in results.values()
+            if current.get(result['first']) == result_revision(result, 'first')
+            and current.get(result['second']) == result_revision(result, 'second')]
+
+
+def game_key(first, second):
+    """Identity of a game: both agents with the revisions that played it, in playing order"""
+    return f"{first['id']}@{first['revision']}|{second['id']}@{second['revision']}"
+
+
+def fetch_agents(backend, agents, cache_dir):
+    """
+    Download the ZIPs of the given agents to cache_dir (files already there are reused)
+    and set each agent's 'zip' to the local path. Files are named by revision, so an upload
+    reusing a deleted version number is downloaded again.
+    """
+    for agent in agents:
+        local_path = os.path.join(cache_dir, *posixpath.dirname(agent['path']).split('/'), f"{agent['revision']}.zip")
+        if not os.path.exists(local_path):
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            temp_path = f'{local_path}.part'
+            with backend.open(agent['path']) as source, open(temp_path, 'wb') as target:
+                while chunk := source.read(1024 * 1024):
+                    target.write(chunk)
+            os.replace(temp_path, local_path)
+        agent['zip'] = local_path
+    return agents
+
+
+def use_environments(stack, agents, store):
+    """
+    Install or reuse the requirements of fetched agents, setting each agent's 'environment'
+    (a site directory or None), or 'environment_error' if they can't be installed.
+    The environments are kept from eviction until the ExitStack is closed.
+    """
+    for agent in agents:
+        agent['environment'] = None
+        if store is None:
+            continue
+        with zipfile.ZipFile(agent['zip']) as z:
+            requirements = z.read('requirements.txt').decode('utf-8', errors='replace') \
+                if 'requirements.txt' in z.namelist() else ''
+        try:
+            agent['environment'] = stack.enter_context(store.use(requirements))
+        except RequirementsError as e:
+            agent['environment_error'] = str(e)
+    return agents
+
+
+class ResultLog:
+    """
+    Game results as JSON lines, appended and flushed one game at a time,
+    so an interrupted tournament only loses the games still being played.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Results by game key; a partially written last line is ignored"""
+        results = {}
+        if not os.path.exists(self.path):
+            return results
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                results[result['key']] = result
+        return results
+
+    def compact(self, keep):
+        """
+        Rewrite the log with only the results for which keep(result) is true.
+        Must not run concurrently with other writers of the same log.
+        """
+        results = self.load()
+        temp_path = f'{self.path}.compact'
+        with open(temp_path, 'w') as f:
+            for result in results.values():
+                if keep(result):
+                    f.write(json.dumps(result) + '\n')
+        os.replace(temp_path, self.path)
+        return sum(1 for result in results.values() if not keep(result))
+
+    def append(self, result):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class LoadedAgent:
+    """
+    An agent imported from its ZIP, in its own process during tournaments. The archive stays
+    open, so the agent can import its modules lazily; the agent's import environment is
+    activated only while it is moving, so two agents can also play in one interpreter.
+    """
+
+    def __init__(self, zip_path, environment=None):
+        self.zip_file = zipfile.ZipFile(zip_path)
+        self.package = AgentPackage(self.zip_file, environment=environment)
+        self.package.activate()
+        try:
+            self.generate_move = importlib.import_module(AGENT_PACKAGE).generate_move
+        except BaseException:
+            self.package.deactivate()
+            self.close()
+            raise
+        self.package.deactivate()
+
+    def move(self, board, timeout):
+        """
+        Ask the agent for a move, interrupting it with MoveTimeout after timeout seconds.
+        Long-running native code is only interrupted when it returns to Python,
+        so a late move raises MoveTimeout as well.
+        """
+        self.package.activate()
+        start = time.perf_counter()
+        try:
+            with deadline(timeout):
+                move = self.generate_move(board.to_array(), np.int8(board.current_player), timeout)
+        finally:
+            self.package.deactivate()
+        if time.perf_counter() - start > timeout:
+            raise MoveTimeout()
+        return move
+
+    def close(self):
+        self.package.close()
+        self.zip_file.close()
+
+
+def _agent_main(connection, agent):
+    """Entry point of an agent process: load the agent, then answer (board, timeout) requests until None"""
+    try:
+        loaded = LoadedAgent(agent['zip'], agent.get('environment'))
+    except Exception as e:
+        connection.send(('error', str(e)[:200]))
+        return
+    connection.send(('ready', None))
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            request = None
+        if request is None:
+            break
+        board, timeout = request
+        try:
+            move = loaded.move(board, timeout)
+        except MoveTimeout:
+            connection.send(('timeout', None))
+            continue
+        except Exception as e:
+            connection.send(('error', str(e)[:200]))
+            continue
+        # Anything but an integer is an illegal move; it is not sent as is since it may not pickle
+        if isinstance(move, (bool, np.bool_)) or not isinstance(move, (int, np.integer)):
+            move = None
+        connection.send(('move', None if move is None else int(move)))
+    loaded.close()
+
+
+class AgentProcess:
+    """
+    An agent playing from its own process, so crashes, hangs or changes to the interpreter
+    only affect the agent itself. Every answer has a hard deadline: the process is killed
+    if nothing arrives within the move time plus MOVE_GRACE (LOAD_TIMEOUT when loading).
+    move() raises MoveTimeout, AgentCrash if the process died, or AgentError.
+    """
+
+    def __init__(self, agent, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_agent_main, args=(child_connection, agent), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def _receive(self, timeout):
+        if not self.connection.poll(timeout):
+            self.process.kill()
+            raise MoveTimeout()
+        try:
+            status, payload = self.connection.recv()
+        except EOFError:
+            self.process.join()
+            raise AgentCrash(f'Agent process exited unexpectedly (exit code {self.process.exitcode})')
+        if status == 'timeout':
+            raise MoveTimeout()
+        if status == 'error':
+            raise AgentError(payload)
+        return payload
+
+    def wait_loaded(self, timeout=LOAD_TIMEOUT):
+        self._receive(timeout)
+
+    def move(self, board, timeout):
+        try:
+            self.connection.send((board, timeout))
+        except OSError:
+            raise AgentCrash('Agent process exited unexpectedly')
+        return self._receive(timeout + MOVE_GRACE)
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                # Lets the agent clean up its extracted files
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(MOVE_GRACE)
+            if self.process.is_alive():
+                self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def agent_context(start_method='forkserver', preload=AGENT_PRELOAD):
+    """Multiprocessing context for agent processes, with the same fallback as SandboxPool"""
+    if start_method not in multiprocessing.get_all_start_methods():
+        start_method = 'spawn'
+    context = multiprocessing.get_context(start_method)
+    if start_method == 'forkserver' and preload:
+        # Only applies if the fork server of this process is not running yet
+        context.set_forkserver_preload(list(preload))
+    return context
+
+
+def play_game(first, second, move_timeout=MOVE_TIMEOUT):
+    """
+    Play one game between two loaded agents, first moving first.
+    Returns the winner (1, 2 or None for a draw), how the game ended ('connect4', 'draw',
+    or the loser's 'timeout', 'crash', 'error' or 'illegal' move) and the columns played.
+    """
+    board = Board()
+    players = (first, second)
+    moves = []
+    while not board.is_over():
+        player = board.current_player
+        try:
+            move = players[player - 1].move(board, move_timeout)
+        except MoveTimeout:
+            return {'winner': 3 - player, 'reason': 'timeout', 'moves': moves}
+        except AgentCrash as e:
+            return {'winner': 3 - player, 'reason': 'crash', 'error': str(e)[:200], 'moves': moves}
+        except Exception as e:
+            return {'winner': 3 - player, 'reason': 'error', 'error': str(e)[:200], 'moves': moves}
+        if isinstance(move, (bool, np.bool_)) or not isinstance(move, (int, np.integer)) or not board.can_play(int(move)):
+            return {'winner': 3 - player, 'reason': 'illegal', 'moves': moves}
+        board.play(int(move))
+        moves.append(int(move))
+    return {'winner': board.winner, 'reason': 'connect4' if board.winner else 'draw', 'moves': moves}
+
+
+def start_agent(stack, agent, context):
+    """Start the process of a fetched agent, closed with the ExitStack, or return why it can't play"""
+    if 'environment_error' in agent:
+        return RequirementsError(agent['environment_error'])
+    try:
+        return stack.enter_context(closing(AgentProcess(agent, context)))
+    except Exception as e:
+        return e
+
+
+def run_game(first, second, move_timeout=MOVE_TIMEOUT, context=None):
+    """Play one scheduled game, each agent in a process of its own, and return its result record"""
+    start = time.perf_counter()
+    context = context or agent_context()
+    with ExitStack() as stack:
+        agents = [start_agent(stack, agent, context) for agent in (first, second)]
+        for i, agent in enumerate(agents):
+            if not isinstance(agent, Exception):
+                try:
+                    agent.wait_loaded()
+                except (Exception, MoveTimeout) as e:
+                    agents[i] = e if isinstance(e, Exception) else TimeoutError('Loading the agent timed out')
+        failed = [isinstance(agent, Exception) for agent in agents]
+        if any(failed):
+            # An agent that can't be imported forfeits; if both fail the game is a draw
+            outcome = {'winner': None if all(failed) else 2 if failed[0] else 1, 'reason': 'load_error', 'moves': []}
+        else:
+            outcome = play_game(agents[0], agents[1], move_timeout)
+    return dict(outcome,
+                key=game_key(first, second),
+                first=first['id'], first_version=first['version'], first_revision=first['revision'],
+                second=second['id'], second_version=second['version'], second_revision=second['revision'],
+                seconds=round(time.perf_counter() - start, 4),
+                finished=time.time())
+
+
+def run_games(games, results, workers=None, move_timeout=MOVE_TIMEOUT, on_result=None):
+    """
+    Play (first, second) pairings of fetched agents, workers games at a time, appending each
+    result to the ResultLog as soon as the game finishes. Every agent plays from its own
+    process, so a crashing or hanging agent forfeits its game and the others go on.
+    Returns the number of games played.
+    """
+    if not games:
+        return 0
+    played = 0
+    context = agent_context()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(run_game, first, second, move_timeout, context) for first, second in games]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            played += 1
+            if on_result:
+                on_result(result)
+    return played
+
+
+def run_tournament(backend, work_dir, workers=None, move_timeout=MOVE_TIMEOUT, on_result=None, agent_ids=None,
+                   environments=None):
+    """
+    Round-robin between the current versions of all stored agents.
+    Results go to <work_dir>/results.jsonl; games already recorded for the same agent
+    revisions are not played again, so an interrupted run can simply be restarted.
+    With agent_ids only the missing games involving those agents are played: after an
+    agent is updated that is the 2(n-1) games of its new version, all others are reused.
+    With an EnvironmentStore agents play with their requirements installed; agents whose
+    requirements can't be installed forfeit like agents that fail to import.
+    """
+    start = time.perf_counter()
+    agents = latest_agents(backend)
+    results = ResultLog(os.path.join(work_dir, 'results.jsonl'))
+    recorded = results.load()
+    games = [game for game in schedule(agents) if game_key(*game) not in recorded
+             and (agent_ids is None or involves(game, agent_ids))]
+    # Only the agents taking part in missing games are downloaded
+    playing = list({agent['id']: agent for game in games for agent in game}.values())
+    fetch_agents(backend, playing, os.path.join(work_dir, 'agents'))
+    with ExitStack() as stack:
+        use_environments(stack, playing, environments)
+        played = run_games(games, results, workers, move_timeout, on_result)
+    seconds = time.perf_counter() - start
+    return {
+        'agents': len(agents),
+        'games': len(schedule(agents)),
+        'played': played,
+        'seconds': seconds,
+        'games_per_second': played / seconds if seconds else 0.
+    }
+
+
+def compact_results(backend, work_dir):
+    """
+    Drop results of agent revisions that are no longer stored, including those of a version
+    number that was deleted and uploaded again. Returns the number dropped.
+    """
+    stored = {(agent['id'], stored_revision) for agent in latest_agents(backend)
+              for stored_revision in agent['revisions']}
+    results = ResultLog(os.path.join(work_dir, 'results.jsonl'))
+    return results.compact(lambda result: (result['first'], result_revision(result, 'first')) in stored
+                           and (result['second'], result_revision(result, 'second')) in stored)
+
+
+def get_environment_store():
+    """EnvironmentStore configured for the app, or None if requirements are not installed"""
+    settings = environment_settings()
+    return EnvironmentStore(**settings) if settings else None
+
+
+def schedule_update(group_name, agent_name):
+    """
+    Queue the games of an agent's current version (after an upload or a rollback)
+    if TOURNAMENT_AUTO_UPDATE is enabled. Returns the job ID or None.
+    """
+    if not current_app.config['TOURNAMENT_AUTO_UPDATE']:
+        return None
+    return jobs.submit('tournament', {'agent': f'{group_name}/{agent_name}'}, owner=group_name)
+
+
+@jobs.handler('tournament', lane='tournament')
+def run_tournament_job(job, set_progress):
+    """Play the missing games of one agent against the current versions of all others"""
+    set_progress('playing')
+    summary = run_tournament(get_backend(), current_app.config['TOURNAMENT_DIR'],
+                             current_app.config['TOURNAMENT_WORKERS'],
+                             current_app.config['TOURNAMENT_MOVE_TIMEOUT'],
+                             agent_ids={job['payload']['agent']},
+                             environments=get_environment_store())
+    from .leaderboard import update_leaderboard
+    from .game_records import archive_results
+    set_progress('ranking')
+    update_leaderboard(get_backend(), current_app.config['TOURNAMENT_DIR'])
+    set_progress('archiving')
+    archive_results(get_backend(), current_app.config['TOURNAMENT_DIR'])
+    return 'done', f"{summary['played']} games played"
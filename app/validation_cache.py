@@ -0,0 +1,64 @@
+import json
+import sqlite3
+import time
+from contextlib import closing
+
+
+class ValidationCache:
+    """
+    Persistent cache of validation results keyed by submission hash and validator version.
+    Entries are evicted when they exceed max_age seconds or when the cache holds more than
+    max_entries results (least recently used first).
+    """
+
+    def __init__(self, db_path, max_entries=1000, max_age=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        with closing(self._connect()) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )''')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def make_key(content_hash, validator_version):
+        return f'{content_hash}:{validator_version}'
+
+    def get(self, key):
+        """Return the cached result for key, or None. Updates the hit/miss counters."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT result FROM results WHERE key = ? AND created >= ?',
+                               (key, now - self.max_age)).fetchone()
+            if row is None:
+                conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'misses'")
+                return None
+            conn.execute('UPDATE results SET last_used = ? WHERE key = ?', (now, key))
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'hits'")
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Store a result and evict expired or surplus entries"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(result), now, now))
+            conn.execute('DELETE FROM results WHERE created < ?', (now - self.max_age,))
+            conn.execute('DELETE FROM results WHERE key NOT IN '
+                         '(SELECT key FROM results ORDER BY last_used DESC LIMIT ?)', (self.max_entries,))
+
+    def stats(self):
+        """Return hit/miss counters and the number of cached entries"""
+        with closing(self._connect()) as conn:
+            counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+            counters['entries'] = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        return counters
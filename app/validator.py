@@ -1,83 +1,445 @@
+import ast
 import zipfile
 from io import BytesIO
+from contextlib import contextmanager, ExitStack
+import hashlib
+import importlib.metadata
 import importlib.util
+import json
 import sys
-from typing import Dict, Any
-import tempfile
+from typing import Dict, Any, Union
 from flask import current_app
-import os
+import threading
+import time
+from .sandbox import SandboxPool, SandboxError, SandboxTimeout, PoolFullError
+from .validation_cache import ValidationCache
+from .ingest import file_sha256
+from . import agent_loader, environments, referee
+from .environments import agent_environment, environment_settings, RequirementsError, EnvironmentBuildError
+from . import metrics
 
 VALIDATION_TIMEOUT = 30.
+# Extra time granted to the sandbox process for interpreter start-up and imports
+SANDBOX_GRACE = 15.
 
-def validate_submission(zip_content: bytes) -> Dict[str, Any]:
+_pool = None
+_pool_lock = threading.Lock()
+_caches = {}
+# Validator versions per referee
+_validator_versions = {}
+
+def get_validation_pool() -> SandboxPool:
+    """Get or create the process-wide pool of validator subprocesses"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(max_workers=current_app.config['VALIDATION_WORKERS'],
+                                queue_depth=current_app.config['VALIDATION_QUEUE_DEPTH'],
+                                start_method=current_app.config['VALIDATION_START_METHOD'],
+                                preload=current_app.config['VALIDATION_PRELOAD'])
+    return _pool
+
+def get_validation_cache():
+    """Get the validation result cache configured for the current app, or None if disabled"""
+    db_path = current_app.config.get('VALIDATION_CACHE_PATH')
+    if not db_path:
+        return None
+    with _pool_lock:
+        if db_path not in _caches:
+            _caches[db_path] = ValidationCache(db_path,
+                                               max_entries=current_app.config['VALIDATION_CACHE_MAX_ENTRIES'],
+                                               max_age=current_app.config['VALIDATION_CACHE_MAX_AGE'])
+        return _caches[db_path]
+
+def resolve_referee(referee_name: str, validator_path: str = None):
+    """
+    The game interface checking agents' moves: the builtin referee or c4utils.agent_interface.
+    c4utils is imported once per process; VALIDATOR_PATH stays on sys.path, so validator
+    processes inherit it and find the package preloaded by the fork server.
+    """
+    if referee_name == 'builtin':
+        return referee
+    if validator_path and validator_path not in sys.path:
+        sys.path.insert(0, validator_path)
+    return importlib.import_module('c4utils.agent_interface')
+
+def init_app(app):
+    """Resolve the game interface once at start-up and preload it into validator processes"""
+    if app.config['VALIDATION_REFEREE'] == 'builtin':
+        return
+    try:
+        resolve_referee(app.config['VALIDATION_REFEREE'], app.config['VALIDATOR_PATH'])
+    except ImportError as e:
+        # Reported by every validation until the package is installed
+        app.logger.warning(f"Game validator package not available: {str(e)}")
+        return
+    if 'c4utils.agent_interface' not in app.config['VALIDATION_PRELOAD']:
+        app.config['VALIDATION_PRELOAD'] = [*app.config['VALIDATION_PRELOAD'], 'c4utils.agent_interface']
+
+def get_validator_version(validator_path: str, referee_name: str = 'builtin') -> str:
+    """
+    Version of the validation logic: the referee (the c4utils version for the c4utils referee)
+    plus a fingerprint of the validator modules, so cached results are invalidated whenever
+    either changes.
+    """
+    if referee_name not in _validator_versions:
+        if referee_name == 'builtin':
+            referee_version = 'builtin'
+        else:
+            try:
+                referee_version = importlib.metadata.version('c4utils')
+            except importlib.metadata.PackageNotFoundError:
+                try:
+                    resolve_referee(referee_name, validator_path)
+                    referee_version = getattr(sys.modules['c4utils'], '__version__', 'unknown')
+                except ImportError:
+                    referee_version = 'missing'
+        fingerprint = hashlib.sha256()
+        for module in (sys.modules[__name__], agent_loader, environments, referee):
+            with open(module.__file__, 'rb') as f:
+                fingerprint.update(f.read())
+        _validator_versions[referee_name] = f'{referee_version}+{fingerprint.hexdigest()[:12]}'
+    return _validator_versions[referee_name]
+
+def validate_submission(zip_content: Union[bytes, str], content_hash: str = None) -> Dict[str, Any]:
     """
     Validates a zipped submission by checking:
     1. Required files and structure
     2. Python package validity
     3. generate_move function existence and game interface compliance
+    zip_content is either the ZIP bytes or the path of a spooled ZIP file, which is read in place.
+    Results are cached by SHA-256 of the ZIP (content_hash, computed if not given).
+    """
+    validator_path = current_app.config.get('VALIDATOR_PATH', '../c4utils')
+    settings = _validation_settings()
+    cache = get_validation_cache()
+    if cache is None:
+        return _count_outcome(_run_validation(zip_content, settings), cached=False)
+
+    if content_hash is None:
+        if isinstance(zip_content, (bytes, bytearray)):
+            content_hash = hashlib.sha256(zip_content).hexdigest()
+        else:
+            content_hash = file_sha256(zip_content)
+    version = get_validator_version(validator_path, current_app.config['VALIDATION_REFEREE'])
+    key = cache.make_key(content_hash, f'{version}+{_settings_fingerprint(settings)}')
+    with metrics.stage('validate.cache'):
+        result = cache.get(key)
+    if result is not None:
+        return _count_outcome(result, cached=True)
+    result = _run_validation(zip_content, settings)
+    # Results caused by load or by the environment rather than the submission are not cached
+    if not result.get('retryable'):
+        cache.put(key, result)
+    return _count_outcome(result, cached=False)
+
+def _count_outcome(result: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+    """Count a validation result by outcome in the metrics"""
+    outcome = 'valid' if result['valid'] else 'retryable' if result.get('retryable') else 'invalid'
+    metrics.count('c4_validations_total', 'Validation results by outcome', outcome=outcome, cached=str(cached).lower())
+    return result
+
+def _validation_settings() -> Dict[str, Any]:
+    """Validator settings from the app config, passed on to sandbox processes"""
+    return {
+        'validator_path': current_app.config.get('VALIDATOR_PATH', '../c4utils'),
+        'import_mode': current_app.config.get('VALIDATION_IMPORT_MODE', 'memory'),
+        'referee': current_app.config.get('VALIDATION_REFEREE', 'builtin'),
+        'environments': environment_settings(),
+        'zip_limits': agent_loader.ExtractionLimits(max_entries=current_app.config['ZIP_MAX_ENTRIES'],
+                                                    max_total_size=current_app.config['ZIP_MAX_TOTAL_SIZE'],
+                                                    max_file_size=current_app.config['ZIP_MAX_FILE_SIZE'],
+                                                    max_ratio=current_app.config['ZIP_MAX_RATIO'],
+                                                    max_depth=current_app.config['ZIP_MAX_DEPTH'])
+    }
+
+def _settings_fingerprint(settings: Dict[str, Any]) -> str:
+    """
+    Hash of the settings that decide validation results: archive limits, import mode, whether
+    and from where requirements are installed, and the versions of the provided packages
+    requirements are checked against. Part of the cache key, so changing them invalidates results.
+    """
+    store = settings['environments']
+    relevant = {
+        'zip_limits': list(settings['zip_limits']),
+        'import_mode': settings['import_mode'],
+        'environments': store and store['wheelhouse'],
+        'provided': {name: importlib.metadata.version(name) for name in environments.PROVIDED_PACKAGES}
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode()).hexdigest()[:12]
+
+def _prepare_environment(stack: ExitStack, zip_content: Union[bytes, str], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Install or reuse the requirements of a submission before it is validated, so a build
+    is bounded by its own time limit (environments.BUILD_TIMEOUT) and not by the
+    validation's. Returns the settings with the site directory, or the RequirementsError
+    to report, as 'environment'; the environment is kept from eviction until the ExitStack
+    is closed. Submissions whose requirements can't be read are left to the validation,
+    which reports what is wrong with them.
+    """
+    if settings['environments'] is None:
+        return settings
+    try:
+        with _open_zip_source(zip_content) as zip_file, zipfile.ZipFile(zip_file) as z:
+            agent_loader.check_archive(z, settings['zip_limits'])
+            requirements = z.read('requirements.txt').decode('utf-8', errors='replace')
+    except (zipfile.BadZipFile, agent_loader.ArchiveLimitError, KeyError, OSError):
+        return settings
+    with metrics.stage('validate.environment'):
+        try:
+            environment = stack.enter_context(agent_environment(requirements, settings['environments']))
+        except RequirementsError as e:
+            environment = e
+    return dict(settings, environment=environment)
+
+def _run_validation(zip_content: Union[bytes, str], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the validation in an isolated subprocess unless VALIDATION_ISOLATED is disabled.
+    The agent's requirements are installed first, outside of the validation's deadline.
+    The stage timings of the validation are recorded in the metrics.
+    """
+    try:
+        with metrics.stage('validate'), ExitStack() as stack:
+            settings = _prepare_environment(stack, zip_content, settings)
+            if not current_app.config.get('VALIDATION_ISOLATED', True):
+                result, timings = _validate_timed(zip_content, settings)
+            else:
+                result, timings = get_validation_pool().run(_validate_timed, (zip_content, settings),
+                                                            timeout=VALIDATION_TIMEOUT + SANDBOX_GRACE)
+    except PoolFullError:
+        return {
+            'valid': False,
+            'message': 'Too many submissions are being validated right now. Please try again in a minute.',
+            'retryable': True
+        }
+    except SandboxTimeout:
+        return {
+            'valid': False,
+            'message': f'Validation timed out after {VALIDATION_TIMEOUT:.0f} seconds',
+            'retryable': True
+        }
+    except SandboxError as e:
+        # A crashed sandbox is usually the environment (out of memory, failed start), not the submission
+        return {
+            'valid': False,
+            'message': f'Validation error: {str(e)}',
+            'retryable': True
+        }
+    for name, seconds in timings.items():
+        metrics.record_stage(f'validate.{name}', seconds)
+    return result
+
+@contextmanager
+def _open_zip_source(zip_content: Union[bytes, str]):
+    """File-like view of a submission: bytes are wrapped, spooled files are read in place"""
+    if isinstance(zip_content, (bytes, bytearray)):
+        yield BytesIO(zip_content)
+        return
+    # ZipFile only reads the central directory and the members it needs from the file
+    with open(zip_content, 'rb') as f:
+        yield f
+
+def _record_stage(timings, name: str, start: float):
+    """Record the seconds since start as the duration of a validation stage, if timings are collected"""
+    if timings is not None:
+        timings[name] = time.perf_counter() - start
+
+def _compile_sources(z: zipfile.ZipFile, files) -> Union[str, ast.Module]:
+    """
+    Byte-compile every Python file of the submission without running it.
+    Returns the syntax tree of agent/__init__.py, or an error message for the first file that doesn't compile.
+    """
+    init_tree = None
+    for name in files:
+        if not name.endswith('.py') or name.startswith('__MACOSX/'):
+            continue
+        try:
+            tree = ast.parse(z.read(name), filename=name)
+            compile(tree, name, 'exec', dont_inherit=True)
+        except SyntaxError as e:
+            return f'Validation error: {e.msg} ({name}, line {e.lineno})'
+        except ValueError as e:
+            return f'Validation error: {str(e)} ({name})'
+        if name == 'agent/__init__.py':
+            init_tree = tree
+    return init_tree
+
+def _quote_names(names) -> str:
+    """'a', 'a' and 'b', 'a', 'b', and 'c' - as in Python's TypeError messages"""
+    names = [f"'{name}'" for name in names]
+    if len(names) <= 2:
+        return ' and '.join(names)
+    return ', '.join(names[:-1]) + ', and ' + names[-1]
+
+def _binds_generate_move(node: ast.AST) -> bool:
+    """True if a statement may bind the name generate_move (assignment, import, nested definition)"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id == 'generate_move' and isinstance(child.ctx, ast.Store):
+            return True
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and child.name == 'generate_move':
+            return True
+        if isinstance(child, (ast.Import, ast.ImportFrom)) and any(
+                alias.name == '*' or (alias.asname or alias.name.split('.')[0]) == 'generate_move'
+                for alias in child.names):
+            return True
+    return False
+
+def _check_generate_move(tree: ast.Module) -> str:
+    """
+    Static check of the generate_move(board, player, timeout) interface in agent/__init__.py.
+    Returns an error message, or None if the function is defined as required or is bound in a
+    way that can only be checked by importing it (imports, assignments, decorators).
+    """
+    bindings = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == 'generate_move':
+                bindings.append(node)
+            elif node.name == '__getattr__':
+                # Module-level __getattr__ can provide any attribute
+                return None
+        elif _binds_generate_move(node):
+            return None
+    if not bindings:
+        return 'agent package must expose a generate_move function'
+    function = bindings[-1]
+    if not isinstance(function, ast.FunctionDef) or function.decorator_list:
+        return None
+    arguments = function.args
+    positional = [arg.arg for arg in arguments.posonlyargs + arguments.args]
+    required = len(positional) - len(arguments.defaults)
+    if arguments.vararg is None and len(positional) < 3:
+        if arguments.defaults:
+            takes = f'from {required} to {len(positional)} positional arguments'
+        else:
+            takes = f"{len(positional)} positional argument{'' if len(positional) == 1 else 's'}"
+        return f'Game validation failed: generate_move() takes {takes} but 3 were given'
+    if required > 3:
+        missing = positional[3:required]
+        return (f"Game validation failed: generate_move() missing {len(missing)} required positional "
+                f"argument{'' if len(missing) == 1 else 's'}: {_quote_names(missing)}")
+    missing = [arg.arg for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults) if default is None]
+    if missing:
+        return (f"Game validation failed: generate_move() missing {len(missing)} required keyword-only "
+                f"argument{'' if len(missing) == 1 else 's'}: {_quote_names(missing)}")
+    return None
+
+def _validate_timed(zip_content: Union[bytes, str], settings: Dict[str, Any]):
+    """Validate and return the result together with the stage timings"""
+    timings = {}
+    return _validate(zip_content, settings, timings), timings
+
+def _validate(zip_content: Union[bytes, str], settings: Dict[str, Any], timings: Dict[str, float] = None) -> Dict[str, Any]:
+    """
+    Validation body, independent of the Flask app so it can run in a sandbox process.
+    Stages run from cheap to expensive and stop at the first failure. If a timings dict is
+    given, the seconds spent in each stage are recorded in it: setup (loading the game
+    validator), open (ZIP parsing), static (compiling all sources and checking the
+    generate_move signature), environment (installing or reusing the agent's requirements,
+    unless the caller did so and passed the result as settings['environment']),
+    import (agent import) and game.
     """
     # Initialize validator
     try:
-        # In development, add path to sys.path
-        if not os.getenv('GAE_ENV', '').startswith('standard'):
-            c4utils_path = current_app.config.get('VALIDATOR_PATH', '../c4utils')
-            sys.path.insert(0, c4utils_path)
-            
-        # Import the validator module
-        connect4_validator = importlib.import_module('c4utils.agent_interface')
-        
-        # Clean up sys.path in development
-        if not os.getenv('GAE_ENV', '').startswith('standard'):
-            sys.path.remove(c4utils_path)
+        start = time.perf_counter()
+        # Bitboard referee of this app or c4utils.agent_interface, which have the same interface
+        connect4_validator = resolve_referee(settings['referee'], settings['validator_path'])
+        _record_stage(timings, 'setup', start)
             
     except ImportError as e:
         return {
             'valid': False,
-            'message': f'Game validator package not installed. Please install c4utils package. Error: {str(e)}'
+            'message': f'Game validator package not installed. Please install c4utils package. Error: {str(e)}',
+            'retryable': True
         }
     except Exception as e:
         return {
             'valid': False,
-            'message': f'Unknown validation error: {str(e)}'
+            'message': f'Unknown validation error: {str(e)}',
+            'retryable': True
         }
             
 
     # Rest of validation code using connect4_validator
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            # Extract ZIP contents
-            zip_bytes = BytesIO(zip_content)
-            with zipfile.ZipFile(zip_bytes) as z:
-                # Check for requirements.txt at root level
-                files = z.namelist()
-                if 'requirements.txt' not in files:
-                    return {
-                        'valid': False,
-                        'message': 'requirements.txt must be in the root of the ZIP'
-                    }
-                
-                # Check for agent package
-                if not any(f.startswith('agent/') for f in files):
-                    return {
-                        'valid': False,
-                        'message': 'ZIP must contain an "agent" package directory'
-                    }
-                
-                # Check for __init__.py in agent package
-                if 'agent/__init__.py' not in files:
-                    return {
-                        'valid': False,
-                        'message': 'agent package must contain __init__.py'
-                    }
-                
-                # Extract files for further validation
-                z.extractall(temp_dir)
-                
-                # Try to import the agent package
-                try:
-                    sys.path.insert(0, temp_dir)
-                    agent_module = importlib.import_module('agent')
-                    
+    try:
+        start = time.perf_counter()
+        with _open_zip_source(zip_content) as zip_file, zipfile.ZipFile(zip_file) as z, ExitStack() as stack:
+            # Check for requirements.txt at root level
+            files = z.namelist()
+            # Archive budgets, from the central directory before any member is read
+            try:
+                agent_loader.check_archive(z, settings['zip_limits'])
+            except agent_loader.ArchiveLimitError as e:
+                return {
+                    'valid': False,
+                    'message': f'ZIP rejected: {str(e)}'
+                }
+            _record_stage(timings, 'open', start)
+            if 'requirements.txt' not in files:
+                return {
+                    'valid': False,
+                    'message': 'requirements.txt must be in the root of the ZIP'
+                }
+            
+            # Check for agent package
+            if not any(f.startswith('agent/') for f in files):
+                return {
+                    'valid': False,
+                    'message': 'ZIP must contain an "agent" package directory'
+                }
+            
+            # Check for __init__.py in agent package
+            if 'agent/__init__.py' not in files:
+                return {
+                    'valid': False,
+                    'message': 'agent package must contain __init__.py'
+                }
+            
+            # Static checks: every source compiles and generate_move takes the game's arguments
+            start = time.perf_counter()
+            init_tree = _compile_sources(z, files)
+            if isinstance(init_tree, str):
+                return {
+                    'valid': False,
+                    'message': init_tree
+                }
+            error = _check_generate_move(init_tree)
+            _record_stage(timings, 'static', start)
+            if error is not None:
+                return {
+                    'valid': False,
+                    'message': error
+                }
+
+            # Environment with the agent's requirements, built once per set of requirements
+            try:
+                if 'environment' in settings:
+                    environment = settings['environment']
+                    if isinstance(environment, RequirementsError):
+                        raise environment
+                else:
+                    start = time.perf_counter()
+                    requirements = z.read('requirements.txt').decode('utf-8', errors='replace')
+                    environment = stack.enter_context(agent_environment(requirements, settings['environments']))
+                    _record_stage(timings, 'environment', start)
+            except EnvironmentBuildError as e:
+                # The wheelhouse may get the missing packages, so the result is not cached
+                return {
+                    'valid': False,
+                    'message': f'Could not install requirements: {str(e)}',
+                    'retryable': True
+                }
+            except RequirementsError as e:
+                return {
+                    'valid': False,
+                    'message': f'Invalid requirements.txt: {str(e)}'
+                }
+
+            # Import the agent package, straight from the archive where possible
+            try:
+                start = time.perf_counter()
+                with agent_loader.loaded_agent(z, settings['import_mode'], environment, settings['zip_limits']) as agent_module:
+                    _record_stage(timings, 'import', start)
                     # Basic function checks
                     if not hasattr(agent_module, 'generate_move'):
                         return {
@@ -92,7 +454,9 @@ def validate_submission(zip_content: bytes) -> Dict[str, Any]:
                         }
                     
                     # Validate against game interface
+                    start = time.perf_counter()
                     valid, error = connect4_validator.validate_agent_function(agent_module.generate_move, VALIDATION_TIMEOUT)
+                    _record_stage(timings, 'game', start)
                     if error is not None:
                         return {
                             'valid': False,
@@ -103,27 +467,25 @@ def validate_submission(zip_content: bytes) -> Dict[str, Any]:
                             'valid': False,
                             'message': 'Agent failed game interface validation (invalid moves returned)'
                         }
-                    
-                except ImportError as e:
-                    return {
-                        'valid': False,
-                        'message': f'Failed to import agent package: {str(e)}'
-                    }
-                finally:
-                    sys.path.pop(0)
                 
-        except zipfile.BadZipFile:
-            return {
-                'valid': False,
-                'message': 'Invalid ZIP file'
-            }
-        except Exception as e:
-            return {
-                'valid': False,
-                'message': f'Validation error: {str(e)}'
-            }
+            except ImportError as e:
+                return {
+                    'valid': False,
+                    'message': f'Failed to import agent package: {str(e)}'
+                }
+            
+    except zipfile.BadZipFile:
+        return {
+            'valid': False,
+            'message': 'Invalid ZIP file'
+        }
+    except Exception as e:
+        return {
+            'valid': False,
+            'message': f'Validation error: {str(e)}'
+        }
     
     return {
         'valid': True,
         'message': 'Validation successful'
-    } 
\ No newline at end of file
+    } 
@@ -14,6 +14,7 @@ mkdir deploy_tmp
 echo "Copying webapp files..."
 cp -r app deploy_tmp/
 cp -r main.py deploy_tmp/
+cp gunicorn.conf.py deploy_tmp/
 
 # Copy c4utils package to root level
 echo "Copying c4utils package..."
@@ -48,6 +49,8 @@ runtime: python310
 service: default
 env: standard
 instance_class: F1
+inbound_services:
+- warmup
 
 # This tells App Engine how to run your app
 entrypoint: gunicorn -b :8080 main:app
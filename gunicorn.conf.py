@@ -0,0 +1,17 @@
+# Gunicorn picks this file up automatically from the working directory.
+
+def post_worker_init(worker):
+    """Create the storage and logging clients once per worker, after the fork"""
+    from app.storage import warm_up
+    app = worker.wsgi
+    with app.app_context():
+        try:
+            warm_up()
+        except Exception as e:
+            app.logger.error(f"Worker warm-up failed: {str(e)}")
+
+
+def worker_exit(server, worker):
+    """Ship log entries still queued in the background log shipper"""
+    from app.storage import flush_logs
+    flush_logs()
@@ -0,0 +1,69 @@
+"""
+Benchmark the start-up cost of sandboxed validator processes.
+
+Each sample runs one call through a SandboxPool, as a validation does, and measures the
+time until the process has imported the validator (the game interface and NumPy) and
+returned. Compared are a new interpreter per call ('spawn', cold) and processes forked
+from a fork server with the validator modules preloaded ('forkserver', warm). The first
+forkserver call includes starting the server and is reported separately.
+
+    python scripts/bench_sandbox.py --repeat 20 --output sandbox.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.sandbox import SandboxPool  # noqa: E402
+
+PRELOAD = ['numpy', 'app.validator']
+
+
+def probe():
+    """Import what a validation needs; cheap if the process was forked with it preloaded"""
+    import app.validator  # noqa: F401
+    return True
+
+
+def bench(start_method, preload, repeat):
+    pool = SandboxPool(max_workers=1, start_method=start_method, preload=preload)
+    samples = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        pool.run(probe, timeout=120)
+        samples.append(time.perf_counter() - start)
+    first, samples = samples[0], sorted(samples[1:])
+    return {
+        'first_ms': first * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    # The fork server of this process is configured once, so the warm run goes last
+    results = {
+        'spawn': bench('spawn', (), args.repeat),
+        'forkserver': bench('forkserver', PRELOAD, args.repeat)
+    }
+    print(f"{'start method':<14}{'first ms':>10}{'median ms':>11}{'p95 ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<14}{result['first_ms']:>10.1f}{result['median_ms']:>11.1f}{result['p95_ms']:>9.1f}")
+    print(f"warm start-up is {results['spawn']['median_ms'] / results['forkserver']['median_ms']:.1f}x faster")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
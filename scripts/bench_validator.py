@@ -0,0 +1,94 @@
+"""
+Benchmark the submission validator on a corpus of submissions.
+
+Every sample validates one submission in a fresh interpreter, as the sandbox does, and
+records the time spent per stage (setup, open, static, environment, import, game), the total time and the
+peak memory (Python allocations and resident set size).
+
+    python scripts/generate_corpus.py --output corpus/
+    python scripts/bench_validator.py corpus/ --repeat 5 --output bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.agent_loader import ExtractionLimits  # noqa: E402
+
+STAGES = ('setup', 'open', 'static', 'environment', 'import', 'game')
+
+
+def measure(path, settings):
+    """Validate one submission and return its result, stage timings and memory peaks"""
+    import resource
+    import tracemalloc
+    from app.validator import _validate
+
+    timings = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = _validate(path, settings, timings)
+    timings['total'] = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'valid': result['valid'],
+        'message': result['message'],
+        'timings': timings,
+        'peak_alloc_kb': peak / 1024,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def bench(path, settings, repeat):
+    """Summary of repeated cold-start validations of one submission"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        samples = [pool.apply(measure, (str(path), settings)) for _ in range(repeat)]
+    summary = {
+        'valid': samples[0]['valid'],
+        'message': samples[0]['message'],
+        'peak_alloc_kb': max(sample['peak_alloc_kb'] for sample in samples),
+        'max_rss_kb': max(sample['max_rss_kb'] for sample in samples)
+    }
+    for stage in STAGES + ('total',):
+        values = [sample['timings'][stage] for sample in samples if stage in sample['timings']]
+        summary[f'{stage}_ms'] = statistics.median(values) * 1000 if values else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', help='directory of submission ZIPs, see generate_corpus.py')
+    parser.add_argument('--repeat', type=int, default=3, help='samples per submission')
+    parser.add_argument('--import-mode', choices=['memory', 'extract'], default='memory')
+    parser.add_argument('--referee', choices=['builtin', 'c4utils'], default='builtin')
+    parser.add_argument('--validator-path', default=os.getenv('VALIDATOR_PATH', '../c4utils'))
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    settings = {'validator_path': args.validator_path, 'import_mode': args.import_mode, 'referee': args.referee,
+                'environments': None, 'zip_limits': ExtractionLimits()}
+    results = {}
+    print(f"{'submission':<20}" + ''.join(f'{stage + " ms":>11}' for stage in STAGES + ('total',))
+          + f"{'alloc KB':>11}{'RSS KB':>11}  result")
+    for path in sorted(Path(args.corpus).glob('*.zip')):
+        summary = results[path.stem] = bench(path, settings, args.repeat)
+        timings = ''.join(f'{summary[stage + "_ms"]:>11.1f}' if summary[stage + '_ms'] is not None else f"{'-':>11}"
+                          for stage in STAGES + ('total',))
+        print(f"{path.stem:<20}{timings}{summary['peak_alloc_kb']:>11.0f}{summary['max_rss_kb']:>11}  "
+              f"{'ok' if summary['valid'] else summary['message'][:60]}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Export the current version of every stored agent into one ZIP archive with a manifest.json
+of versions, sizes and SHA-256 hashes, e.g. before a tournament round.
+
+Agents are read from the storage backend configured for the app (STORAGE_BACKEND),
+several at a time, and written to the archive as they arrive.
+
+    python scripts/export_agents.py -o agents.zip
+    python scripts/export_agents.py -o agents.zip --workers 16
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def main():
+    from app import create_app
+    from app.export import export_agents
+    from app.storage import get_backend
+
+    app = create_app()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', required=True, help='archive to write')
+    parser.add_argument('--workers', type=int, default=app.config['EXPORT_WORKERS'],
+                        help='concurrent storage reads')
+    args = parser.parse_args()
+
+    temp_path = f'{args.output}.part'
+    with app.app_context(), open(temp_path, 'wb') as f:
+        for chunk in export_agents(get_backend(), args.workers):
+            f.write(chunk)
+    os.replace(temp_path, args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
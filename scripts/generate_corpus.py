@@ -0,0 +1,104 @@
+"""
+Generate a corpus of synthetic submissions for benchmarking the validator.
+
+Each submission is a variant of the example in test_package/ that differs in archive size,
+number of modules, import weight (e.g. numpy) and time taken per move.
+
+    python scripts/generate_corpus.py --output corpus/
+"""
+import argparse
+import io
+import json
+import os
+import zipfile
+
+AGENT_TEMPLATE = '''{imports}
+from . import {helpers}
+
+
+def generate_move(board, player, timeout):
+{delay}    for column in range(len(board[0])):
+        if any(row[column] == 0 for row in board):
+            return column
+    return 0
+'''
+
+# name, size_kb, file_count, import_weight, move_latency_ms, data_kb
+DEFAULT_CORPUS = [
+    ('minimal', 0, 1, 'none', 0, 0),
+    ('large-source', 2048, 1, 'none', 0, 0),
+    ('many-files', 0, 200, 'none', 0, 0),
+    ('numpy', 0, 1, 'numpy', 0, 0),
+    ('slow-moves', 0, 1, 'none', 5, 0),
+    ('data-file', 0, 1, 'none', 0, 4096),
+    ('heavy', 1024, 50, 'numpy', 2, 1024)
+]
+
+IMPORTS = {
+    'none': ([], []),
+    'numpy': (['import numpy'], ['numpy'])
+}
+
+
+def build_submission(size_kb=0, file_count=1, import_weight='none', move_latency_ms=0, data_kb=0):
+    """
+    ZIP bytes of a valid submission.
+    size_kb pads the sources with a large constant, file_count is the number of helper modules,
+    import_weight selects third-party imports, move_latency_ms delays every move and
+    data_kb adds a binary data file (which forces extraction to disk).
+    """
+    imports, requirements = IMPORTS[import_weight]
+    helpers = [f'helper_{i}' for i in range(file_count)]
+    delay = f'    time.sleep({move_latency_ms / 1000!r})\n' if move_latency_ms else ''
+    if move_latency_ms:
+        imports = imports + ['import time']
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('requirements.txt', ''.join(f'{name}\n' for name in requirements))
+        z.writestr('agent/__init__.py', AGENT_TEMPLATE.format(
+            imports='\n'.join(imports), helpers=', '.join(helpers), delay=delay))
+        for i, helper in enumerate(helpers):
+            z.writestr(f'agent/{helper}.py', f'def helper():\n    return {i}\n')
+        if size_kb:
+            # Random-looking but reproducible padding that does not compress away
+            padding = ''.join(f'{(i * 2654435761) % 2 ** 32:08x}' for i in range(size_kb * 128))
+            z.writestr('agent/weights.py', f'WEIGHTS = {padding!r}\n')
+        if data_kb:
+            z.writestr('agent/weights.bin', os.urandom(data_kb * 1024))
+    return buffer.getvalue()
+
+
+def generate_corpus(output_dir, specs=DEFAULT_CORPUS):
+    """Write one ZIP per spec and a manifest.json describing them. Returns the manifest."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    for name, size_kb, file_count, import_weight, move_latency_ms, data_kb in specs:
+        data = build_submission(size_kb, file_count, import_weight, move_latency_ms, data_kb)
+        with open(os.path.join(output_dir, f'{name}.zip'), 'wb') as f:
+            f.write(data)
+        manifest.append({
+            'name': name,
+            'file': f'{name}.zip',
+            'bytes': len(data),
+            'size_kb': size_kb,
+            'file_count': file_count,
+            'import_weight': import_weight,
+            'move_latency_ms': move_latency_ms,
+            'data_kb': data_kb
+        })
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='corpus', help='directory to write the submissions to')
+    args = parser.parse_args()
+    for entry in generate_corpus(args.output):
+        print(f"{entry['file']:<20}{entry['bytes']:>12} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Load test for the upload/login/delete flow.
+
+Drives create_app() in-process with many concurrent simulated teams against a local
+storage backend and reports throughput and p50/p95/p99 latency per endpoint.
+
+    python scripts/loadtest.py --teams 30 --rounds 3 --output run.json
+    python scripts/loadtest.py --teams 30 --rounds 3 --compare run.json
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PASSWORD = 'loadtest-password'
+# Flash messages of successful uploads, updates and deletions; failures redirect with 302 as well
+SUCCESS_FLASHES = ('uploaded successfully', 'updated successfully', 'is being validated', 'deleted successfully')
+
+
+def configure_teams(count):
+    """Register simulated teams through the environment, before app.config is imported"""
+    for i in range(count):
+        os.environ[f'TEAM{9000 + i}_NAME'] = f'loadteam{i}'
+        os.environ[f'TEAM{9000 + i}_PASSWORD'] = f'{PASSWORD}-{i}'
+    return [(f'loadteam{i}', f'{PASSWORD}-{i}') for i in range(count)]
+
+
+def make_submission(package_dir=ROOT / 'test_package', nonce=None):
+    """
+    ZIP of the example submission in test_package/. A nonce file makes the bytes unique, so
+    an update is validated and stored instead of hitting the unchanged-content shortcut.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        for path in sorted(package_dir.rglob('*')):
+            if path.is_file() and '__pycache__' not in path.parts:
+                z.write(path, path.relative_to(package_dir).as_posix())
+        if nonce is not None:
+            z.writestr('nonce.txt', nonce)
+    return buffer.getvalue()
+
+
+def pop_flashes(client):
+    """Flash messages of the last request, removed from the session so they don't pile up"""
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def flashed_success(client, response):
+    """True if a form post redirected with a success message"""
+    return response.status_code in (302, 303) and any(
+        text in message for message in pop_flashes(client) for text in SUCCESS_FLASHES)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class Recorder:
+    """Thread-safe collection of request latencies per endpoint"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def request(self, endpoint, call, succeeded):
+        """Time call() and count it as an error unless succeeded(response), which is not timed"""
+        start = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - start
+        ok = succeeded(response)
+        with self.lock:
+            self.samples[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+        return response
+
+
+def run_team(app, team, password, submission, rounds, recorder):
+    """Scenario of one team: log in, list, upload, update and delete, repeated"""
+    client = app.test_client()
+    posted = lambda response: flashed_success(client, response)
+    recorder.request('login', lambda: client.post('/login', data={'group_name': team, 'password': password}),
+                     lambda response: response.status_code == 302 and response.location.endswith('/upload'))
+    for round_number in range(rounds):
+        agent_name = f'agent-{round_number}'
+        recorder.request('list', lambda: client.get('/upload'), lambda response: response.status_code == 200)
+        update = make_submission(nonce=f'{team}-{round_number}')
+        for endpoint, data in (('upload', submission), ('update', update)):
+            recorder.request(endpoint, lambda: client.post('/upload', data={
+                'submission': (io.BytesIO(data), 'submission.zip'),
+                'agent_name': agent_name
+            }, content_type='multipart/form-data'), posted)
+        recorder.request('delete', lambda: client.post(f'/delete/{agent_name}'), posted)
+
+
+def summarize(recorder, wall_time):
+    report = {'wall_time': wall_time, 'endpoints': {}}
+    total = 0
+    for endpoint, samples in sorted(recorder.samples.items()):
+        total += len(samples)
+        report['endpoints'][endpoint] = {
+            'requests': len(samples),
+            'errors': recorder.errors[endpoint],
+            'p50_ms': percentile(samples, 0.50) * 1000,
+            'p95_ms': percentile(samples, 0.95) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000
+        }
+    report['requests'] = total
+    report['throughput_rps'] = total / wall_time if wall_time else 0.0
+    return report
+
+
+def print_report(report, baseline=None):
+    print(f"{report['requests']} requests in {report['wall_time']:.2f}s "
+          f"({report['throughput_rps']:.1f} req/s)")
+    if baseline:
+        change = report['throughput_rps'] / baseline['throughput_rps'] - 1 if baseline['throughput_rps'] else 0
+        print(f"throughput vs baseline: {change:+.1%}")
+    print(f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:<10}{stats['requests']:>10}{stats['errors']:>8}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        if baseline and endpoint in baseline['endpoints']:
+            before = baseline['endpoints'][endpoint]
+            deltas = ''.join(f"{stats[key] - before[key]:>+10.1f}" for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+            print(f"{'  delta':<28}{deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teams', type=int, default=30, help='number of concurrent simulated teams')
+    parser.add_argument('--rounds', type=int, default=3, help='upload/update/delete cycles per team')
+    parser.add_argument('--backend', choices=['memory', 'local'], default='memory', help='storage backend')
+    parser.add_argument('--skip-validation', action='store_true',
+                        help='accept every submission without running the validator')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare against')
+    args = parser.parse_args()
+
+    teams = configure_teams(args.teams)
+    from app import create_app
+
+    with tempfile.TemporaryDirectory(prefix='c4league-loadtest-') as work_dir:
+        app = create_app()
+        app.config.update(
+            TESTING=True,
+            SECRET_KEY='loadtest',
+            STORAGE_BACKEND=args.backend,
+            LOCAL_STORAGE_ROOT=os.path.join(work_dir, 'storage'),
+            UPLOAD_SPOOL_DIR=os.path.join(work_dir, 'spool'),
+            JOB_DB_PATH=os.path.join(work_dir, 'jobs.sqlite3'),
+            VALIDATION_CACHE_PATH=os.path.join(work_dir, 'validation.sqlite3')
+        )
+        submission = make_submission()
+        recorder = Recorder()
+
+        validation = patch('app.routes.upload.validate_submission',
+                           return_value={'valid': True, 'message': 'Validation skipped'})
+        if args.skip_validation:
+            validation.start()
+        threads = [threading.Thread(target=run_team, args=(app, team, password, submission, args.rounds, recorder))
+                   for team, password in teams]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report = summarize(recorder, time.perf_counter() - start)
+        if args.skip_validation:
+            validation.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Import-time profile of the app's start-up (what a cold App Engine instance pays before
+its first request).
+
+Runs `python -X importtime` on create_app() in fresh interpreters and reports the total
+import time and the self time per top-level package, taking the fastest of --repeat runs.
+Compare against the checked-in baseline to spot regressions, e.g. a heavy SDK imported at
+module level again:
+
+    python scripts/profile_startup.py --compare scripts/startup_baseline.json
+    python scripts/profile_startup.py --output scripts/startup_baseline.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+STARTUP = 'from app import create_app; create_app()'
+# Packages that must only be imported on first use
+DEFERRED = ('google.cloud', 'google.auth', 'requests')
+
+
+def profile_once():
+    """Total import time, self time per top-level package (ms) and wall time of one start-up"""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    total = 0.
+    packages = defaultdict(float)
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        packages[name.strip().split('.')[0]] += int(self_us) / 1000
+        # Top-level imports are not indented; their cumulative times add up to the total
+        if not name.startswith('  '):
+            total += int(cumulative_us) / 1000
+    return {
+        'total_ms': total,
+        'wall_ms': wall * 1000,
+        'packages': dict(packages),
+        'deferred_imported': sorted(name for name in modules if name in DEFERRED)
+    }
+
+
+def profile(repeat):
+    runs = [profile_once() for _ in range(repeat)]
+    packages = {name: min(run['packages'].get(name, 0.) for run in runs)
+                for name in set().union(*(run['packages'] for run in runs))}
+    return {
+        'total_ms': round(min(run['total_ms'] for run in runs), 1),
+        'wall_ms': round(min(run['wall_ms'] for run in runs), 1),
+        'packages': {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: -item[1])},
+        'deferred_imported': runs[0]['deferred_imported']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12, help='number of packages to list')
+    parser.add_argument('--output', help='write the profile as JSON (e.g. a new baseline)')
+    parser.add_argument('--compare', help='baseline JSON; exit with status 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative increase of the total import time over the baseline')
+    args = parser.parse_args()
+
+    result = profile(args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"{'package':<24}{'self ms':>10}" + (f"{'baseline':>10}" if baseline else ''))
+    for name, ms in list(result['packages'].items())[:args.top]:
+        line = f'{name:<24}{ms:>10.1f}'
+        if baseline:
+            line += f"{baseline['packages'].get(name, 0.):>10.1f}"
+        print(line)
+    print(f"total import time {result['total_ms']:.1f} ms, start-up {result['wall_ms']:.1f} ms")
+
+    failures = [f'{name} is imported at start-up' for name in result['deferred_imported']]
+    if baseline:
+        limit = baseline['total_ms'] * (1 + args.tolerance)
+        print(f"baseline {baseline['total_ms']:.1f} ms, limit {limit:.1f} ms")
+        if result['total_ms'] > limit:
+            failures.append(f"total import time {result['total_ms']:.1f} ms exceeds {limit:.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+    for failure in failures:
+        print(f'REGRESSION: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Round-robin tournament between the current versions of all stored agents.
+
+Agents are read from the storage backend configured for the app (STORAGE_BACKEND),
+games run in parallel on all cores and results are appended to <dir>/results.jsonl.
+The leaderboard snapshot shown on /results is updated afterwards and the new games
+are added to the binary game archive (games/ in storage).
+Re-running continues where an interrupted run stopped, and after agents were updated
+only the games of their new versions are played.
+
+    python scripts/run_tournament.py --workers 8 --move-timeout 1
+    python scripts/run_tournament.py --agent team1/minimax
+    python scripts/run_tournament.py --compact
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def main():
+    from app import create_app
+    from app.storage import get_backend
+    from app.tournament import run_tournament, compact_results, get_environment_store
+    from app.leaderboard import update_leaderboard
+    from app.game_records import archive_results
+
+    app = create_app()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=app.config['TOURNAMENT_DIR'], help='working directory for agents and results')
+    parser.add_argument('--workers', type=int, default=app.config['TOURNAMENT_WORKERS'])
+    parser.add_argument('--move-timeout', type=float, default=app.config['TOURNAMENT_MOVE_TIMEOUT'],
+                        help='seconds per move')
+    parser.add_argument('--agent', action='append', dest='agents', metavar='GROUP/AGENT',
+                        help='only play the games of this agent (can be repeated)')
+    parser.add_argument('--compact', action='store_true',
+                        help='drop results of agent versions that are no longer stored, then exit')
+    args = parser.parse_args()
+
+    def progress(result):
+        winner = {1: result['first'], 2: result['second']}.get(result['winner'], 'draw')
+        print(f"{result['first']} vs {result['second']}: {winner} ({result['reason']}, {len(result['moves'])} moves)")
+
+    with app.app_context():
+        if args.compact:
+            print(f"Dropped {compact_results(get_backend(), args.dir)} results")
+            update_leaderboard(get_backend(), args.dir, rebuild=True)
+            return
+        summary = run_tournament(get_backend(), args.dir, args.workers, args.move_timeout, progress,
+                                 set(args.agents) if args.agents else None, get_environment_store())
+        update_leaderboard(get_backend(), args.dir)
+        archived = archive_results(get_backend(), args.dir)
+    print(f"{summary['agents']} agents, {summary['played']} of {summary['games']} games played "
+          f"in {summary['seconds']:.1f}s ({summary['games_per_second']:.1f} games/s), "
+          f"{archived} games archived")
+
+
+if __name__ == '__main__':
+    main()
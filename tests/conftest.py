@@ -4,6 +4,11 @@ import zipfile
 from app import create_app
 from app.config import Config
 
+@pytest.fixture(autouse=True)
+def isolated_validation_cache(tmp_path, monkeypatch):
+    """Keep every app of the suite off the shared validation cache in the temp directory"""
+    monkeypatch.setattr(Config, 'VALIDATION_CACHE_PATH', str(tmp_path / 'validation.sqlite3'))
+
 @pytest.fixture
 def app():
     """Create and configure a new app instance for each test."""
@@ -11,6 +16,7 @@ def app():
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False
     app.config['STORAGE_BUCKET'] = 'test-bucket'
+    app.config['STORAGE_BACKEND'] = 'memory'
     return app
 
 @pytest.fixture
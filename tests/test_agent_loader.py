@@ -0,0 +1,131 @@
+import io
+import sys
+import zipfile
+import pytest
+from app.agent_loader import (loaded_agent, needs_extraction, check_archive, extract_bounded,
+                              ArchiveLimitError, ExtractionLimits)
+
+def make_zip(files, compression=zipfile.ZIP_STORED):
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', compression) as zip_file:
+        for name, content in files.items():
+            zip_file.writestr(name, content)
+    zip_buffer.seek(0)
+    return zipfile.ZipFile(zip_buffer)
+
+@pytest.fixture
+def package_zip():
+    return make_zip({
+        'requirements.txt': '',
+        'agent/__init__.py': 'from .strategy import best_column\ndef generate_move(board, player, timeout): return best_column()',
+        'agent/strategy.py': 'from agent.tools.numbers import THREE\ndef best_column(): return THREE',
+        'agent/tools/__init__.py': '',
+        'agent/tools/numbers.py': 'THREE = 3'
+    })
+
+def test_pure_python_package_is_not_extracted(package_zip):
+    assert not needs_extraction(package_zip.namelist())
+
+@pytest.mark.parametrize('extra_file', ['agent/model.npy', 'agent/fast.so', 'agent/loose/module.py', 'helpers.py',
+                                        'tools/__init__.py'])
+def test_files_needing_a_path_require_extraction(extra_file):
+    assert needs_extraction(['agent/__init__.py', extra_file])
+
+def test_imports_from_memory(package_zip, monkeypatch):
+    monkeypatch.setattr('tempfile.TemporaryDirectory', None)
+    with loaded_agent(package_zip) as agent_module:
+        assert agent_module.generate_move(None, 1, 1.0) == 3
+        assert agent_module.__file__ == '<submission>/agent/__init__.py'
+    assert 'agent' not in sys.modules
+    assert 'agent.strategy' not in sys.modules
+
+def test_extracts_when_needed():
+    z = make_zip({
+        'agent/__init__.py': 'import os\nDATA = open(os.path.join(os.path.dirname(__file__), "data.txt")).read()',
+        'agent/data.txt': 'weights'
+    })
+    with loaded_agent(z) as agent_module:
+        assert agent_module.DATA == 'weights'
+    assert 'agent' not in sys.modules
+
+def test_modules_next_to_the_agent_package_are_importable():
+    z = make_zip({
+        'requirements.txt': '',
+        'agent/__init__.py': 'from helpers import COLUMN\ndef generate_move(board, player, timeout): return COLUMN',
+        'helpers.py': 'COLUMN = 4'
+    })
+    with loaded_agent(z) as agent_module:
+        assert agent_module.generate_move(None, 1, 1.0) == 4
+
+def test_each_submission_gets_a_fresh_module():
+    with loaded_agent(make_zip({'agent/__init__.py': 'NAME = "first"'})) as first:
+        assert first.NAME == 'first'
+    with loaded_agent(make_zip({'agent/__init__.py': 'NAME = "second"'})) as second:
+        assert second.NAME == 'second'
+
+def test_syntax_errors_are_raised():
+    with pytest.raises(SyntaxError):
+        with loaded_agent(make_zip({'agent/__init__.py': 'def generate_move(board, player, timeout)\n    return 0'})):
+            pass
+
+@pytest.mark.parametrize('files, limits, message', [
+    ({f'agent/{n}.py': '' for n in range(11)}, ExtractionLimits(max_entries=10), '11 entries'),
+    ({'agent/model.bin': bytes(2000)}, ExtractionLimits(max_file_size=1000), 'agent/model.bin expands to 2000 bytes'),
+    ({'agent/a.bin': bytes(600), 'agent/b.bin': bytes(600)}, ExtractionLimits(max_total_size=1000), 'more than 1000'),
+    ({'agent/zeros.bin': bytes(2 * 1024 * 1024)}, ExtractionLimits(), 'compressed more than 100:1'),
+    ({'agent/a/b/c/d.py': ''}, ExtractionLimits(max_depth=4), 'nested more than 4 levels'),
+    ({'../agent/__init__.py': ''}, ExtractionLimits(), 'unsafe path'),
+    ({'/etc/agent.py': ''}, ExtractionLimits(), 'unsafe path'),
+])
+def test_archives_beyond_the_limits_are_rejected(files, limits, message):
+    with pytest.raises(ArchiveLimitError, match=message):
+        check_archive(make_zip(files, zipfile.ZIP_DEFLATED), limits)
+
+def test_small_compressible_files_are_accepted():
+    check_archive(make_zip({'agent/__init__.py': ' ' * 100000}, zipfile.ZIP_DEFLATED), ExtractionLimits())
+
+def test_extraction_counts_the_bytes_written(tmp_path, monkeypatch):
+    # Sizes are counted again while streaming, in case the central directory understates them
+    monkeypatch.setattr('app.agent_loader.check_archive', lambda zip_file, limits: None)
+    z = make_zip({'agent/__init__.py': '', 'agent/model.bin': bytes(200000)}, zipfile.ZIP_DEFLATED)
+    with pytest.raises(ArchiveLimitError, match='agent/model.bin expands beyond'):
+        extract_bounded(z, str(tmp_path), ExtractionLimits(max_file_size=100000))
+    extract_bounded(z, str(tmp_path / 'ok'))
+    assert (tmp_path / 'ok' / 'agent' / 'model.bin').stat().st_size == 200000
+
+def test_extraction_limits_apply_when_loading():
+    z = make_zip({'agent/__init__.py': '', 'agent/model.npy': bytes(2000)})
+    with pytest.raises(ArchiveLimitError):
+        with loaded_agent(z, limits=ExtractionLimits(max_file_size=1000)):
+            pass
+
+def test_environment_modules_are_isolated(tmp_path):
+    environments = []
+    for version in (1, 2):
+        environment = tmp_path / f'env{version}'
+        (environment / 'dep').mkdir(parents=True)
+        (environment / 'dep' / '__init__.py').write_text(f'VERSION = {version}')
+        environments.append(str(environment))
+    source = {'agent/__init__.py': 'import dep\ndef generate_move(board, player, timeout): return dep.VERSION'}
+    for version, environment in enumerate(environments, 1):
+        with loaded_agent(make_zip(source), environment=environment) as agent_module:
+            assert agent_module.generate_move(None, 1, 1.0) == version
+        assert 'dep' not in sys.modules
+
+def test_packages_keep_their_environment_modules(tmp_path):
+    from app.agent_loader import AgentPackage
+    import importlib
+    packages = []
+    for version in (1, 2):
+        environment = tmp_path / f'env{version}'
+        environment.mkdir()
+        (environment / 'dep.py').write_text(f'VERSION = {version}')
+        packages.append(AgentPackage(make_zip({'agent/__init__.py': 'import dep'}), environment=str(environment)))
+    for package in packages + packages:
+        package.activate()
+        try:
+            assert importlib.import_module('agent').dep is sys.modules['dep']
+            assert sys.modules['dep'].VERSION == packages.index(package) + 1
+        finally:
+            package.deactivate()
+    assert 'dep' not in sys.modules
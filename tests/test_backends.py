@@ -0,0 +1,115 @@
+import io
+import os
+import pytest
+from unittest.mock import MagicMock
+from app.backends import StorageBackend, LocalBackend, MemoryBackend, GCSBackend, ConcurrentWriteError
+
+@pytest.fixture(params=['memory', 'local'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return LocalBackend(str(tmp_path / 'storage'))
+
+def test_put_get_and_metadata(backend):
+    backend.put('submissions/team1/a/a_v1.zip', io.BytesIO(b'zip bytes'), metadata={'sha256': 'abc'})
+    assert backend.get('submissions/team1/a/a_v1.zip') == b'zip bytes'
+    assert backend.size('submissions/team1/a/a_v1.zip') == 9
+    [blob] = backend.list('submissions/team1/')
+    assert blob.name == 'submissions/team1/a/a_v1.zip'
+    assert blob.size == 9
+    assert blob.metadata == {'sha256': 'abc'}
+
+def test_streaming_reads_and_ranges(backend):
+    backend.put_bytes('logs/game.txt', b'0123456789')
+    with backend.open('logs/game.txt') as f:
+        assert f.read(4) == b'0123'
+    assert backend.read_range('logs/game.txt', 3, 7) == b'3456'
+
+def test_list_is_sorted_and_filtered(backend):
+    for name in ('b/2', 'a/1', 'b/1', 'c'):
+        backend.put_bytes(name, b'x')
+    assert [blob.name for blob in backend.list('b/')] == ['b/1', 'b/2']
+    assert [blob.name for blob in backend.list('')] == ['a/1', 'b/1', 'b/2', 'c']
+    assert [blob.name for blob in backend.list('b/1')] == ['b/1']
+    assert backend.list('missing/') == []
+
+def test_local_backend_lists_only_the_prefix_directory(tmp_path, monkeypatch):
+    backend = LocalBackend(str(tmp_path / 'storage'))
+    backend.put_bytes('a/1', b'x')
+    backend.put_bytes('b/c/1', b'x')
+    walked = []
+    walk = os.walk
+    monkeypatch.setattr(os, 'walk', lambda top: walked.append(top) or walk(top))
+    assert [blob.name for blob in backend.list('b/c/')] == ['b/c/1']
+    assert walked == [os.path.join(backend.root, 'b', 'c')]
+
+def test_if_not_exists(backend):
+    backend.put_bytes('a', b'first', if_not_exists=True)
+    with pytest.raises(FileExistsError):
+        backend.put_bytes('a', b'second', if_not_exists=True)
+    assert backend.get('a') == b'first'
+    backend.put_bytes('a', b'second')
+    assert backend.get('a') == b'second'
+
+def test_conditional_writes(backend):
+    backend.put_if_generation('index', b'first', None)
+    with pytest.raises(ConcurrentWriteError):
+        backend.put_if_generation('index', b'other', None)
+    data, generation = backend.get_with_generation('index')
+    assert data == b'first'
+    backend.put_if_generation('index', b'second', generation)
+    with pytest.raises(ConcurrentWriteError):
+        backend.put_if_generation('index', b'third', generation)
+    assert backend.get('index') == b'second'
+    with pytest.raises(FileNotFoundError):
+        backend.get_with_generation('missing')
+
+def test_delete(backend):
+    backend.put_bytes('a', b'1')
+    backend.put_bytes('b', b'2')
+    backend.put_bytes('c', b'3')
+    backend.delete('a')
+    backend.delete_many(['b', 'c'])
+    assert backend.list('') == []
+    assert not backend.exists('a')
+    with pytest.raises(FileNotFoundError):
+        backend.get('a')
+    with pytest.raises(FileNotFoundError):
+        backend.delete('a')
+
+def test_local_backend_rejects_escaping_paths(tmp_path):
+    backend = LocalBackend(str(tmp_path / 'storage'))
+    with pytest.raises(ValueError):
+        backend.put_bytes('../outside', b'x')
+
+def test_gcs_deletes_are_batched():
+    client = MagicMock()
+    backend = GCSBackend(lambda: client, 'bucket')
+    backend.delete_many([f'blob{i}' for i in range(250)])
+    assert client.batch.call_count == 3
+    assert client.bucket.return_value.blob.return_value.delete.call_count == 250
+
+def test_incomplete_backends_cant_be_created():
+    class ReadOnlyBackend(StorageBackend):
+        def open(self, path):
+            return io.BytesIO()
+    with pytest.raises(TypeError, match='abstract'):
+        ReadOnlyBackend()
+
+def test_gcs_open_raises_for_missing_objects():
+    client = MagicMock()
+    client.bucket.return_value.get_blob.return_value = None
+    with pytest.raises(FileNotFoundError):
+        GCSBackend(lambda: client, 'bucket').open('missing')
+
+def test_gcs_conditional_writes_use_generations():
+    from google.api_core.exceptions import PreconditionFailed
+    client = MagicMock()
+    blob = client.bucket.return_value.blob.return_value
+    backend = GCSBackend(lambda: client, 'bucket')
+    backend.put_if_generation('index', b'data', 7)
+    blob.upload_from_string.assert_called_once_with(b'data', if_generation_match=7)
+    blob.upload_from_string.side_effect = PreconditionFailed('changed')
+    with pytest.raises(ConcurrentWriteError):
+        backend.put_if_generation('index', b'data', None)
+    assert blob.upload_from_string.call_args.kwargs['if_generation_match'] == 0
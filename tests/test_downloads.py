@@ -0,0 +1,64 @@
+import gzip
+import json
+import pytest
+from app.game_records import GameArchive
+from app.storage import get_backend
+
+def result(first, second, moves):
+    return {'key': f'{first}@1|{second}@1', 'first': first, 'first_version': '1', 'first_revision': '1',
+            'second': second, 'second_version': '1', 'second_revision': '1', 'winner': 1, 'reason': 'connect4', 'moves': moves, 'seconds': 0.5, 'finished': 1.}
+
+GAMES = [result('team1/a', 'team2/b', [0, 1] * 3 + [0]), result('team2/b', 'team3/c', [3] * 7),
+         result('team2/b', 'team1/a', [6, 0] * 3 + [6])]
+
+@pytest.fixture
+def archive(app):
+    with app.app_context():
+        backend = get_backend()
+    GameArchive(backend).append(GAMES)
+    return GameArchive(backend)
+
+@pytest.fixture
+def team_client(client):
+    with client.session_transaction() as sess:
+        sess['group_name'] = 'team1'
+    return client
+
+def test_downloads_require_login(client, archive):
+    assert client.get('/downloads/games/a').status_code == 302
+    assert client.get('/downloads/tournament/0').status_code == 302
+
+def test_agent_game_log(team_client, archive):
+    response = team_client.get('/downloads/games/a', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200 and response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [GAMES[0], GAMES[2]]
+
+    response = team_client.get('/downloads/games/a')
+    assert 'Content-Encoding' not in response.headers and len(response.data.splitlines()) == 2
+    assert team_client.get('/downloads/games/a/2').get_json() == GAMES[2]
+    # Games of other teams' agents are not available
+    assert team_client.get('/downloads/games/a/1').status_code == 404
+    assert team_client.get('/downloads/games/b').status_code == 404
+
+def test_tournament_segment_ranges(team_client, archive):
+    data = archive.backend.get(archive.index['segments'][0])
+    assert team_client.get('/downloads/tournament').get_json() == {'games': 3, 'segments': [0]}
+
+    response = team_client.get('/downloads/tournament/0')
+    assert response.data == data and response.headers['Accept-Ranges'] == 'bytes'
+    response = team_client.get('/downloads/tournament/0', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206 and response.data == data[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(data)}'
+    response = team_client.get('/downloads/tournament/0', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.data) == data
+    assert team_client.get('/downloads/tournament/1').status_code == 404
+
+def test_signed_url_redirect(app, team_client, archive, monkeypatch):
+    app.config['DOWNLOAD_SIGNED_URLS'] = True
+    # The memory backend has no signed URLs, so the object is streamed
+    assert team_client.get('/downloads/tournament/0').status_code == 200
+    monkeypatch.setattr(type(archive.backend), 'signed_url', lambda self, path, expires_in: f'https://signed/{path}',
+                        raising=False)
+    response = team_client.get('/downloads/tournament/0')
+    assert response.status_code == 302 and response.location == f"https://signed/{archive.index['segments'][0]}"
@@ -0,0 +1,153 @@
+import io
+import os
+import subprocess
+import time
+import zipfile
+from unittest.mock import patch
+import numpy
+import pytest
+from app import create_app, environments, validator
+from app.environments import (EnvironmentStore, EnvironmentBuildError, RequirementsError, parse_requirements,
+                              requirements_hash)
+from app.validator import validate_submission
+
+def make_wheel(directory, name, version='1.0', size=0):
+    """A pure-Python wheel with module <name> defining VALUE and a padding of size bytes"""
+    dist_info = f'{name}-{version}.dist-info'
+    files = {
+        f'{name}.py': f'VALUE = {version!r}\nPADDING = {"x" * size!r}\n',
+        f'{dist_info}/METADATA': f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n',
+        f'{dist_info}/WHEEL': 'Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n',
+    }
+    files[f'{dist_info}/RECORD'] = ''.join(f'{path},,\n' for path in [*files, f'{dist_info}/RECORD'])
+    with zipfile.ZipFile(os.path.join(directory, f'{name}-{version}-py3-none-any.whl'), 'w') as wheel:
+        for path, content in files.items():
+            wheel.writestr(path, content)
+
+@pytest.fixture
+def wheelhouse(tmp_path):
+    path = tmp_path / 'wheelhouse'
+    path.mkdir()
+    for name in ('tinyagentlib', 'otheragentlib'):
+        make_wheel(str(path), name, size=20000)
+    return str(path)
+
+@pytest.fixture
+def store(tmp_path, wheelhouse):
+    return EnvironmentStore(str(tmp_path / 'envs'), wheelhouse, max_bytes=10 ** 9)
+
+def test_requirements_are_normalized():
+    text = ('# comment\nTiny_AgentLib >= 1.0  # pinned\n\ntiny-agentlib>=1.0\nnumpy\n'
+            'otheragentlib; python_version < "3"\n')
+    assert parse_requirements(text) == ['tiny-agentlib>=1.0']
+    assert requirements_hash(parse_requirements(text)) == requirements_hash(['tiny-agentlib>=1.0'])
+    assert parse_requirements('') == [] and parse_requirements(f'numpy=={numpy.__version__}') == []
+
+@pytest.mark.parametrize('text, message', [
+    ('numpy<1.0', 'conflicts with numpy'),
+    ('-r other.txt', 'Unsupported option'),
+    ('pkg @ https://example.com/pkg.whl', 'must not be a URL'),
+    ('not a requirement!', 'Invalid requirement'),
+])
+def test_invalid_requirements(text, message):
+    with pytest.raises(RequirementsError, match=message):
+        parse_requirements(text)
+
+def test_environment_is_built_once(store):
+    with patch('app.environments.run_pip', wraps=environments.run_pip) as run:
+        with store.use('tinyagentlib') as path:
+            assert os.path.exists(os.path.join(path, 'tinyagentlib.py'))
+        with store.use('TinyAgentLib\n# same requirements\n') as same_path:
+            assert same_path == path
+    assert run.call_count == 1
+    with store.use('numpy') as path:
+        assert path is None
+
+def test_missing_package(store):
+    with pytest.raises(EnvironmentBuildError, match='satisfies the requirement missingagentlib'):
+        with store.use('missingagentlib'):
+            pass
+    assert store.environments() == []
+
+def test_least_recently_used_environment_is_evicted(store):
+    with store.use('tinyagentlib'):
+        pass
+    store.max_bytes = store.environments()[0][1] * 3 // 2
+    with store.use('tinyagentlib') as first:
+        # In use, so it is kept even though the store is over budget
+        with store.use('otheragentlib') as second:
+            pass
+    assert len(store.environments()) == 2
+    assert store.evict() == [os.path.basename(first)]
+    assert [key for _, _, key in store.environments()] == [os.path.basename(second)]
+    assert not os.path.exists(first)
+
+def agent_zip(requirements):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        z.writestr('requirements.txt', requirements)
+        z.writestr('agent/__init__.py', 'import tinyagentlib\n'
+                                        'def generate_move(board, player, timeout):\n'
+                                        '    return int(tinyagentlib.VALUE[0])\n')
+    return buffer.getvalue()
+
+def test_validation_installs_requirements(tmp_path, wheelhouse):
+    app = create_app()
+    app.config.update(VALIDATION_ISOLATED=False, VALIDATION_CACHE_PATH='', ENV_WHEELHOUSE=wheelhouse,
+                      ENV_CACHE_DIR=str(tmp_path / 'envs'))
+    with app.app_context():
+        # Without the requirement the agent can't import its library
+        result = validate_submission(agent_zip(''))
+        assert result['message'].startswith('Failed to import agent package')
+        assert validate_submission(agent_zip('tinyagentlib==1.0\n'))['valid']
+        result = validate_submission(agent_zip('tinyagentlib==2.0\n'))
+        assert not result['valid'] and result['retryable']
+        assert result['message'].startswith('Could not install requirements: ')
+        result = validate_submission(agent_zip('numpy<1\n'))
+        assert not result['valid'] and result['message'].startswith('Invalid requirements.txt: ')
+
+def test_requirements_are_installed_before_the_validation_deadline(tmp_path, wheelhouse, monkeypatch):
+    app = create_app()
+    app.config.update(VALIDATION_CACHE_PATH='', ENV_WHEELHOUSE=wheelhouse, ENV_CACHE_DIR=str(tmp_path / 'envs'))
+    # The sandbox gets 3 seconds, the build takes longer
+    monkeypatch.setattr(validator, 'VALIDATION_TIMEOUT', 2.)
+    monkeypatch.setattr(validator, 'SANDBOX_GRACE', 1.)
+    run_pip = environments.run_pip
+    def slow_pip(arguments):
+        time.sleep(3.5)
+        return run_pip(arguments)
+    with app.app_context(), patch('app.environments.run_pip', side_effect=slow_pip) as pip:
+        assert validate_submission(agent_zip('tinyagentlib==1.0\n'))['valid']
+    pip.assert_called_once()
+
+def is_running(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # A killed process may stay a zombie in containers without an init that reaps it
+            return f.read().rsplit(') ', 1)[1][0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+def test_pip_process_group_is_killed(tmp_path, monkeypatch):
+    script = tmp_path / 'python'
+    script.write_text(f'#!/bin/sh\nsleep 60 &\necho $! > {tmp_path / "pid"}\nwait\n')
+    script.chmod(0o755)
+    monkeypatch.setattr(environments.sys, 'executable', str(script))
+    with pytest.raises(subprocess.TimeoutExpired):
+        environments.run_pip(['install'], timeout=0.5)
+    pid = int((tmp_path / 'pid').read_text())
+    deadline = time.monotonic() + 5
+    while is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not is_running(pid)
+
+def test_requirements_are_not_installed_by_default():
+    app = create_app()
+    app.config.update(VALIDATION_ISOLATED=False, VALIDATION_CACHE_PATH='')
+    with app.app_context():
+        assert environments.environment_settings() is None
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            z.writestr('requirements.txt', 'scipy\n')
+            z.writestr('agent/__init__.py', 'def generate_move(board, player, timeout):\n    return 0\n')
+        assert validate_submission(buffer.getvalue())['valid']
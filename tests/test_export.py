@@ -0,0 +1,54 @@
+import hashlib
+import io
+import json
+import zipfile
+import pytest
+from app.export import export_agents
+from app.storage import get_backend
+
+AGENTS = {
+    'submissions/team1/alpha/alpha_v1.zip': b'alpha one',
+    'submissions/team1/alpha/alpha_v2.zip': b'alpha two',
+    'submissions/team2/beta/beta_v1.zip': b'beta',
+    'submissions/team3/gamma/gamma_v4.zip': b'gamma' * 1000,
+}
+
+@pytest.fixture
+def backend(app):
+    with app.app_context():
+        backend = get_backend()
+    for path, data in AGENTS.items():
+        backend.put_bytes(path, data)
+    return backend
+
+def read_export(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+def test_export_streams_latest_versions(backend):
+    chunks = list(export_agents(backend, workers=2))
+    # One chunk per agent plus the manifest and central directory
+    assert len(chunks) == 4
+    files = read_export(b''.join(chunks))
+    manifest = json.loads(files.pop('manifest.json'))
+    assert files == {'team1/alpha_v2.zip': b'alpha two', 'team2/beta_v1.zip': b'beta',
+                     'team3/gamma_v4.zip': b'gamma' * 1000}
+    assert [(agent['id'], agent['version']) for agent in manifest['agents']] == [
+        ('team1/alpha', '2'), ('team2/beta', '1'), ('team3/gamma', '4')]
+    assert manifest['agents'][1]['sha256'] == hashlib.sha256(b'beta').hexdigest()
+
+def test_export_skips_agents_deleted_meanwhile(backend):
+    chunks = export_agents(backend, workers=1)
+    first = next(chunks)
+    backend.delete('submissions/team3/gamma/gamma_v4.zip')
+    files = read_export(first + b''.join(chunks))
+    assert sorted(files) == ['manifest.json', 'team1/alpha_v2.zip', 'team2/beta_v1.zip']
+
+def test_admin_export_endpoint(app, client, backend):
+    assert client.get('/admin/export').status_code == 403
+    app.config['ADMIN_TOKEN'] = 'secret'
+    assert client.get('/admin/export', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/admin/export', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200 and response.is_streamed
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="agents-')
+    assert 'team2/beta_v1.zip' in read_export(response.data)
@@ -0,0 +1,87 @@
+import json
+from unittest.mock import patch
+from app import game_records
+from app.backends import MemoryBackend
+from app.game_records import GameArchive, archive_results, decode_records, encode_record
+from app.tournament import ResultLog
+
+def result(first, second, moves, winner=1, reason='connect4', **extra):
+    return dict({'key': f'{first}@1|{second}@2', 'first': first, 'first_version': '1', 'first_revision': '1',
+                 'second': second, 'second_version': '2', 'second_revision': '2', 'winner': winner, 'reason': reason,
+                 'moves': moves, 'seconds': 0.25, 'finished': 1700000000.5}, **extra)
+
+GAMES = [
+    result('team1/a', 'team2/b', [0, 6, 0, 6, 0, 6, 0]),
+    result('team2/b', 'team3/c', [3, 3], winner=None, reason='draw'),
+    result('team3/c', 'team1/a', [], winner=2, reason='error', error='RuntimeError: oops'),
+]
+
+def test_record_round_trip():
+    data = b''.join(encode_record(game) for game in GAMES)
+    assert decode_records(data) == GAMES
+    # Much smaller than the JSON result lines
+    assert len(data) < len(''.join(json.dumps(game) for game in GAMES)) / 2
+
+def test_records_keep_content_revisions():
+    game = result('team1/a', 'team2/b', [3], key='team1/a@1#0123456789ab|team2/b@2', first_revision='1#0123456789ab')
+    assert decode_records(encode_record(game)) == [game]
+
+def test_records_of_the_first_format_are_read():
+    header = game_records.RECORD_HEADERS[1].pack(game_records.RECORD_MAGIC, 1, 1, 0, 1, 1, 2, 0.25, 1700000000.5, 7, 7, 0)
+    assert decode_records(header + b'team1/ateam2/b' + bytes([3])) == [result('team1/a', 'team2/b', [3])]
+
+def test_long_errors_are_cut_between_characters():
+    game = result('team3/c', 'team1/a', [], winner=2, reason='error', error='x' + 'ü' * 1000)
+    [decoded] = decode_records(encode_record(game))
+    assert decoded['error'] == 'x' + 'ü' * 511
+
+def test_archive_queries_use_single_range_reads():
+    backend = MemoryBackend()
+    archive = GameArchive(backend)
+    assert archive.append(GAMES) == 3 and archive.append(GAMES[:1]) == 0
+
+    archive = GameArchive(backend)
+    with patch.object(backend, 'read_range', wraps=backend.read_range) as read_range:
+        assert archive.game(1) == GAMES[1]
+        assert archive.match('team3/c@1|team1/a@2') == GAMES[2]
+        assert archive.games_of('team1/a') == [GAMES[0], GAMES[2]]
+    assert read_range.call_count == 3
+    assert archive.games_of('team9/x') == []
+
+def test_segments_are_split_by_size():
+    backend = MemoryBackend()
+    games = [result(f'team{i}/a', 'team0/b', [i % 7] * 20) for i in range(1, 11)]
+    with patch.object(game_records, 'SEGMENT_SIZE', 200):
+        GameArchive(backend).append(games)
+    archive = GameArchive(backend)
+    assert len(archive.index['segments']) > 2 and len(archive) == 10
+    assert archive.games_of('team0/b') == games
+
+def test_concurrent_archivers_keep_each_others_games():
+    backend = MemoryBackend()
+    first, second = GameArchive(backend), GameArchive(backend)
+    assert len(first) == len(second) == 0
+    assert first.append(GAMES[:2]) == 2
+    # The second archiver read the index before the first stored it
+    assert second.append(GAMES[1:]) == 1
+    archive = GameArchive(backend)
+    assert len(archive) == 3 and len(archive.index['segments']) == 2
+    assert sorted(archive.game(n)['key'] for n in range(3)) == sorted(game['key'] for game in GAMES)
+    assert archive.match(GAMES[2]['key']) == GAMES[2]
+
+def test_archive_results_from_log(tmp_path):
+    backend = MemoryBackend()
+    log = ResultLog(str(tmp_path / 'results.jsonl'))
+    log.append(GAMES[0])
+    assert archive_results(backend, str(tmp_path)) == 1
+    assert archive_results(backend, str(tmp_path)) == 0
+    log.append(GAMES[1])
+    with open(log.path, 'a') as f:
+        f.write('{"key": "partial')
+    assert archive_results(backend, str(tmp_path)) == 1
+
+    # A compacted log is read again without archiving games twice
+    log.compact(lambda r: True)
+    log.append(GAMES[2])
+    assert archive_results(backend, str(tmp_path)) == 1
+    assert [GameArchive(backend).game(n) for n in range(3)] == GAMES
@@ -0,0 +1,64 @@
+import hashlib
+import io
+import os
+import zipfile
+import pytest
+from flask import request
+from app import create_app
+from app.ingest import SpoolFile, spool_upload, file_sha256
+from app.validator import _open_zip_source
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['UPLOAD_SPOOL_DIR'] = str(tmp_path / 'spool')
+    return app
+
+@pytest.fixture
+def zip_bytes():
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+        zip_file.writestr('agent/__init__.py', 'def generate_move(board, player, timeout): return 0')
+        zip_file.writestr('requirements.txt', '')
+    return zip_buffer.getvalue()
+
+def test_spool_file_hashes_while_writing(tmp_path):
+    spool = SpoolFile(str(tmp_path))
+    spool.write(b'hello ')
+    spool.write(b'world')
+    spool.flush()
+    assert spool.size == 11
+    assert spool.sha256 == hashlib.sha256(b'hello world').hexdigest()
+    assert file_sha256(spool.path) == spool.sha256
+    spool.close()
+    assert not os.path.exists(spool.path)
+
+def test_detached_spool_file_is_kept(tmp_path):
+    with SpoolFile(str(tmp_path)) as spool:
+        spool.write(b'data')
+        path = spool.detach()
+    with open(path, 'rb') as f:
+        assert f.read() == b'data'
+
+def test_upload_is_spooled_during_parsing(app, zip_bytes):
+    with app.test_request_context('/upload', method='POST', data={
+        'submission': (io.BytesIO(zip_bytes), 'submission.zip')
+    }, content_type='multipart/form-data'):
+        file = request.files['submission']
+        assert isinstance(file.stream, SpoolFile)
+        spool = spool_upload(file)
+        assert os.path.dirname(spool.path) == app.config['UPLOAD_SPOOL_DIR']
+        assert spool.sha256 == hashlib.sha256(zip_bytes).hexdigest()
+        assert spool.size == len(zip_bytes)
+        assert file.read() == zip_bytes
+        spool_path = spool.path
+    assert not os.path.exists(spool_path)
+
+def test_spooled_file_is_memory_mapped_for_validation(tmp_path, zip_bytes):
+    path = tmp_path / 'submission.zip'
+    path.write_bytes(zip_bytes)
+    with _open_zip_source(str(path)) as view, zipfile.ZipFile(view) as z:
+        assert 'agent/__init__.py' in z.namelist()
+    with _open_zip_source(zip_bytes) as view, zipfile.ZipFile(view) as z:
+        assert 'requirements.txt' in z.namelist()
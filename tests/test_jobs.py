@@ -0,0 +1,132 @@
+import io
+import threading
+import time
+import zipfile
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.config import Config
+from app.jobs import JobQueue, JobWorker, process_job, handler, get_job_queue, lane_kinds
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'))
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-secret-key'
+    app.config['UPLOAD_ASYNC'] = True
+    app.config['JOB_DB_PATH'] = str(tmp_path / 'jobs.sqlite3')
+    app.config['UPLOAD_SPOOL_DIR'] = str(tmp_path / 'spool')
+    return app
+
+@pytest.fixture
+def authenticated_client(app):
+    client = app.test_client()
+    client.post('/login', data={
+        'group_name': 'team2',
+        'password': Config.ALLOWED_GROUPS['team2']['password']
+    })
+    return client
+
+@pytest.fixture
+def sample_zip():
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+        zip_file.writestr('agent/__init__.py', 'def generate_move(board, player, timeout): return 0')
+        zip_file.writestr('requirements.txt', '')
+    zip_buffer.seek(0)
+    return zip_buffer
+
+@handler('test-echo')
+def echo_job(job, set_progress):
+    set_progress('echoing')
+    if job['payload'].get('fail'):
+        raise ValueError('boom')
+    return 'done', job['payload']['text']
+
+def test_enqueue_and_get(queue):
+    job_id = queue.enqueue('test-echo', {'text': 'hi'}, owner='team1')
+    job = queue.get(job_id)
+    assert job['status'] == 'queued'
+    assert job['payload'] == {'text': 'hi'}
+    assert queue.depth() == 1
+
+@handler('test-long', lane='test-long')
+def long_job(job, set_progress):
+    time.sleep(job['payload']['seconds'])
+    return 'done', 'slept'
+
+def test_claim_is_exclusive(queue):
+    job_id = queue.enqueue('test-echo', {'text': 'hi'}, owner='team1')
+    assert queue.claim()['id'] == job_id
+    assert queue.claim() is None
+    assert queue.get(job_id)['status'] == 'running'
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=-1)
+    job_id = queue.enqueue('test-echo', {'text': 'hi'}, owner='team1')
+    assert queue.claim()['id'] == job_id
+    assert queue.claim()['id'] == job_id
+
+def test_process_job_records_outcome(app, queue):
+    ok_id = queue.enqueue('test-echo', {'text': 'hello'}, owner='team1')
+    failing_id = queue.enqueue('test-echo', {'fail': True}, owner='team1')
+    with app.app_context():
+        process_job(queue, queue.claim())
+        process_job(queue, queue.claim())
+    assert queue.get(ok_id)['status'] == 'done'
+    assert queue.get(ok_id)['message'] == 'hello'
+    assert queue.get(failing_id)['status'] == 'failed'
+    assert 'boom' in queue.get(failing_id)['message']
+
+def test_running_jobs_keep_their_lease(app, tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=0.3)
+    job_id = queue.enqueue('test-long', {'seconds': 1.}, owner='team1')
+    with app.app_context():
+        worker = threading.Thread(target=process_job, args=(queue, queue.claim()))
+        worker.start()
+        time.sleep(0.6)
+        # Longer than the lease, but the job is still being processed
+        assert queue.claim() is None
+        worker.join()
+    assert queue.get(job_id)['status'] == 'done'
+
+def test_lanes_are_claimed_separately(app):
+    queue = JobQueue(app.config['JOB_DB_PATH'])
+    long_id = queue.enqueue('test-long', {'seconds': 0.}, owner='team1')
+    echo_id = queue.enqueue('test-echo', {'text': 'hi'}, owner='team1')
+    assert lane_kinds('test-long') == ['test-long']
+    # The default worker skips the long job queued before the upload
+    assert JobWorker(app, queue).run_pending()
+    assert queue.get(echo_id)['status'] == 'done' and queue.get(long_id)['status'] == 'queued'
+    assert JobWorker(app, queue, lane='test-long').run_pending()
+    assert queue.get(long_id)['status'] == 'done'
+
+def test_async_upload_returns_job(app, authenticated_client, sample_zip):
+    with patch('app.routes.upload.get_clients', return_value=(None, app.logger)), \
+         patch('app.routes.upload.get_team_agents', return_value=[]), \
+         patch('app.routes.upload.jobs.ensure_worker'):
+        response = authenticated_client.post('/upload', data={
+            'submission': (sample_zip, 'submission.zip'),
+            'agent_name': 'test-agent'
+        }, content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    status = authenticated_client.get(response.get_json()['status_url'])
+    assert status.status_code == 200
+    assert status.get_json()['status'] == 'queued'
+    assert status.get_json()['agent_name'] == 'test-agent'
+
+    with app.app_context():
+        job = get_job_queue().get(job_id)
+    assert job['owner'] == 'team2'
+
+def test_status_of_other_team_is_hidden(app, authenticated_client):
+    with app.app_context():
+        job_id = get_job_queue().enqueue('upload', {'agent_name': 'secret'}, owner='team1')
+    response = authenticated_client.get(f'/upload/status/{job_id}')
+    assert response.status_code == 404
@@ -0,0 +1,105 @@
+import json
+import pytest
+from app import create_app, leaderboard
+from app.leaderboard import SNAPSHOT_PATH, apply_result, empty_snapshot, standings, update_leaderboard
+from app.storage import get_backend
+from app.tournament import ResultLog
+
+def result(first, second, winner, first_version='1', second_version='1', first_revision=None):
+    first_revision = first_revision or first_version
+    return {'key': f'{first}@{first_revision}|{second}@{second_version}', 'first': first, 'second': second,
+            'first_version': first_version, 'second_version': second_version, 'first_revision': first_revision,
+            'second_revision': second_version, 'winner': winner}
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['STORAGE_BACKEND'] = 'memory'
+    yield app
+    leaderboard._snapshot_cache.clear()
+
+@pytest.fixture
+def backend(app):
+    with app.app_context():
+        backend = get_backend()
+    for path in ('submissions/team1/a/a_v1.zip', 'submissions/team2/b/b_v1.zip', 'submissions/team3/c/c_v1.zip'):
+        backend.put_bytes(path, b'')
+    return backend
+
+def test_elo_updates():
+    snapshot = empty_snapshot()
+    apply_result(snapshot, result('team1/a', 'team2/b', 1))
+    a, b = snapshot['agents']['team1/a'], snapshot['agents']['team2/b']
+    assert a['rating'] == 1516 and b['rating'] == 1484
+    apply_result(snapshot, result('team2/b', 'team1/a', None))
+    assert a['rating'] + b['rating'] == 3000 and a['draws'] == b['draws'] == 1
+    assert (a['wins'], a['losses'], b['wins'], b['losses']) == (1, 0, 0, 1)
+
+def test_new_version_resets_counts_and_old_results_are_ignored():
+    snapshot = empty_snapshot()
+    apply_result(snapshot, result('team1/a', 'team2/b', 1))
+    apply_result(snapshot, result('team1/a', 'team2/b', 2, first_version='2'))
+    a = snapshot['agents']['team1/a']
+    assert a['version'] == '2' and (a['games'], a['losses']) == (1, 1)
+    assert not apply_result(snapshot, result('team1/a', 'team2/b', 1))
+    assert snapshot['games'] == 2
+
+def test_reused_version_number_is_a_new_revision():
+    snapshot = empty_snapshot()
+    apply_result(snapshot, result('team1/a', 'team2/b', 1, first_version='2', first_revision='2#aaaaaaaaaaaa'))
+    # Version 2 was deleted and uploaded again, as was version 1 before it
+    assert apply_result(snapshot, result('team1/a', 'team2/b', 2, first_revision='1#cccccccccccc'))
+    assert apply_result(snapshot, result('team1/a', 'team2/b', 2, first_version='2', first_revision='2#bbbbbbbbbbbb'))
+    a = snapshot['agents']['team1/a']
+    assert a['revision'] == '2#bbbbbbbbbbbb' and (a['games'], a['losses']) == (1, 1)
+    assert not apply_result(snapshot, result('team1/a', 'team2/b', 1, first_version='2', first_revision='2#aaaaaaaaaaaa'))
+
+def test_incremental_update(app, backend, tmp_path):
+    log = ResultLog(str(tmp_path / 'results.jsonl'))
+    log.append(result('team1/a', 'team2/b', 1))
+    snapshot = update_leaderboard(backend, str(tmp_path))
+    assert snapshot['games'] == 1 and set(snapshot['agents']) == {'team1/a', 'team2/b', 'team3/c'}
+
+    log.append(result('team1/a', 'team3/c', 1))
+    with open(log.path, 'a') as f:
+        f.write('{"partial')
+    snapshot = update_leaderboard(backend, str(tmp_path))
+    assert snapshot['games'] == 2 and snapshot['agents']['team1/a']['wins'] == 2
+    assert json.loads(backend.get(SNAPSHOT_PATH)) == snapshot
+    assert [row['id'] for row in standings(snapshot)][0] == 'team1/a'
+
+    # Deleted agents are dropped; compacting the log doesn't apply any game twice
+    backend.delete('submissions/team3/c/c_v1.zip')
+    log.compact(lambda r: r['second'] != 'team3/c')
+    snapshot = update_leaderboard(backend, str(tmp_path))
+    assert snapshot['games'] == 2 and set(snapshot['agents']) == {'team1/a', 'team2/b'}
+    assert snapshot['applied'] == ['team1/a@1|team2/b@1']
+    snapshot = update_leaderboard(backend, str(tmp_path), rebuild=True)
+    assert snapshot['games'] == 1 and snapshot['agents']['team1/a']['wins'] == 1
+
+def test_logs_of_several_hosts(app, backend, tmp_path):
+    first_log = ResultLog(str(tmp_path / 'first' / 'results.jsonl'))
+    first_log.append(result('team1/a', 'team2/b', 1))
+    first_log.append(result('team1/a', 'team3/c', 1))
+    update_leaderboard(backend, str(tmp_path / 'first'))
+    # A shorter log elsewhere adds its games instead of replacing the snapshot
+    ResultLog(str(tmp_path / 'second' / 'results.jsonl')).append(result('team2/b', 'team3/c', 2))
+    snapshot = update_leaderboard(backend, str(tmp_path / 'second'))
+    assert snapshot['games'] == 3
+    assert update_leaderboard(backend, str(tmp_path / 'first'))['games'] == 3
+
+def test_results_page_etag(app, backend, tmp_path):
+    ResultLog(str(tmp_path / 'results.jsonl')).append(result('team1/a', 'team2/b', 2))
+    update_leaderboard(backend, str(tmp_path))
+    client = app.test_client()
+    response = client.get('/results')
+    assert response.status_code == 200
+    assert b'team2' in response.data and b'1516' in response.data
+    etag = response.headers['ETag']
+    cached = client.get('/results', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+
+def test_results_page_without_games(app):
+    response = app.test_client().get('/results')
+    assert response.status_code == 200 and b'No games' in response.data
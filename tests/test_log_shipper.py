@@ -0,0 +1,73 @@
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from app import create_app
+from app.log_shipper import LogShipper, cloud_sink
+from app.storage import log_message
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, entries):
+        self.release.wait()
+        self.batches.append(list(entries))
+
+@pytest.fixture
+def sink():
+    return RecordingSink()
+
+def test_entries_are_shipped_in_batches(sink):
+    sink.release.clear()
+    shipper = LogShipper(sink, batch_size=10, flush_interval=0.05)
+    shipper.submit({'message': 'first'})
+    for i in range(25):
+        shipper.submit({'message': i})
+    sink.release.set()
+    assert shipper.flush()
+    assert sum(len(batch) for batch in sink.batches) == 26
+    assert max(len(batch) for batch in sink.batches) <= 10
+    assert shipper.stats()['shipped'] == 26
+    shipper.close()
+
+def test_overflow_drops_new_entries(sink):
+    sink.release.clear()
+    shipper = LogShipper(sink, max_queue=2, batch_size=1, flush_interval=0.05)
+    results = [shipper.submit({'message': i}) for i in range(10)]
+    assert results.count(False) >= 7
+    assert shipper.stats()['dropped'] == results.count(False)
+    sink.release.set()
+    shipper.close()
+
+def test_close_flushes_queue(sink):
+    shipper = LogShipper(sink, flush_interval=0.05)
+    for i in range(5):
+        shipper.submit({'message': i})
+    shipper.close()
+    assert sum(len(batch) for batch in sink.batches) == 5
+
+def test_sink_failures_are_counted():
+    def failing_sink(entries):
+        raise RuntimeError('logging unavailable')
+    shipper = LogShipper(failing_sink, flush_interval=0.05)
+    shipper.submit({'message': 'lost'})
+    assert shipper.flush()
+    assert shipper.stats()['failed'] == 1
+    shipper.close()
+
+def test_cloud_sink_uses_one_batch():
+    cloud_logger = MagicMock()
+    cloud_sink(cloud_logger)([{'message': 1}, {'message': 2}])
+    batch = cloud_logger.batch.return_value.__enter__.return_value
+    assert batch.log_struct.call_count == 2
+
+def test_log_message_does_not_call_cloud_logging_on_request_path():
+    app = create_app()
+    cloud_logger = MagicMock()
+    shipper = MagicMock()
+    with app.app_context(), patch('app.storage.get_log_shipper', return_value=shipper):
+        log_message(cloud_logger, 'hello', 'INFO', 'upload')
+    cloud_logger.log_struct.assert_not_called()
+    shipper.submit.assert_called_once_with({'message': 'hello', 'severity': 'INFO', 'component': 'upload'})
@@ -10,6 +10,7 @@ def client():
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF for testing
     app.config['SECRET_KEY'] = 'test-secret-key'
+    app.config['STORAGE_BACKEND'] = 'memory'
     
     with app.test_client() as client:
         yield client
@@ -0,0 +1,69 @@
+import pytest
+from app import create_app, metrics, storage
+from app.metrics import MetricsRegistry, server_timing
+from app.storage import get_team_agents
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['STORAGE_BACKEND'] = 'memory'
+    app.config['VALIDATION_CACHE_PATH'] = ''
+    metrics.registry.reset()
+    storage._agent_cache.clear()
+    yield app
+    metrics.registry.reset()
+    storage._agent_cache.clear()
+
+def test_histogram_rendering():
+    registry = MetricsRegistry(buckets=(0.1, 1.))
+    registry.observe('latency', 'Latency', 0.05, stage='a')
+    registry.observe('latency', 'Latency', 0.5, stage='a')
+    registry.observe('latency', 'Latency', 5., stage='a')
+    registry.inc('calls', 'Calls', operation='list')
+    lines = registry.render().splitlines()
+    assert '# TYPE latency histogram' in lines
+    assert 'latency_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'latency_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'latency_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'latency_count{stage="a"} 3' in lines
+    assert 'calls{operation="list"} 1' in lines
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc('calls', 'Calls', agent='a"b')
+    assert 'calls{agent="a\\"b"} 1' in registry.render()
+
+def test_server_timing_sums_repeated_stages():
+    header = server_timing([('storage.list', 0.002), ('validate', 0.1), ('storage.list', 0.003)], 0.2)
+    assert header == 'storage.list;dur=5.0, validate;dur=100.0, total;dur=200.0'
+
+def test_stages_are_reported_in_server_timing(app):
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session['group_name'] = 'team1'
+        response = client.get('/upload')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('storage.list;dur=')
+    assert 'agents;dur=' in timing and 'total;dur=' in timing
+
+def test_server_timing_can_be_disabled(app):
+    app.config['SERVER_TIMING'] = False
+    assert 'Server-Timing' not in app.test_client().get('/login').headers
+
+def test_metrics_endpoint(app):
+    with app.test_request_context():
+        get_team_agents('team1')
+    app.test_client().get('/login')
+    app.config['METRICS_TOKEN'] = 'secret'
+    body = app.test_client().get('/metrics', headers={'Authorization': 'Bearer secret'}).get_data(as_text=True)
+    assert 'c4_storage_calls_total{backend="memory",operation="list"} 1' in body
+    assert 'c4_stage_seconds_count{stage="storage.list"} 1' in body
+    assert 'c4_request_seconds_count{endpoint="auth.login",method="GET",status="200"} 1' in body
+
+def test_metrics_token(app):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
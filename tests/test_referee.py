@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from app.referee import Board, legal_moves, validate_agent_function, validation_positions
+
+@pytest.mark.parametrize('moves', [
+    [0, 6, 1, 6, 2, 6, 3],            # horizontal
+    [0, 1, 0, 1, 0, 1, 0],            # vertical
+    [0, 1, 1, 2, 2, 3, 2, 3, 3, 6, 3],  # rising diagonal
+    [6, 5, 5, 4, 4, 3, 4, 3, 3, 0, 3]   # falling diagonal
+])
+def test_wins_are_detected(moves):
+    board = Board.from_moves(moves[:-1])
+    assert board.winner is None
+    assert board.play(moves[-1])
+    assert board.winner == 1 and board.is_over()
+
+def test_no_win_across_column_boundary():
+    # Three stones at the top of column 0 and one at the bottom of column 1 are not in a line
+    board = Board.from_moves([0, 0, 0, 1, 0, 1, 0, 0, 1, 6, 2, 6, 1, 6])
+    assert board.winner is None
+
+def test_full_column_and_board():
+    board = Board.from_moves([0] * 6)
+    assert not board.can_play(0) and board.legal_moves() == [1, 2, 3, 4, 5, 6]
+    with pytest.raises(ValueError):
+        board.play(0)
+    # A drawn game
+    board = Board.from_moves(map(int, '436014551150160155104632660465204242223333'))
+    assert board.is_full() and board.winner is None
+
+def test_board_array():
+    board = Board.from_moves([3, 3, 0])
+    array = board.to_array()
+    assert array.shape == (6, 7) and array.dtype == np.int8
+    assert array[0, 3] == 1 and array[1, 3] == 2 and array[0, 0] == 1
+    assert array.sum() == 4
+    assert board.current_player == 2
+
+def test_batched_legality():
+    boards = [Board(), Board.from_moves([2] * 6), Board()]
+    occupied = [board.occupied for board in boards]
+    assert legal_moves(occupied, [0, 2, 7]).tolist() == [True, False, False]
+    assert legal_moves(occupied, [-1, 3, 6]).tolist() == [False, True, True]
+
+def test_validation_positions_are_playable():
+    positions = validation_positions()
+    assert len(positions) == 16 and positions[0].moves == 0
+    assert {board.current_player for board in positions} == {1, 2}
+    assert all(len(board.legal_moves()) == 7 and board.winner is None for board in positions)
+
+def first_free_column(board, player, timeout):
+    return int(np.argmax(board[-1] == 0))
+
+def test_valid_agent():
+    assert validate_agent_function(first_free_column, 1.) == (True, None)
+
+@pytest.mark.parametrize('move', [7, -1, 2 ** 80, 1.0, '3', None, True])
+def test_invalid_moves(move):
+    assert validate_agent_function(lambda board, player, timeout: move, 1.) == (False, None)
+
+def test_agent_errors_are_returned():
+    valid, error = validate_agent_function(lambda board: 0, 1.)
+    assert not valid
+    assert 'takes 1 positional argument but 3 were given' in str(error)
+
+def test_slow_moves():
+    import time
+    valid, error = validate_agent_function(lambda board, player, timeout: time.sleep(0.02) or 0, 0.01,
+                                           positions=validation_positions(count=2))
+    assert not valid and isinstance(error, TimeoutError)
+
+def spin(board, player, timeout):
+    while True:
+        pass
+
+def test_endless_moves_are_interrupted():
+    valid, error = validate_agent_function(spin, 0.05)
+    assert not valid and isinstance(error, TimeoutError)
+
+def test_endless_moves_are_interrupted_outside_the_main_thread():
+    import threading
+    results = []
+    thread = threading.Thread(target=lambda: results.append(validate_agent_function(spin, 0.05)))
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    valid, error = results[0]
+    assert not valid and isinstance(error, TimeoutError)
+
+def test_all_positions_share_one_time_budget():
+    import time
+    valid, error = validate_agent_function(lambda board, player, timeout: time.sleep(0.02) or 0, 1.,
+                                           total_timeout=0.1)
+    assert not valid and 'of 16 positions' in str(error)
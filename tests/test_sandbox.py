@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+import pytest
+from app.sandbox import SandboxPool, SandboxError, SandboxTimeout, PoolFullError
+
+
+def square(x):
+    return x * x
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return seconds
+
+def fail():
+    raise ValueError('broken agent')
+
+def hard_exit():
+    os._exit(3)
+
+def imported_modules():
+    import sys
+    return 'agent' in sys.modules
+
+@pytest.fixture
+def pool():
+    return SandboxPool(max_workers=2, queue_depth=0)
+
+def test_returns_result(pool):
+    assert pool.run(square, (7,), timeout=30) == 49
+
+def test_exception_is_reported(pool):
+    with pytest.raises(SandboxError) as excinfo:
+        pool.run(fail, timeout=30)
+    assert 'ValueError: broken agent' in str(excinfo.value)
+
+def test_crashed_process_is_reported(pool):
+    with pytest.raises(SandboxError) as excinfo:
+        pool.run(hard_exit, timeout=30)
+    assert 'exit code 3' in str(excinfo.value)
+
+def test_timeout_kills_process(pool):
+    start = time.monotonic()
+    with pytest.raises(SandboxTimeout):
+        pool.run(sleep_for, (60,), timeout=3)
+    assert time.monotonic() - start < 30
+    assert pool.pending == 0
+
+def test_fresh_module_namespace(pool):
+    import sys
+    import types
+    sys.modules['agent'] = types.ModuleType('agent')
+    try:
+        assert pool.run(imported_modules, timeout=30) is False
+    finally:
+        del sys.modules['agent']
+
+def test_queue_depth_is_enforced():
+    pool = SandboxPool(max_workers=1, queue_depth=0)
+    worker = threading.Thread(target=pool.run, args=(sleep_for, (5,)), kwargs={'timeout': 30})
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while pool.pending == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with pytest.raises(PoolFullError):
+            pool.run(square, (2,), timeout=30)
+    finally:
+        worker.join()
+
+def preloaded():
+    import sys
+    return 'numpy' in sys.modules, os.getpid()
+
+def test_forkserver_children_start_preloaded():
+    pool = SandboxPool(max_workers=1, queue_depth=0, start_method='forkserver', preload=['numpy'])
+    first_loaded, first_pid = pool.run(preloaded, timeout=60)
+    second_loaded, second_pid = pool.run(preloaded, timeout=60)
+    assert first_loaded and second_loaded
+    assert first_pid != second_pid != os.getpid()
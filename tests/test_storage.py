@@ -0,0 +1,150 @@
+import io
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app import storage
+from app.storage import get_backend, get_team_agents, invalidate_team_agents, save_agent, delete_agent, rollback_agent
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['STORAGE_BACKEND'] = 'memory'
+    yield app
+    storage._agent_cache.clear()
+
+@pytest.fixture
+def backend(app):
+    """Memory backend holding one agent of team1"""
+    with app.app_context():
+        backend = get_backend()
+    backend.put_bytes('submissions/team1/pizza/pizza_v2.zip', b'v2', metadata={'sha256': 'abc'})
+    return backend
+
+def count_listings(backend):
+    return patch.object(backend, 'list', wraps=backend.list)
+
+def test_agents_are_parsed_from_one_listing(app, backend):
+    with app.test_request_context(), count_listings(backend) as listing:
+        agents = get_team_agents('team1')
+    assert agents == [{
+        'name': 'pizza',
+        'version': '2',
+        'path': 'submissions/team1/pizza/pizza_v2.zip',
+        'sha256': 'abc',
+        'versions': ['2']
+    }]
+    assert listing.call_count == 1
+
+def test_listing_is_memoized_per_request_and_cached(app, backend):
+    with count_listings(backend) as listing:
+        with app.test_request_context():
+            get_team_agents('team1')
+            get_team_agents('team1')
+        with app.test_request_context():
+            get_team_agents('team1')
+    assert listing.call_count == 1
+
+def test_cache_expires(app, backend):
+    app.config['AGENT_LIST_TTL'] = -1
+    with count_listings(backend) as listing:
+        with app.test_request_context():
+            get_team_agents('team1')
+        with app.test_request_context():
+            get_team_agents('team1')
+    assert listing.call_count == 2
+
+def test_invalidation_and_fresh_listing(app, backend):
+    with app.test_request_context(), count_listings(backend) as listing:
+        get_team_agents('team1')
+        invalidate_team_agents('team1')
+        get_team_agents('team1')
+        get_team_agents('team1', use_cache=False)
+    assert listing.call_count == 3
+
+def test_callers_cannot_modify_the_cache(app, backend):
+    with app.test_request_context():
+        get_team_agents('team1')[0]['version'] = '99'
+        assert get_team_agents('team1')[0]['version'] == '2'
+
+def test_listing_errors_are_not_cached(app, backend):
+    with app.test_request_context(), patch.object(backend, 'list', side_effect=RuntimeError('unavailable')):
+        assert get_team_agents('team1') == []
+    with app.test_request_context():
+        assert len(get_team_agents('team1')) == 1
+
+def test_versions_are_grouped_per_agent(app, backend):
+    for version in (9, 10, 8):
+        backend.put_bytes(f'submissions/team1/pizza/pizza_v{version}.zip', b'')
+    backend.put_bytes('submissions/team1/minimax/minimax_v1.zip', b'')
+    with app.test_request_context():
+        agents = {agent['name']: agent for agent in get_team_agents('team1')}
+    assert agents['pizza']['version'] == '10'
+    assert agents['pizza']['path'] == 'submissions/team1/pizza/pizza_v10.zip'
+    assert agents['pizza']['versions'] == ['2', '8', '9', '10']
+    assert agents['minimax']['versions'] == ['1']
+
+def test_new_agent_is_saved(app, backend):
+    with app.test_request_context():
+        path = save_agent(io.BytesIO(b'new'), 'team1', 'minimax', is_update=False, content_hash='def')
+        assert [agent['name'] for agent in get_team_agents('team1')] == ['minimax', 'pizza']
+    assert path == 'submissions/team1/minimax/minimax_v1.zip'
+    assert backend.list(path)[0].metadata == {'sha256': 'def'}
+
+def test_update_uploads_first_then_prunes(app, backend):
+    events = []
+    put, delete_many = backend.put, backend.delete_many
+    with app.test_request_context(), \
+         patch.object(backend, 'put', side_effect=lambda path, *args, **kwargs: (events.append(('put', path)), put(path, *args, **kwargs))), \
+         patch.object(backend, 'delete_many', side_effect=lambda paths: (events.append(('delete', paths)), delete_many(paths))):
+        save_agent(io.BytesIO(b'v3'), 'team1', 'pizza', is_update=True)
+        path = save_agent(io.BytesIO(b'v4'), 'team1', 'pizza', is_update=True)
+    assert path == 'submissions/team1/pizza/pizza_v4.zip'
+    # Two versions are kept, so the first update prunes nothing
+    assert events == [('put', 'submissions/team1/pizza/pizza_v3.zip'),
+                      ('put', 'submissions/team1/pizza/pizza_v4.zip'),
+                      ('delete', ['submissions/team1/pizza/pizza_v2.zip'])]
+
+def test_identical_update_is_not_uploaded(app, backend):
+    with app.test_request_context():
+        path = save_agent(io.BytesIO(b'v2'), 'team1', 'pizza', is_update=True, content_hash='abc')
+    assert path == 'submissions/team1/pizza/pizza_v2.zip'
+    assert len(backend.list('submissions/team1/')) == 1
+
+def test_rollback_deletes_newest_version(app, backend):
+    backend.put_bytes('submissions/team1/pizza/pizza_v1.zip', b'v1')
+    with app.test_request_context():
+        assert rollback_agent('team1', 'pizza') == 'submissions/team1/pizza/pizza_v1.zip'
+        assert get_team_agents('team1')[0]['version'] == '1'
+        assert rollback_agent('team1', 'pizza') is None
+
+def test_delete_agent(app, backend):
+    with app.test_request_context():
+        assert delete_agent('team1', 'pizza')
+        assert get_team_agents('team1') == []
+        assert not delete_agent('team1', 'pizza')
+
+@pytest.fixture
+def fresh_clients():
+    storage._clients = None
+    yield
+    storage._clients = None
+
+def test_clients_are_created_once_per_process(app, fresh_clients):
+    app.config['STORAGE_BACKEND'] = 'gcs'
+    with patch('app.storage._create_clients', return_value=('storage', 'logger')) as create_clients:
+        with app.test_request_context():
+            assert storage.get_clients() == ('storage', 'logger')
+        with app.test_request_context():
+            storage.get_clients()
+        assert create_clients.call_count == 1
+        # A forked worker builds its own clients
+        with patch('app.storage.os.getpid', return_value=-1), app.test_request_context():
+            storage.get_clients()
+        assert create_clients.call_count == 2
+
+def test_warmup_route_never_fails(app, fresh_clients):
+    app.config['STORAGE_BACKEND'] = 'gcs'
+    with patch('app.storage._create_clients', side_effect=RuntimeError('no credentials')):
+        response = app.test_client().get('/_ah/warmup')
+    assert response.status_code == 200
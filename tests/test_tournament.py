@@ -0,0 +1,191 @@
+import hashlib
+import io
+import zipfile
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.backends import MemoryBackend
+from app.environments import EnvironmentStore
+from app.tournament import (LoadedAgent, ResultLog, latest_agents, play_game, run_tournament, schedule,
+                            current_results, compact_results, schedule_update)
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as z:
+        z.writestr('requirements.txt', '')
+        for name, content in files.items():
+            z.writestr(name, content)
+    return buffer.getvalue()
+
+# Plays the leftmost column that is still open; its helper module is imported lazily per move
+LEFT = make_zip({
+    'agent/__init__.py': 'def generate_move(board, player, timeout):\n'
+                         '    from .strategy import pick\n'
+                         '    return pick(board)\n',
+    'agent/strategy.py': 'def pick(board):\n'
+                         '    return [c for c in range(7) if board[5][c] == 0][0]\n'
+})
+# Plays the rightmost column that is still open, with a helper module of the same name
+RIGHT = make_zip({
+    'agent/__init__.py': 'from .strategy import pick\n'
+                         'def generate_move(board, player, timeout):\n'
+                         '    return pick(board)\n',
+    'agent/strategy.py': 'def pick(board):\n'
+                         '    return [c for c in range(7) if board[5][c] == 0][-1]\n'
+})
+SLOW = make_zip({'agent/__init__.py': 'import time\ndef generate_move(board, player, timeout):\n'
+                                      '    while True:\n        time.sleep(0.01)\n'})
+CRASHING = make_zip({'agent/__init__.py': 'def generate_move(board, player, timeout):\n    raise RuntimeError("oops")\n'})
+EXITING = make_zip({'agent/__init__.py': 'import os\ndef generate_move(board, player, timeout):\n    os._exit(1)\n'})
+# Swallows the move timeout raised inside it
+STUBBORN = make_zip({'agent/__init__.py': 'import time\ndef generate_move(board, player, timeout):\n'
+                                          '    while True:\n        try:\n            time.sleep(0.01)\n'
+                                          '        except:\n            pass\n'})
+# Replaces a builtin the other agent relies on
+TAMPERING = make_zip({'agent/__init__.py': 'import builtins\nbuiltins.range = lambda *args: iter([3])\n'
+                                           'def generate_move(board, player, timeout):\n    return 6\n'})
+BROKEN = make_zip({'agent/__init__.py': 'def generate_move(board, player, timeout)\n'})
+
+@pytest.fixture
+def agent_zip(tmp_path):
+    def write(data, name='agent.zip'):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+def test_latest_agents_and_schedule():
+    backend = MemoryBackend()
+    for path in ('submissions/team1/left/left_v1.zip', 'submissions/team1/left/left_v2.zip',
+                 'submissions/team2/right/right_v1.zip'):
+        backend.put_bytes(path, b'')
+    agents = latest_agents(backend)
+    assert [(agent['id'], agent['version']) for agent in agents] == [('team1/left', '2'), ('team2/right', '1')]
+    assert [(first['id'], second['id']) for first, second in schedule(agents)] == [
+        ('team1/left', 'team2/right'), ('team2/right', 'team1/left')]
+
+def test_agents_keep_their_own_modules(agent_zip):
+    left = LoadedAgent(agent_zip(LEFT, 'left.zip'))
+    right = LoadedAgent(agent_zip(RIGHT, 'right.zip'))
+    result = play_game(left, right)
+    # Left stacks on column 0, right on column 6; left completes its line first
+    assert result['moves'] == [0, 6, 0, 6, 0, 6, 0]
+    assert result['winner'] == 1 and result['reason'] == 'connect4'
+
+@pytest.mark.parametrize('data, reason', [(SLOW, 'timeout'), (CRASHING, 'error')])
+def test_failing_agent_forfeits(agent_zip, data, reason):
+    left = LoadedAgent(agent_zip(LEFT, 'left.zip'))
+    failing = LoadedAgent(agent_zip(data, 'failing.zip'))
+    result = play_game(left, failing, move_timeout=0.05)
+    assert result['winner'] == 1 and result['reason'] == reason
+    assert result['moves'] == [0]
+
+def test_result_log_ignores_partial_lines(tmp_path):
+    log = ResultLog(str(tmp_path / 'results.jsonl'))
+    log.append({'key': 'a', 'winner': 1})
+    with open(log.path, 'a') as f:
+        f.write('{"key": "b", "win')
+    assert log.load() == {'a': {'key': 'a', 'winner': 1}}
+
+def test_tournament_is_resumable(tmp_path):
+    backend = MemoryBackend()
+    backend.put_bytes('submissions/team1/left/left_v1.zip', LEFT)
+    backend.put_bytes('submissions/team2/right/right_v3.zip', RIGHT)
+    backend.put_bytes('submissions/team3/broken/broken_v1.zip', BROKEN)
+    summary = run_tournament(backend, str(tmp_path), workers=2)
+    assert summary['agents'] == 3 and summary['games'] == 6 and summary['played'] == 6
+
+    results = ResultLog(str(tmp_path / 'results.jsonl')).load()
+    broken_first = results['team3/broken@1|team1/left@1']
+    assert broken_first['winner'] == 2 and broken_first['reason'] == 'load_error'
+    assert results['team1/left@1|team2/right@3']['first_version'] == '1'
+
+    assert run_tournament(backend, str(tmp_path), workers=2)['played'] == 0
+
+def test_update_replays_only_the_new_version(tmp_path):
+    backend = MemoryBackend()
+    backend.put_bytes('submissions/team1/left/left_v1.zip', LEFT)
+    backend.put_bytes('submissions/team2/right/right_v1.zip', RIGHT)
+    backend.put_bytes('submissions/team3/other/other_v1.zip', RIGHT)
+    run_tournament(backend, str(tmp_path), workers=2)
+
+    backend.put_bytes('submissions/team1/left/left_v2.zip', RIGHT)
+    summary = run_tournament(backend, str(tmp_path), workers=2, agent_ids={'team1/left'})
+    assert summary['played'] == 4 and summary['games'] == 6
+
+    results = ResultLog(str(tmp_path / 'results.jsonl'))
+    current = current_results(results.load(), latest_agents(backend))
+    assert len(current) == 6
+    assert all(result['first_version'] == '2' for result in current if result['first'] == 'team1/left')
+
+    # Results of left v1 are kept while v1 is stored, so a rollback needs no games
+    assert compact_results(backend, str(tmp_path)) == 0
+    backend.delete('submissions/team1/left/left_v1.zip')
+    assert compact_results(backend, str(tmp_path)) == 4
+    assert len(results.load()) == 6
+
+def test_reuploaded_version_plays_again(tmp_path):
+    def store(path, data):
+        backend.put_bytes(path, data, metadata={'sha256': hashlib.sha256(data).hexdigest()})
+    backend = MemoryBackend()
+    store('submissions/team1/left/left_v1.zip', LEFT)
+    store('submissions/team2/right/right_v1.zip', RIGHT)
+    run_tournament(backend, str(tmp_path), workers=2)
+
+    # Deleting the only version and uploading again reuses the version number
+    backend.delete('submissions/team1/left/left_v1.zip')
+    store('submissions/team1/left/left_v1.zip', RIGHT)
+    assert run_tournament(backend, str(tmp_path), workers=2, agent_ids={'team1/left'})['played'] == 2
+    results = ResultLog(str(tmp_path / 'results.jsonl'))
+    current = current_results(results.load(), latest_agents(backend))
+    # Both agents now play the rightmost column
+    assert [result['moves'][:2] for result in current] == [[6, 6], [6, 6]]
+    assert compact_results(backend, str(tmp_path)) == 2
+    assert len(results.load()) == 2
+
+def test_upload_schedules_tournament_update(tmp_path):
+    app = create_app()
+    app.config['STORAGE_BACKEND'] = 'memory'
+    with app.test_request_context(), patch('app.tournament.jobs.submit', return_value='job') as submit:
+        assert schedule_update('team1', 'left') is None
+        app.config['TOURNAMENT_AUTO_UPDATE'] = True
+        assert schedule_update('team1', 'left') == 'job'
+    submit.assert_called_once_with('tournament', {'agent': 'team1/left'}, owner='team1')
+
+def test_agent_without_installable_requirements_forfeits(tmp_path):
+    backend = MemoryBackend()
+    backend.put_bytes('submissions/team1/left/left_v1.zip', LEFT)
+    unavailable = io.BytesIO()
+    with zipfile.ZipFile(unavailable, 'w') as z:
+        z.writestr('requirements.txt', 'missingagentlib\n')
+        z.writestr('agent/__init__.py', 'def generate_move(board, player, timeout):\n    return 0\n')
+    backend.put_bytes('submissions/team2/needy/needy_v1.zip', unavailable.getvalue())
+    store = EnvironmentStore(str(tmp_path / 'envs'), str(tmp_path), max_bytes=10 ** 9)
+    run_tournament(backend, str(tmp_path / 'work'), workers=1, environments=store)
+    results = ResultLog(str(tmp_path / 'work' / 'results.jsonl')).load()
+    assert {result['reason'] for result in results.values()} == {'load_error'}
+    assert all(result['winner'] == (1 if result['first'] == 'team1/left' else 2) for result in results.values())
+
+def test_crashing_and_hanging_agents_forfeit(tmp_path):
+    backend = MemoryBackend()
+    backend.put_bytes('submissions/team1/left/left_v1.zip', LEFT)
+    backend.put_bytes('submissions/team2/exiting/exiting_v1.zip', EXITING)
+    backend.put_bytes('submissions/team3/stubborn/stubborn_v1.zip', STUBBORN)
+    summary = run_tournament(backend, str(tmp_path), workers=3, move_timeout=0.05)
+    assert summary['played'] == 6
+    results = ResultLog(str(tmp_path / 'results.jsonl')).load()
+    left_exiting = results['team1/left@1|team2/exiting@1']
+    assert left_exiting['winner'] == 1 and left_exiting['reason'] == 'crash' and left_exiting['moves'] == [0]
+    stubborn_left = results['team3/stubborn@1|team1/left@1']
+    assert stubborn_left['winner'] == 2 and stubborn_left['reason'] == 'timeout' and stubborn_left['moves'] == []
+    exiting_stubborn = results['team2/exiting@1|team3/stubborn@1']
+    assert exiting_stubborn['winner'] == 2 and exiting_stubborn['reason'] == 'crash'
+
+def test_agents_cant_tamper_with_each_other(tmp_path):
+    backend = MemoryBackend()
+    backend.put_bytes('submissions/team1/left/left_v1.zip', LEFT)
+    backend.put_bytes('submissions/team2/tampering/tampering_v1.zip', TAMPERING)
+    run_tournament(backend, str(tmp_path), workers=1)
+    results = ResultLog(str(tmp_path / 'results.jsonl')).load()
+    assert results['team1/left@1|team2/tampering@1']['moves'] == [0, 6, 0, 6, 0, 6, 0]
+    assert results['team2/tampering@1|team1/left@1']['moves'] == [6, 0, 6, 0, 6, 0, 6]
@@ -13,6 +13,7 @@ def client():
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False
     app.config['SECRET_KEY'] = 'test_secret_key'
+    app.config['STORAGE_BACKEND'] = 'memory'
     
     with app.test_client() as client:
         yield client
@@ -57,7 +58,7 @@ def test_upload_page_loads(authenticated_client):
 def test_successful_upload(authenticated_client, sample_zip):
     """Test successful file upload."""
     # Mock the storage functionality
-    with patch('app.storage.storage.Client'), \
+    with patch('app.storage._create_clients', return_value=(None, None)), \
          patch('app.storage.save_agent'):  # Patch the whole function instead
         response = authenticated_client.post('/upload', data={
             'submission': (sample_zip, 'submission.zip'),
@@ -75,4 +76,17 @@ def test_successful_upload(authenticated_client, sample_zip):
 #     }, content_type='multipart/form-data', follow_redirects=True)
 #     assert response.status_code == 200
 #     print(response.data)
-#     assert b'Invalid' in response.data
\ No newline at end of file
+#     assert b'Invalid' in response.data
+def test_agent_limit_uses_a_fresh_listing(authenticated_client, sample_zip):
+    """Uploads by another worker are seen even while this worker's agent list is cached"""
+    from app.storage import get_backend
+    assert authenticated_client.get('/upload').status_code == 200
+    with authenticated_client.application.app_context():
+        backend = get_backend()
+        for name in ('first', 'second'):
+            backend.put_bytes(f'submissions/team2/{name}/{name}_v1.zip', b'zip')
+    response = authenticated_client.post('/upload', data={
+        'submission': (sample_zip, 'agent.zip'),
+        'agent_name': 'third'
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert b'You can only have up to 2 agents' in response.data
@@ -0,0 +1,88 @@
+import hashlib
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.validation_cache import ValidationCache
+from app.validator import validate_submission
+
+@pytest.fixture
+def cache(tmp_path):
+    return ValidationCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['VALIDATION_CACHE_PATH'] = str(tmp_path / 'validation.sqlite3')
+    return app
+
+def test_miss_then_hit(cache):
+    key = cache.make_key('abc', '1.0')
+    assert cache.get(key) is None
+    cache.put(key, {'valid': True, 'message': 'Validation successful'})
+    assert cache.get(key) == {'valid': True, 'message': 'Validation successful'}
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+def test_key_depends_on_validator_version(cache):
+    cache.put(cache.make_key('abc', '1.0'), {'valid': True, 'message': 'ok'})
+    assert cache.get(cache.make_key('abc', '2.0')) is None
+
+def test_evicts_least_recently_used(cache):
+    cache.put('a', {'valid': True})
+    cache.put('b', {'valid': True})
+    cache.get('a')
+    cache.put('c', {'valid': True})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['entries'] == 2
+
+def test_expired_entries_are_ignored(tmp_path):
+    cache = ValidationCache(str(tmp_path / 'cache.sqlite3'), max_age=-1)
+    cache.put('a', {'valid': True})
+    assert cache.get('a') is None
+
+def test_duplicate_submission_is_validated_once(app):
+    zip_content = b'identical bytes'
+    result = {'valid': False, 'message': 'Invalid ZIP file'}
+    with app.app_context(), \
+         patch('app.validator._run_validation', return_value=result) as run_validation:
+        assert validate_submission(zip_content) == result
+        assert validate_submission(zip_content, hashlib.sha256(zip_content).hexdigest()) == result
+    assert run_validation.call_count == 1
+
+def test_retryable_results_are_not_cached(app):
+    result = {'valid': False, 'message': 'Validation timed out', 'retryable': True}
+    with app.app_context(), \
+         patch('app.validator._run_validation', return_value=result) as run_validation:
+        validate_submission(b'slow agent')
+        validate_submission(b'slow agent')
+    assert run_validation.call_count == 2
+
+def test_sandbox_crashes_are_not_cached(app):
+    from app.sandbox import SandboxError
+    from app.validator import get_validation_cache
+    with app.app_context(), patch('app.validator.get_validation_pool') as get_pool:
+        get_pool.return_value.run.side_effect = SandboxError('Sandbox process exited unexpectedly (exit code 1)')
+        result = validate_submission(b'killed by the OOM killer')
+        assert result['retryable'] is True
+        assert get_validation_cache().stats()['entries'] == 0
+
+@pytest.mark.parametrize('setting, value', [('ZIP_MAX_FILE_SIZE', 1024), ('ENV_CACHE_DIR', '/tmp/envs'),
+                                            ('VALIDATION_IMPORT_MODE', 'extract')])
+def test_key_depends_on_validation_settings(app, setting, value):
+    result = {'valid': True, 'message': 'Validation successful'}
+    with app.app_context(), \
+         patch('app.validator._run_validation', return_value=result) as run_validation:
+        validate_submission(b'submission')
+        app.config[setting] = value
+        validate_submission(b'submission')
+    assert run_validation.call_count == 2
+
+def test_key_depends_on_provided_package_versions(app):
+    result = {'valid': True, 'message': 'Validation successful'}
+    with app.app_context(), \
+         patch('app.validator._run_validation', return_value=result) as run_validation:
+        validate_submission(b'submission')
+        with patch('app.validator.importlib.metadata.version', return_value='0.0.1'):
+            validate_submission(b'submission')
+    assert run_validation.call_count == 2
@@ -175,4 +175,93 @@ def test_wrong_interface(app, wrong_interface, create_zip_submission):
         assert all(message_part in result['message'] for 
                    message_part in ["Game validation failed:",
                                 "takes 1 positional argument",
-                                "but 3 were given"])
\ No newline at end of file
+                                "but 3 were given"])
+
+def test_c4utils_is_resolved_once_at_startup(tmp_path, monkeypatch):
+    import sys
+    from app.config import Config
+    package = tmp_path / 'c4utils'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'agent_interface.py').write_text('def validate_agent_function(f, timeout):\n    return True, None\n')
+    monkeypatch.setattr(Config, 'VALIDATION_REFEREE', 'c4utils')
+    monkeypatch.setattr(Config, 'VALIDATOR_PATH', str(tmp_path))
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    try:
+        app = create_app()
+        assert 'c4utils.agent_interface' in sys.modules and str(tmp_path) in sys.path
+        assert 'c4utils.agent_interface' in app.config['VALIDATION_PRELOAD']
+        assert 'c4utils.agent_interface' not in Config.VALIDATION_PRELOAD
+    finally:
+        sys.modules.pop('c4utils.agent_interface', None)
+        sys.modules.pop('c4utils', None)
+
+@pytest.mark.parametrize('signature', [
+    '()', '(board)', '(board, player=1)', '(board, player, timeout, extra)', '(a, b, c, d, e)',
+    '(a, b, c, d, e, f)', '(board, player, timeout, *, strict)', '(board, /, player)'
+])
+def test_static_signature_check_matches_python(signature):
+    import ast
+    from app.validator import _check_generate_move
+    source = f'def generate_move{signature}:\n    return 0\n'
+    namespace = {}
+    exec(source, namespace)
+    with pytest.raises(TypeError) as excinfo:
+        namespace['generate_move'](None, 1, 1.0)
+    assert _check_generate_move(ast.parse(source)) == f'Game validation failed: {excinfo.value}'
+
+@pytest.mark.parametrize('source', [
+    'def generate_move(board, player, timeout):\n    return 0\n',
+    'def generate_move(*args):\n    return 0\n',
+    'from .strategy import generate_move\n',
+    'from .strategy import *\n',
+    'generate_move = lambda board, player, timeout: 0\n',
+    'try:\n    from .fast import generate_move\nexcept ImportError:\n    generate_move = None\n',
+    'import functools\n@functools.lru_cache\ndef generate_move(board):\n    return 0\n',
+    'def __getattr__(name):\n    return None\n',
+])
+def test_static_check_defers_to_import(source):
+    import ast
+    from app.validator import _check_generate_move
+    assert _check_generate_move(ast.parse(source)) is None
+
+def test_static_checks_run_before_import(create_zip_submission):
+    from app.validator import _validate
+    from app.agent_loader import ExtractionLimits
+    settings = {'validator_path': None, 'import_mode': 'memory', 'referee': 'builtin', 'environments': None,
+                'zip_limits': ExtractionLimits()}
+    zip_content = create_zip_submission({
+        'requirements.txt': '',
+        # Would take the whole validation time if it was imported
+        'agent/__init__.py': 'import time\ntime.sleep(60)\nfrom .strategy import generate_move\n',
+        'agent/strategy.py': 'def generate_move(board, player, timeout):\n    return 0 +\n',
+    })
+    timings = {}
+    result = _validate(zip_content, settings, timings)
+    assert result == {'valid': False, 'message': 'Validation error: invalid syntax (agent/strategy.py, line 2)'}
+    assert 'import' not in timings
+
+    zip_content = create_zip_submission({
+        'requirements.txt': '',
+        'agent/__init__.py': 'import time\ntime.sleep(60)\ndef generate_move(board, player):\n    return 0\n',
+    })
+    result = _validate(zip_content, settings, timings)
+    assert result['message'] == 'Game validation failed: generate_move() takes 2 positional arguments but 3 were given'
+
+def test_compression_bombs_are_rejected_before_reading(app):
+    memory_zip = BytesIO()
+    with zipfile.ZipFile(memory_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('requirements.txt', '')
+        zf.writestr('agent/__init__.py', 'def generate_move(board, player, timeout): return 0')
+        zf.writestr('agent/weights.bin', bytes(8 * 1024 * 1024))
+    with app.app_context():
+        result = validate_submission(memory_zip.getvalue())
+    assert result == {'valid': False, 'message': 'ZIP rejected: agent/weights.bin is compressed more than 100:1'}
+
+def test_spooled_upload_is_validated_in_place(app, valid_submission, create_zip_submission, tmp_path):
+    app.config['VALIDATION_REFEREE'] = 'builtin'
+    spooled = tmp_path / 'upload.zip'
+    spooled.write_bytes(create_zip_submission(valid_submission))
+    with app.app_context():
+        result = validate_submission(str(spooled))
+    assert result['valid'] is True, result['message']